@@ -1,22 +1,116 @@
 from flask import Flask, render_template, request, jsonify
-import cv2, numpy as np, base64, os, re, requests, json
-import matplotlib; matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from sympy import lambdify
-import sympy as sp
+import cv2, numpy as np, base64, os, re, json, struct, shutil, threading, time, queue, functools, sys, contextlib
 from datetime import datetime
-from sympy.parsing.sympy_parser import parse_expr, standard_transformations, implicit_multiplication_application
+from concurrent.futures import ThreadPoolExecutor
+from board_client import create_session, parse_response
+from result_store import ResultStore, SharedResultStore, new_request_id, REQUEST_ID_HEADER
+from feedback_store import FeedbackStore
+from settings import load_overrides
+from recognition_session import SessionStore
+from plotting import render_plot
+from plot_pool import PlotPool, PlotTimeout
+from segmentation import (binarize, clean_glyphs, component_stats, glyph_boxes, crop_glyphs,
+                          glyph_positions, padded_boxes)
+from metrics import MetricsRegistry, Trace, COUNT_BUCKETS, CONTENT_TYPE
+# Modules shared with the board server live next to the notebook
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PYNQ'))
+from preprocess import InputQuantizer
 
 app = Flask(__name__)
 
 # Configuration settings
 APP_CONFIG = {
     'send_images_to_endpoint': True,  # Set to False to disable sending images
-    'endpoint_url': "http://192.168.1.99:5000/upload"  # Endpoint URL for sending images
+    'endpoint_url': "http://192.168.1.99:5000/upload",  # Endpoint URL for sending images
+    # Quantize glyphs here and send one raw N x 784 payload instead of PNG files
+    'binary_protocol': False,
+    'binary_endpoint_url': "http://192.168.1.99:5000/upload_raw",
+    'model_info_path': '../PYNQ/model_info.json',  # Source of the input quant scale / zero point
+    # The board's model list, re-read when it rejects a raw upload quantized for another model
+    'models_url': "http://192.168.1.99:5000/models",
+    # Keep-alive connection pool to the board
+    'http_pool_size': 8,
+    'http_retries': 2,    # retries on connection failures / 502-504
+    'http_backoff': 0.1,  # seconds, doubled on every retry
+    # How long an uncollected /receive result or a request's debug images are kept
+    'result_ttl': 60.0,
+    # Render binary_for_scan.png / boxes_connected_components.png into the request's debug folder
+    'debug_rendering': False,
+    # Disk copies, written by a background thread: the original drawing and
+    # glyphs under static/debug_images, inverted glyphs under data/ for training
+    'save_debug_images': False,
+    'save_dataset': True,
+    'write_queue_size': 512,  # pending writes; further writes are dropped
+    # Distinct equations kept as finished PNGs (optional); plot workers also
+    # keep the parsed/compiled form
+    'plot_cache_size': 256,
+    'cache_plot_png': True,
+    # SymPy / Matplotlib run in this many warm worker processes (0: on the
+    # request thread, no deadline); a plot not ready after plot_timeout
+    # seconds is dropped and its worker restarted, and one still waiting for
+    # a free worker after plot_queue_timeout seconds is dropped
+    'plot_workers': 2,
+    'plot_timeout': 2.0,
+    'plot_queue_timeout': 10.0,
+    # Reply as soon as the equation is known; the page fetches the plot
+    # from /plot/<request_id>
+    'async_plot': False,
+    # Add per-stage seconds ('timing') to every /process_equation response
+    'report_timing': False,
+    # Stage histograms and counters served on /metrics; near-free when off
+    'metrics_enabled': True,
+    # SQLite file shared by worker processes for /receive results (serve.py
+    # sets it); None keeps them in this process
+    'result_store_path': None,
+    # Incremental recognition: the page streams finished strokes to
+    # /session/<id>/delta and glyphs are labelled while the user draws.
+    # Sessions live in this process (serve.py turns them off for several
+    # workers); idle ones expire after session_ttl seconds
+    'incremental_sessions': True,
+    'session_ttl': 600.0,
+    'max_sessions': 64
 }
-
-# Global variable to store the latest prediction from PYNQ
-LATEST_PREDICTION = None
+# Overrides from APP_CONFIG_FILE and APP_* environment variables (see settings.py)
+APP_CONFIG.update(load_overrides(APP_CONFIG))
+
+# Shared by all request threads so each equation reuses a pooled connection
+BOARD_SESSION = create_session(APP_CONFIG['http_pool_size'], APP_CONFIG['http_retries'], APP_CONFIG['http_backoff'])
+
+# Binary glyph payload understood by the PYNQ /upload_raw endpoint
+RAW_MAGIC = b"DPU2"
+# magic, glyph count, bytes per glyph, input scale and zero point the glyphs were quantized with
+RAW_HEADER = struct.Struct("<4sHHdH")
+GLYPH_SIZE = 28 * 28
+
+# Input quantization parameters, loaded from model_info.json on first use and
+# from the board's /models when it has switched to another model since
+QUANT_PARAMS = None
+
+# Predictions from the PYNQ /receive callback, keyed by request ID
+if APP_CONFIG['result_store_path']:
+    PREDICTIONS = SharedResultStore(APP_CONFIG['result_store_path'], ttl=APP_CONFIG['result_ttl'])
+    PLOTS = SharedResultStore(APP_CONFIG['result_store_path'], ttl=APP_CONFIG['result_ttl'], table='plots')
+else:
+    PREDICTIONS = ResultStore(ttl=APP_CONFIG['result_ttl'])
+    PLOTS = ResultStore(ttl=APP_CONFIG['result_ttl'])
+
+METRICS = MetricsRegistry(enabled=APP_CONFIG['metrics_enabled'])
+REQUESTS = METRICS.counter('app_requests_total', 'HTTP requests handled', ['endpoint'])
+ERRORS = METRICS.counter('app_errors_total', 'Failed board calls, plots and feedback writes', ['kind'])
+IN_FLIGHT = METRICS.gauge('app_in_flight_requests', 'Requests being processed', ['endpoint'])
+STAGE_SECONDS = METRICS.histogram('app_stage_seconds', 'Time per processing stage', ['stage'])
+GLYPHS = METRICS.histogram('app_glyphs_per_request', 'Glyphs segmented per equation', buckets=COUNT_BUCKETS)
+
+# Plotting off the request thread; POSIX only (the workers inherit a socket)
+PLOT_POOL = PlotPool(APP_CONFIG['plot_workers'], APP_CONFIG['plot_timeout'], APP_CONFIG['plot_queue_timeout']) \
+    if APP_CONFIG['plot_workers'] and os.name == 'posix' else None
+# async_plot: background jobs and their finished plots, keyed by request ID
+PLOT_JOBS = ThreadPoolExecutor(max(1, APP_CONFIG['plot_workers']) * 4, thread_name_prefix='plot') \
+    if APP_CONFIG['async_plot'] else None
+
+# Incremental recognition sessions, keyed by session ID
+SESSIONS = SessionStore(APP_CONFIG['session_ttl'], APP_CONFIG['max_sessions']) \
+    if APP_CONFIG['incremental_sessions'] else None
 
 # Ensure required directories exist
 os.makedirs('static/debug_images', exist_ok=True)
@@ -25,147 +119,528 @@ os.makedirs('data', exist_ok=True)  # Folder to store all 28x28 character images
 # Ensure feedback directory exists
 FEEDBACK_DIR = 'feedback'
 os.makedirs(FEEDBACK_DIR, exist_ok=True)
-FEEDBACK_FILE = os.path.join(FEEDBACK_DIR, 'recognition_feedback.json')
-
-# Initialize feedback file if it doesn't exist
-if not os.path.exists(FEEDBACK_FILE):
-    with open(FEEDBACK_FILE, 'w') as f:
-        json.dump({
-            'feedback_entries': [],
-            'stats': {
-                'total': 0,
-                'correct': 0,
-                'incorrect': 0,
-                'accuracy': 0
-            }
-        }, f, indent=2)
+FEEDBACK_FILE = os.path.join(FEEDBACK_DIR, 'recognition_feedback.json')  # previous format, imported once
+FEEDBACK_DB = os.path.join(FEEDBACK_DIR, 'recognition_feedback.db')
+FEEDBACK = FeedbackStore(FEEDBACK_DB, legacy_json=FEEDBACK_FILE)
 
 def clear_debug_images():
-    """Clear previous debug images from the static/debug_images directory"""
+    """
+    Clear previous debug images from the static/debug_images directory.
+    Per-request folders are only removed once they are older than result_ttl,
+    so requests still in flight keep their glyphs and plot.
+    """
     debug_dir = 'static/debug_images'
+    cutoff = time.time() - APP_CONFIG['result_ttl']
 
     for filename in os.listdir(debug_dir):
         file_path = os.path.join(debug_dir, filename)
         if os.path.isfile(file_path):
-            os.remove(file_path)
+            # Other worker processes sweep the same folder
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(file_path)
+        elif os.path.isdir(file_path) and os.path.getmtime(file_path) < cutoff:
+            shutil.rmtree(file_path, ignore_errors=True)
 
-def send_images_to_endpoint(image_paths, endpoint_url):
+def count_data_images():
+    """Count the total number of character images in the data folder"""
     try:
-        files = [
-            ('file', (os.path.basename(p), open(p, 'rb'), 'image/png'))
-            for p in image_paths
-        ]
-        resp = requests.post(endpoint_url, files=files, timeout=10)
+        return len([f for f in os.listdir('data') if f.endswith('.png')])
+    except Exception as e:
+        print(f"Error counting data images: {e}")
+        return 0
+
+# Listed once at startup, then kept up to date as glyphs are queued for data/
+DATA_IMAGE_COUNT = count_data_images()
+DATA_COUNT_LOCK = threading.Lock()
+
+# Bounded queue of (path, image) for the background writer; drops rather than stall requests
+WRITE_QUEUE = queue.Queue(maxsize=APP_CONFIG['write_queue_size'])
+LAST_DEBUG_CLEANUP = 0.0
+
+def _add_data_images(delta):
+    global DATA_IMAGE_COUNT
+    with DATA_COUNT_LOCK:
+        DATA_IMAGE_COUNT += delta
+        return DATA_IMAGE_COUNT
+
+def _write_worker():
+    while True:
+        path, img = WRITE_QUEUE.get()
+        try:
+            if path is None:
+                clear_debug_images()
+            elif not cv2.imwrite(path, img):
+                raise OSError("cv2.imwrite failed")
+        except Exception as e:
+            print(f"[WRITER] Failed to write '{path}': {e}")
+            if path and path.startswith('data/'):
+                _add_data_images(-1)
+        finally:
+            WRITE_QUEUE.task_done()
+
+threading.Thread(target=_write_worker, daemon=True).start()
+
+def queue_image_write(path, img):
+    """Hand an image to the background writer; returns False if it had to be dropped"""
+    try:
+        WRITE_QUEUE.put_nowait((path, img))
+        return True
+    except queue.Full:
+        print(f"[WRITER] Write queue full, dropping '{path}'")
+        return False
+
+def schedule_debug_cleanup():
+    """Sweep stale request folders in the background writer, at most once per result_ttl"""
+    global LAST_DEBUG_CLEANUP
+    if time.time() - LAST_DEBUG_CLEANUP > APP_CONFIG['result_ttl']:
+        LAST_DEBUG_CLEANUP = time.time()
+        queue_image_write(None, None)
+
+def encode_png(img):
+    return cv2.imencode('.png', img)[1].tobytes()
+
+def png_data_url(png):
+    return 'data:image/png;base64,' + base64.b64encode(png).decode('ascii')
+
+def send_images_to_endpoint(images, endpoint_url, request_id=None):
+    """Upload (filename, png bytes) pairs as the multipart 'file' field"""
+    try:
+        files = [('file', (name, png, 'image/png')) for name, png in images]
+        headers = {REQUEST_ID_HEADER: request_id} if request_id else None
+        resp = BOARD_SESSION.post(endpoint_url, files=files, headers=headers, timeout=10)
         resp.raise_for_status()
         
-        # Try to parse JSON response
-        try:
-            return resp.json() 
-        except json.JSONDecodeError as je:
-            # If we can't decode JSON, return the text content instead
-            print(f"[CLIENT] Warning: Could not parse JSON response: {je}")
-            return {"text": resp.text.strip(), "raw_response": True}
+        # Try to parse JSON response, falling back to the text content
+        return parse_response(resp.text)
     except Exception as e:
         print(f"[CLIENT] Failed to send images: {e}")
+        ERRORS.inc(kind='board')
         return {"error": str(e)}
-    finally:
-        # Ensure all file handles are closed
-        for f in files:
-            try:
-                f[1][1].close()
-            except:
-                pass
+
+def load_quant_params():
+    """Return (scale, zero_point) of the model input, as used by transform() on the board"""
+    global QUANT_PARAMS
+    if QUANT_PARAMS is None:
+        with open(APP_CONFIG['model_info_path'], 'r') as f:
+            quant = json.load(f)['quant']
+        QUANT_PARAMS = (quant['scale'], quant['zero_point'])
+    return QUANT_PARAMS
+
+def fetch_quant_params():
+    """Replace the cached (scale, zero_point) with those of the board's active model"""
+    global QUANT_PARAMS
+    resp = BOARD_SESSION.get(APP_CONFIG['models_url'], timeout=5)
+    resp.raise_for_status()
+    listing = resp.json()
+    active = next(model for model in listing['models'] if model['id'] == listing['active'])
+    QUANT_PARAMS = (active['input_scale'], active['input_zero_point'])
+    return QUANT_PARAMS
+
+def quantize_glyphs(char_images, scale, zero_point):
+    """Same bytes as transform() on the board for a whole N x 28 x 28 batch, through its lookup table"""
+    return InputQuantizer(scale, zero_point)(np.asarray(char_images, dtype=np.uint8).reshape(-1, 28, 28))
+
+def pack_glyphs(char_images):
+    """Build the /upload_raw payload: header followed by N x 784 quantized bytes"""
+    scale, zero_point = load_quant_params()
+    header = RAW_HEADER.pack(RAW_MAGIC, len(char_images), GLYPH_SIZE, scale, zero_point)
+    return header + quantize_glyphs(char_images, scale, zero_point).tobytes()
+
+def send_glyphs_binary(char_images, endpoint_url, request_id=None):
+    try:
+        headers = {'Content-Type': 'application/octet-stream'}
+        if request_id:
+            headers[REQUEST_ID_HEADER] = request_id
+        resp = BOARD_SESSION.post(endpoint_url, data=pack_glyphs(char_images), headers=headers, timeout=10)
+        if resp.status_code == 409:
+            # Quantized for a model the board no longer runs: requantize once for the active one
+            scale, zero_point = fetch_quant_params()
+            print(f"[CLIENT] Board switched models, input scale {scale} zero point {zero_point}")
+            resp = BOARD_SESSION.post(endpoint_url, data=pack_glyphs(char_images), headers=headers, timeout=10)
+        resp.raise_for_status()
+        return parse_response(resp.text)
+    except Exception as e:
+        print(f"[CLIENT] Failed to send glyphs: {e}")
+        ERRORS.inc(kind='board')
+        return {"error": str(e)}
+
+def save_glyph_copies(char_images, request_debug_dir):
+    """
+    Queue the optional disk copies of a request's glyphs (debug folder,
+    training data); returns the training files' name prefix, or None when
+    none are saved
+    """
+    # Timestamped names keep the data folder unique across requests
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    prefix = f'char_{timestamp}'
+    for i, char_img in enumerate(char_images):
+        if APP_CONFIG['save_debug_images']:
+            queue_image_write(f'{request_debug_dir}/{i+1:02d}.png', char_img)
+        if APP_CONFIG['save_dataset']:
+            data_path = f'data/{prefix}_{i+1}.png'
+            inverted_img = cv2.bitwise_not(char_img)
+            if queue_image_write(data_path, inverted_img):
+                _add_data_images(1)
+    return prefix if APP_CONFIG['save_dataset'] and len(char_images) else None
+
+def record_capture(request_id, data_prefix, count, labels):
+    """
+    Link the ``count`` training glyphs saved under ``data_prefix`` to the
+    board's labels for them (a list, or None), so that feedback on the
+    request labels them for build_shards.py
+    """
+    if data_prefix is None:
+        return
+    if labels is not None and len(labels) != count:
+        labels = None
+    try:
+        FEEDBACK.add_capture(request_id, data_prefix, count, ' '.join(labels) if labels else None,
+                             datetime.now().isoformat())
+    except Exception as e:
+        print(f"[FEEDBACK] Error recording capture: {e}")
+        ERRORS.inc(kind='feedback')
+
+def recognize_glyphs(char_images, glyph_pngs, request_id):
+    """
+    Send one batch of glyphs to the board; returns (reply, equation text or
+    None), the text being the board's space-separated labels, one per glyph.
+    """
+    if APP_CONFIG['binary_protocol']:
+        response_data = send_glyphs_binary(char_images, APP_CONFIG['binary_endpoint_url'], request_id)
+    else:
+        response_data = send_images_to_endpoint(glyph_pngs, APP_CONFIG['endpoint_url'], request_id)
+    print(f"[CLIENT] API response: {response_data}")
+    
+    # The board calls /receive before it replies, so our result is already stored
+    callback_prediction = PREDICTIONS.pop(request_id)
+    if callback_prediction:
+        # Use the prediction the PYNQ device delivered for this request
+        return response_data, callback_prediction
+    if 'text' in response_data:
+        # Clean up possible formatting issues in the equation
+        return response_data, response_data['text'].replace('\n', '').replace('\r', '').strip()
+    if 'error' in response_data:
+        print(f"[CLIENT] Error in API response: {response_data['error']}")
+    return response_data, None
 
 @app.route('/')
 def index():
     return render_template('index.html', APP_CONFIG=APP_CONFIG)
 
-def count_data_images():
-    """Count the total number of character images in the data folder"""
-    try:
-        return len([f for f in os.listdir('data') if f.endswith('.png')])
-    except Exception as e:
-        print(f"Error counting data images: {e}")
-        return 0
+@app.route('/metrics')
+def metrics():
+    return METRICS.render(), 200, {'Content-Type': CONTENT_TYPE}
 
 @app.route('/process_equation', methods=['POST'])
 def process_equation():
-    global LATEST_PREDICTION
+    REQUESTS.inc(endpoint='process_equation')
+    with IN_FLIGHT.track(endpoint='process_equation'):
+        return _process_equation()
+
+def _process_equation():
     # Clear previous debug images
-    clear_debug_images()
+    schedule_debug_cleanup()
+    # Correlates the board upload, its /receive callback and this response
+    request_id = new_request_id()
+    request_debug_dir = f'static/debug_images/{request_id}'
+    if APP_CONFIG['save_debug_images'] or APP_CONFIG['debug_rendering']:
+        os.makedirs(request_debug_dir, exist_ok=True)
+    # The request ID doubles as the trace ID; the board records its stages under it
+    trace = Trace(STAGE_SECONDS, request_id)
     
     data = request.json
     image_data = data['image'].split(',')[1]
     is_mock = data.get('mock', False)
     mock_equation = data.get('mockEquation', " ")
     
-    # Generate a timestamp for filenames
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-    
     # Decode the base64 image
     img_bytes = base64.b64decode(image_data)
+    trace.lap('base64')
     img_arr = np.frombuffer(img_bytes, np.uint8)
     img = cv2.imdecode(img_arr, cv2.IMREAD_GRAYSCALE)
-    
-    # Save the original image for debugging
-    cv2.imwrite('static/debug_images/original.png', img)
-    original_image_path = 'static/debug_images/original.png'
+    trace.lap('imdecode')
     
     # Process the image to extract characters
     char_images = []
     char_positions = []
     if isinstance(img, np.ndarray) and img.size > 0:
-        char_images, char_positions = extract_characters(img)
-    
-    # Only include character images in the response
-    debug_image_paths = []
-    # We'll still save the diagnostic images to disk but won't include them in the response
+        if APP_CONFIG['save_debug_images']:
+            queue_image_write(f'{request_debug_dir}/original.png', img)
+        char_images, char_positions = extract_characters(img, debug=APP_CONFIG['debug_rendering'],
+                                                         debug_dir=request_debug_dir)
+    trace.lap('extract')
+    GLYPHS.observe(len(char_images))
     
-    # Endpoint URL for sending the images
-    endpoint_url = APP_CONFIG['endpoint_url']
+    # Glyphs are encoded in memory: uploaded from there and returned inline as
+    # data URLs, so the response never waits for the disk
+    # Use sequential numbers instead of char_X naming for debug images
+    glyph_pngs = [(f'{i+1:02d}.png', encode_png(char_img)) for i, char_img in enumerate(char_images)]
+    data_prefix = save_glyph_copies(char_images, request_debug_dir)
     
-    for i, char_img in enumerate(char_images):
-        # Use sequential numbers instead of char_X naming for debug images
-        debug_path = f'static/debug_images/{i+1:02d}.png'
-        cv2.imwrite(debug_path, char_img)
-        debug_image_paths.append(debug_path)
-        
-        # Save to data folder with timestamp to ensure uniqueness
-        data_path = f'data/char_{timestamp}_{i+1}.png'
-        inverted_img = cv2.bitwise_not(char_img)
-        cv2.imwrite(data_path, inverted_img)
+    debug_images = [png_data_url(png) for _, png in glyph_pngs]
+    trace.lap('encode')
     
-    response_data = None
+    response_data, board_equation = None, None
     # Only send to server if not in mock mode
-    if not is_mock and APP_CONFIG['send_images_to_endpoint'] and debug_image_paths:
-        response_data = send_images_to_endpoint(debug_image_paths, endpoint_url)
-        print(f"[CLIENT] API response: {response_data}")
+    if not is_mock and APP_CONFIG['send_images_to_endpoint'] and glyph_pngs:
+        response_data, board_equation = recognize_glyphs(char_images, glyph_pngs, request_id)
+    if response_data and 'inference' in response_data:
+        # The board reports its own predict time; the rest of the round trip is network
+        trace.lap('network', inference=response_data['inference'])
+    else:
+        trace.lap('network')
     
     if is_mock:
         equation = mock_equation
-    elif LATEST_PREDICTION and not is_mock:
-        # Use the stored prediction from the PYNQ device if available and mock is disabled
-        equation = LATEST_PREDICTION
-        # Reset prediction after using it
-        LATEST_PREDICTION = None
-    elif response_data and 'text' in response_data:
-        equation = response_data['text']
-        # Clean up possible formatting issues in the equation
-        equation = equation.replace('\n', '').replace('\r', '').strip()
-    elif response_data and 'error' in response_data:
-        # Handle error case
-        print(f"[CLIENT] Error in API response: {response_data['error']}")
+    elif board_equation:
+        equation = board_equation
+    else:
         equation = " "  # Fallback on error
+    record_capture(request_id, data_prefix, len(char_images),
+                   board_equation.split() if board_equation and not is_mock else None)
+    
+    # Exponents come from glyph positions, which only match a recognised equation
+    use_positions = char_positions if not is_mock and response_data else None
+    display_equation, calculation_equation = postprocess_equation(equation, use_positions)
+    trace.lap('postprocess')
+        
+    return equation_response(request_id, trace, display_equation, calculation_equation, debug_images)
+
+def equation_response(request_id, trace, display_equation, calculation_equation, debug_images):
+    """Plot the equation (or queue it with async_plot) and build the /process_equation reply"""
+    # Generate plot
+    if PLOT_JOBS is not None:
+        PLOT_JOBS.submit(_plot_later, request_id, calculation_equation)
+        plot_url = None
     else:
-        equation = " "
+        plot_url = generate_plot(calculation_equation)
+        if plot_url is None:
+            ERRORS.inc(kind='plot')
+    trace.lap('plot')
     
+    # Count the total number of character images in the data folder
+    total_data_images = _add_data_images(0)
+    
+    result = {
+        'equation': display_equation, 
+        'plot': plot_url,
+        'debug_images': debug_images,
+        'total_data_images': total_data_images,
+        'request_id': request_id  # sent back with /feedback, to label the saved glyphs
+    }
+    if PLOT_JOBS is not None:
+        result['plot_url'] = f'/plot/{request_id}'
+    if APP_CONFIG['report_timing']:
+        result['timing'] = trace.timing
+    return jsonify(result)
+
+def decode_image(data_url):
+    """Grayscale image from a PNG data URL, or None if it does not decode"""
+    img_arr = np.frombuffer(base64.b64decode(data_url.split(',')[1]), np.uint8)
+    img = cv2.imdecode(img_arr, cv2.IMREAD_GRAYSCALE)
+    return img if isinstance(img, np.ndarray) and img.size > 0 else None
+
+def glyph_png(glyph):
+    """PNG of a session glyph, encoded once"""
+    if 'png' not in glyph:
+        glyph['png'] = encode_png(glyph['image'])
+    return glyph['png']
+
+def label_pending_glyphs(session, request_id):
+    """
+    Send the session's unlabelled glyphs to the board and record their
+    labels; returns the board's reply, or None if nothing was sent.
+    ``session.lock`` is only taken to pick the glyphs and to label them, so
+    deltas keep applying while the board works; a glyph a delta replaced
+    meanwhile gets its label but is no longer in the drawing.
+    """
+    with session.lock:
+        pending = session.pending()
+    if not pending or not APP_CONFIG['send_images_to_endpoint']:
+        return None
+    char_images = np.stack([glyph['image'] for glyph in pending])
+    glyph_pngs = [(f'{i+1:02d}.png', glyph_png(glyph)) for i, glyph in enumerate(pending)]
+    response_data, board_equation = recognize_glyphs(char_images, glyph_pngs, request_id)
+    labels = board_equation.split() if board_equation else []
+    if len(labels) == len(pending):
+        with session.lock:
+            session.label(pending, labels)
+    elif board_equation:
+        # Left unlabelled: the next delta or the submit sends them again
+        print(f"[SESSION] Expected {len(pending)} labels, got '{board_equation}'")
+        ERRORS.inc(kind='session_labels')
+    return response_data
+
+def get_session_or_404(session_id):
+    session = SESSIONS.get(session_id) if SESSIONS is not None else None
+    if session is None:
+        # The page then posts the whole canvas to /process_equation
+        return None, (jsonify({'error': 'Unknown or expired session'}), 404)
+    return session, None
+
+@app.route('/session', methods=['POST'])
+def start_session():
+    """Start incremental recognition of a blank canvas: {"width": ..., "height": ...}"""
+    REQUESTS.inc(endpoint='session')
+    if SESSIONS is None:
+        return jsonify({'error': 'Incremental sessions are disabled'}), 404
+    data = request.json or {}
+    try:
+        session_id, _ = SESSIONS.create(int(data['width']), int(data['height']))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Bad canvas size: {e}'}), 400
+    return jsonify({'session_id': session_id})
+
+@app.route('/session/<session_id>', methods=['DELETE'])
+def end_session(session_id):
+    if SESSIONS is not None:
+        SESSIONS.discard(session_id)
+    return jsonify({'success': True})
+
+@app.route('/session/<session_id>/delta', methods=['POST'])
+def session_delta(session_id):
+    """
+    Paint a patch of the canvas into the session: {"x": left, "y": top,
+    "image": PNG data URL}. Only the components the patch touches are
+    re-segmented and only glyphs whose pixels changed go to the board.
+    """
+    REQUESTS.inc(endpoint='session_delta')
+    session, error = get_session_or_404(session_id)
+    if error:
+        return error
+    with IN_FLIGHT.track(endpoint='session_delta'):
+        request_id = new_request_id()
+        trace = Trace(STAGE_SECONDS, request_id)
+        data = request.json or {}
+        try:
+            x, y = int(data['x']), int(data['y'])
+            patch = decode_image(data['image'])
+        except (KeyError, TypeError, ValueError, IndexError, AttributeError) as e:
+            return jsonify({'error': f'Bad patch: {e!r}'}), 400
+        if patch is None:
+            return jsonify({'error': 'Patch is not an image'}), 400
+        trace.lap('delta_decode')
+        with session.lock:
+            session.update(x, y, patch)
+        trace.lap('delta_segment')
+        label_pending_glyphs(session, request_id)
+        trace.lap('delta_network')
+        with session.lock:
+            labels = session.labels()
+        return jsonify({'glyphs': len(labels), 'pending': labels.count(None)})
+
+@app.route('/session/<session_id>/submit', methods=['POST'])
+def session_submit(session_id):
+    """/process_equation for a session's drawing: usually only the plot is left to do"""
+    REQUESTS.inc(endpoint='session_submit')
+    session, error = get_session_or_404(session_id)
+    if error:
+        return error
+    with IN_FLIGHT.track(endpoint='session_submit'):
+        schedule_debug_cleanup()
+        request_id = new_request_id()
+        request_debug_dir = f'static/debug_images/{request_id}'
+        if APP_CONFIG['save_debug_images']:
+            os.makedirs(request_debug_dir, exist_ok=True)
+        trace = Trace(STAGE_SECONDS, request_id)
+        
+        # Glyphs the last delta could not get labelled
+        response_data = label_pending_glyphs(session, request_id)
+        if response_data and 'inference' in response_data:
+            trace.lap('network', inference=response_data['inference'])
+        else:
+            trace.lap('network')
+        with session.lock:
+            glyphs = session.in_order()
+            char_images = session.char_images()
+            char_positions = session.char_positions()
+            labels = [glyph['label'] for glyph in glyphs]
+            debug_images = [png_data_url(glyph_png(glyph)) for glyph in glyphs]
+            if APP_CONFIG['save_debug_images']:
+                queue_image_write(f'{request_debug_dir}/original.png', session.gray.copy())
+        GLYPHS.observe(len(glyphs))
+        data_prefix = save_glyph_copies(char_images, request_debug_dir)
+        trace.lap('encode')
+        
+        # As in /process_equation, positions only line up with a complete set of labels
+        recognized = bool(labels) and None not in labels
+        record_capture(request_id, data_prefix, len(labels), labels if recognized else None)
+        equation = ' '.join(labels) if recognized else " "
+        display_equation, calculation_equation = postprocess_equation(
+            equation, char_positions if recognized else None)
+        trace.lap('postprocess')
+        return equation_response(request_id, trace, display_equation, calculation_equation, debug_images)
+
+def extract_characters(img, debug=False, timing=None, debug_dir='static/debug_images'):
+    """
+    Extract individual character images and their positional metadata from the
+    provided grayscale image.  This implementation is based on connected
+    component analysis instead of a naïve column scan.  The previous column
+    scan tended to merge characters that shared the same x-range (for
+    instance a superscript that is slightly to the right of the base letter),
+    which in turn prevented reliable exponent detection.  Using connected
+    components guarantees that spatially disconnected blobs – even if they
+    share columns – are treated as separate characters.
+
+    All crops are cleaned as one batch: they are centred side by side on a
+    single white canvas that gets one threshold and one morphology pass, and
+    come back as an N x 28 x 28 uint8 array (black on white) – the size the
+    board feeds to the DPU. The steps live in segmentation.py, shared with
+    incremental sessions. The scan/bounding-box images are only rendered
+    when ``debug`` is set, into ``debug_dir``; ``timing`` (a dict) receives
+    seconds per stage.
+    """
+    stages = timing if timing is not None else {}
+    clock = [time.perf_counter()]
+
+    def lap(stage):
+        now = time.perf_counter()
+        stages[stage] = now - clock[0]
+        clock[0] = now
+
+    # 1. Binarise and invert so that foreground is 1, background is 0
+    binary_inv = binarize(img)
+    if debug:
+        queue_image_write(f'{debug_dir}/binary_for_scan.png', binary_inv)
+
+    # 2. Connected component analysis (8-way connectivity)
+    stats = component_stats(binary_inv)
+    lap('scan')
+
+    # 3. Glyph boxes: noise dropped, left to right, '=' bars merged
+    boxes = glyph_boxes(stats)
+    lap('components')
+
+    if not boxes:
+        return np.empty((0, 28, 28), np.uint8), []
+
+    # Thresholding is per pixel, so do it once for the whole drawing
+    char_images = crop_glyphs(clean_glyphs(img), boxes, lap)
+    char_positions = glyph_positions(boxes)
+
+    if debug:
+        # For visual inspection – draw bounding boxes
+        debug_boxes_img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        height, width = img.shape
+        for box in zip(*(side.tolist() for side in padded_boxes(boxes, width, height))):
+            cv2.rectangle(debug_boxes_img, box[:2], (box[2] - 1, box[3] - 1), (0, 0, 255), 1)
+        queue_image_write(f'{debug_dir}/boxes_connected_components.png', debug_boxes_img)
+    lap('debug')
+
+    return char_images, char_positions
+
+def postprocess_equation(equation, char_positions=None):
+    """
+    (display, calculation) forms of the board's space-separated labels:
+    exponents placed from ``char_positions`` (when given), digits joined,
+    operators spaced, and explicit '*' for the calculation form.
+    """
     # Remove duplicate equals signs that can arise if the '=' glyph was split into
     # two separate strokes ("= =" or "==") by the recognition pipeline.
     equation = re.sub(r'=\s*=+', '=', equation)
     
     # Process positional information for superscripts/exponents
-    if char_positions and not is_mock and response_data:
-        # If we have position data and a response from the recognition service
+    if char_positions:
         equation = detect_and_apply_exponents(equation, char_positions)
     
     # Combine adjacent numbers that are separated by spaces (e.g., "3 4" -> "34")
@@ -195,186 +670,7 @@ def process_equation():
     
     # For internal calculation, add explicit multiplication between coefficients and variables
     calculation_equation = re.sub(r'(\d+)([a-zA-Z])', r'\1*\2', display_equation)
-        
-    # Generate plot
-    plot_path = generate_plot(calculation_equation)
-    
-    # Count the total number of character images in the data folder
-    total_data_images = count_data_images()
-    
-    return jsonify({
-        'equation': display_equation, 
-        'plot': plot_path,
-        'debug_images': debug_image_paths,
-        'total_data_images': total_data_images
-    })
-
-def extract_characters(img):
-    """
-    Extract individual character images and their positional metadata from the
-    provided grayscale image.  This implementation is based on connected
-    component analysis instead of a naïve column scan.  The previous column
-    scan tended to merge characters that shared the same x-range (for
-    instance a superscript that is slightly to the right of the base letter),
-    which in turn prevented reliable exponent detection.  Using connected
-    components guarantees that spatially disconnected blobs – even if they
-    share columns – are treated as separate characters.
-    """
-
-    # 1. Binarise and invert so that foreground is 1, background is 0
-    _, binary_inv = cv2.threshold(img, 180, 255, cv2.THRESH_BINARY_INV)
-    
-    # Apply dilation to thicken thin strokes for component detection
-    kernel = np.ones((2,2), np.uint8)  # Adjust kernel size as needed for desired thickness
-    binary_inv = cv2.dilate(binary_inv, kernel, iterations=1)
-    
-    cv2.imwrite('static/debug_images/binary_for_scan.png', binary_inv)
-
-    height, width = binary_inv.shape
-
-    # 2. Connected component analysis (8-way connectivity)
-    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
-        binary_inv, connectivity=8)
-
-    char_images = []
-    char_positions = []
-
-    # For visual inspection – draw bounding boxes
-    debug_boxes_img = cv2.cvtColor(img.copy(), cv2.COLOR_GRAY2BGR)
-
-    # Collect component bounding boxes, skip background (label 0)
-    components = []
-    for label in range(1, num_labels):
-        x, y, w, h, area = stats[label]
-
-        # Filter out tiny components / noise
-        if area < 20:  # heuristic threshold – tweak if necessary
-            continue
-
-        components.append((x, y, w, h, label))
-
-    # Sort left-to-right so the order matches reading direction
-    components.sort(key=lambda c: c[0])
-
-    # --- Heuristic merge for '=' sign (two parallel horizontal bars) ---------
-    merged_components = []
-    i = 0
-    while i < len(components):
-        x1, y1, w1, h1, label1 = components[i]
-
-        # Height-to-width ratio for a typical stroke of '=' is very small
-        # Check if this component looks like a horizontal bar
-        is_small_bar_1 = h1 < w1 * 0.6  # More permissive ratio to catch thicker bars
-
-        # Look ahead to see if next component forms the second bar
-        if i + 1 < len(components):
-            x2, y2, w2, h2, label2 = components[i + 1]
-
-            # Calculate horizontal overlap percentage
-            horiz_overlap = min(x1 + w1, x2 + w2) - max(x1, x2)
-            # Avoid division by zero
-            min_width = min(w1, w2)
-            if min_width > 0:
-                horiz_overlap_percent = horiz_overlap / min_width
-            else:
-                horiz_overlap_percent = 0
-            
-            # More relaxed width similarity check
-            widths_similar = abs(w1 - w2) < 0.5 * max(w1, w2)  # Much more lenient
-            is_small_bar_2 = h2 < w2 * 0.6  # More permissive ratio
-            
-            # Calculate vertical positioning metrics
-            center_y1 = y1 + h1 // 2
-            center_y2 = y2 + h2 // 2
-            vertical_gap = abs(center_y1 - center_y2)
-            
-            # Require reasonable vertical proximity (bars stacked, not far apart)
-            stacked = vertical_gap < max(h1, h2) * 5  # Even more generous allowance
-            
-            # Improved equals sign detection with more relaxed conditions
-            # At least ensure both are horizontal bars with some overlap
-            if (is_small_bar_1 and is_small_bar_2 and 
-                horiz_overlap_percent > 0.3 and  # Reduced overlap requirement
-                widths_similar and stacked):
-
-                # Merge into one component representing '='
-                x_merge = min(x1, x2)
-                y_merge = min(y1, y2)
-                right_merge = max(x1 + w1, x2 + w2)
-                bottom_merge = max(y1 + h1, y2 + h2)
-                w_merge = right_merge - x_merge
-                h_merge = bottom_merge - y_merge
-
-                merged_components.append((x_merge, y_merge, w_merge, h_merge, None))
-                i += 2  # Skip the next component as it's merged
-                continue
-
-        # If not merged, append the current component as is
-        merged_components.append((x1, y1, w1, h1, label1))
-        i += 1
-
-    # Replace components list with merged version
-    components = merged_components
-
-    # Padding values (tuned empirically – same as previous implementation)
-    h_padding = 15
-    v_padding = 10  # generous vertical padding to keep superscripts intact
-    
-    # Define a smaller kernel for the final character images
-    char_kernel = np.ones((2, 2), np.uint8)
-
-    for x, y, w, h, label in components:
-        # Bounding box with padding (clipped to image bounds)
-        x_start = max(0, x - h_padding)
-        y_start = max(0, y - v_padding)
-        x_end = min(width, x + w + h_padding)
-        y_end = min(height, y + h + v_padding)
-
-        # Draw rectangle for debugging
-        cv2.rectangle(debug_boxes_img, (x_start, y_start), (x_end - 1, y_end - 1), (0, 0, 255), 1)
-
-        # Crop, centre on square canvas, and threshold to pure black/white
-        char_img = img[y_start:y_end, x_start:x_end]
-        if char_img.size == 0:
-            continue
-
-        h_char, w_char = char_img.shape
-        max_dim = max(h_char, w_char)
-        square_img = np.full((max_dim, max_dim), 255, dtype=np.uint8)
-        y_offset = (max_dim - h_char) // 2
-        x_offset = (max_dim - w_char) // 2
-        square_img[y_offset:y_offset + h_char, x_offset:x_offset + w_char] = char_img
-
-        # Re-binarise to remove anti-aliased grey values
-        _, final_img = cv2.threshold(square_img, 245, 255, cv2.THRESH_BINARY)
-        
-        # Invert for dilation (black on white → white on black)
-        final_img_inv = cv2.bitwise_not(final_img)
-        
-        # Apply dilation to thicken strokes in the final character image
-        final_img_inv = cv2.dilate(final_img_inv, char_kernel, iterations=2)
-        
-        # Invert back (white on black → black on white)
-        final_img = cv2.bitwise_not(final_img_inv)
-
-        char_images.append(final_img)
-
-        # Positional metadata (centroid & bbox)
-        char_positions.append({
-            'x': x + w // 2,
-            'y': y + h // 2,
-            'width': w,
-            'height': h,
-            'top': y,
-            'bottom': y + h,
-            'left': x,
-            'right': x + w
-        })
-
-    # Save debug image
-    cv2.imwrite('static/debug_images/boxes_connected_components.png', debug_boxes_img)
-
-    return char_images, char_positions
+    return display_equation, calculation_equation
 
 def detect_and_apply_exponents(equation, char_positions):
     """
@@ -470,188 +766,83 @@ def detect_and_apply_exponents(equation, char_positions):
 
     return modified_equation
 
+# Finished PNGs keyed on the normalised calculation equation
+@functools.lru_cache(maxsize=APP_CONFIG['plot_cache_size'])
+def plot_equation_png(equation):
+    """
+    Render a calculation equation to PNG bytes, or None if it cannot be
+    plotted; in a pool worker unless plot_workers is 0. Raises PlotTimeout
+    (never cached) when the pool misses the deadline.
+    """
+    if PLOT_POOL is None:
+        png, stages = render_plot(equation)
+    else:
+        png, stages = PLOT_POOL.render(equation)
+    for stage, seconds in stages.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    return png
+
 def generate_plot(equation):
-    try:
-        print(f"Starting to generate plot for equation: {equation}")
-        
-        # Make a copy of the original equation for display purposes
-        display_equation = equation
-        
-        # Split equation by equals sign
-        parts = equation.split('=')
-        if len(parts) != 2:
-            print(f"Error: Invalid equation format, needs an equals sign: {equation}")
-            return None
-        
-        left_side = parts[0].strip()
-        right_side = parts[1].strip()
-                
-        # Determine the variable names
-        # Left side is the dependent variable (y-axis)
-        y_var = left_side if len(left_side) == 1 else 'y'  # Use single letter variable or default to 'y'
-        
-        # Determine independent variable (x-axis) from the right side
-        # Default to 'x' if we can't find another variable
-        x_var = 'x'
-                
-        # Try direct numerical evaluation for non-pi constants
-        if x_var not in right_side:
-            try:
-                constant = float(right_side)
-                
-                # Generate horizontal line
-                x_vals = np.linspace(-10, 10, 2)
-                y_vals = np.full_like(x_vals, constant)
-                
-                # Create a wider canvas with a narrower plot area
-                plt.figure(figsize=(14, 6), dpi=100)  # Increased width even more
-                plt.plot(x_vals, y_vals, 'b-', linewidth=1.5)
-                plt.axhline(y=0, color='k', linestyle='-', alpha=0.3)
-                plt.axvline(x=0, color='k', linestyle='-', alpha=0.3)
-                plt.grid(True, alpha=0.3)
-                plt.xlabel(x_var)
-                plt.ylabel(y_var)
-                
-                # # Make the plot area narrower by adjusting margins
-                # plt.subplots_adjust(left=0.25, right=0.75)  # Add more space on left and right
-                
-                plot_path = 'static/debug_images/plot.png'
-                plt.savefig(plot_path, bbox_inches='tight', pad_inches=0.3)
-                plt.close()
-                
-                return plot_path
-            except ValueError:
-                print(f"Not a simple numeric constant: {right_side}")
-                # Continue with other parsing methods
-        
-        # Default to using sympy for all other cases
-        return plot_with_sympy(equation, display_equation, x_var, y_var)
-            
-    except Exception as e:
-        print(f"General error in plot generation: {e}")
-        import traceback
-        traceback.print_exc()
-        
-    # If we reach here, plotting failed
-    return None
-
-def contains_x_pow_nonint(expr, x_var):
-    # Recursively check if any Pow node has x as the base and a non-integer or variable exponent
-    if isinstance(expr, sp.Pow):
-        base, exp = expr.args
-        if base == sp.Symbol(x_var):
-            # If exponent is a constant integer (Python int, float with integer value, or SymPy Integer)
-            if (
-                isinstance(exp, int)
-                or (isinstance(exp, float) and exp.is_integer())
-                or (hasattr(exp, 'is_integer') and exp.is_integer and exp.is_number)
-            ):
-                return False
-            else:
-                return True
-    for arg in getattr(expr, 'args', []):
-        if contains_x_pow_nonint(arg, x_var):
-            return True
-    return False
-
-def plot_with_sympy(equation, display_equation, x_var, y_var):
     """
-    Helper function to handle plotting with sympy for non-constant expressions
-    Sets x-range based on the mathematical domain of the expression.
-    Plots only where the function is real and finite.
+    Plot a calculation equation and return it as a PNG data URL (None if it
+    cannot be plotted or missed its deadline). Repeated equations come
+    straight from the cache.
     """
+    # Operators are already space-separated; only collapse whitespace for the key
+    key = ' '.join(equation.split())
     try:
-        # Split equation by equals sign
-        parts = equation.split('=')
-        right_side = parts[1].strip()
-        # Ensure negative exponents (including -3x, -2.5x, -x, etc.) are wrapped in parentheses
-        right_side = re.sub(r'(\^|\*\*)\s*(-[a-zA-Z0-9.]+)', r'\1(\2)', right_side)
-        right_side_normalized = right_side.replace('^', '**')
-        sym_var = sp.symbols(x_var)
-        transformations = (standard_transformations + (implicit_multiplication_application,))
-        expr = parse_expr(right_side_normalized.replace('pi', 'sp.pi'), transformations=transformations, local_dict={"sp": sp, x_var: sym_var})
-        # Robustly restrict x domain if x is in the base of a power with non-integer exponent
-        restrict_positive_x = contains_x_pow_nonint(expr, x_var)
-        if restrict_positive_x:
-            x_vals = np.linspace(1e-3, 10, 1000)  # Wider positive domain
+        if APP_CONFIG['cache_plot_png']:
+            png = plot_equation_png(key)
         else:
-            x_vals = np.linspace(-10, 10, 1000)   # Wider full domain
-        f = lambdify(sym_var, expr, "numpy")
-        y_vals = f(x_vals)
-        y_vals = np.array(y_vals, dtype=np.complex128)
-        valid_indices = np.isfinite(y_vals) & (np.isreal(y_vals))
-        # Filter out extreme y-values for better visualization
-        y_abs_max = 1e4  # Threshold for extreme values
-        finite_indices = valid_indices & (np.abs(y_vals) < y_abs_max)
-        x_filtered = x_vals[finite_indices]
-        y_filtered = np.real(y_vals[finite_indices])
-        # Further filter out x very close to zero to avoid singularities
-        nonzero_indices = np.abs(x_filtered) > 1e-3
-        x_filtered = x_filtered[nonzero_indices]
-        y_filtered = y_filtered[nonzero_indices]
-        plt.figure(figsize=(8, 6), dpi=100)
-        plt.plot(x_filtered, y_filtered, 'b-', linewidth=2)
-        plt.axhline(y=0, color='k', linestyle='-', alpha=0.3)
-        plt.axvline(x=0, color='k', linestyle='-', alpha=0.3)
-        plt.grid(True, alpha=0.3)
-        plt.xlabel(x_var)
-        plt.ylabel(y_var)
-        # Set x-limits with padding and clamping
-        if len(x_filtered) > 0:
-            x_min = np.min(x_filtered)
-            x_max = np.max(x_filtered)
-            x_left, x_right = smart_axis_limits(x_min, x_max)
-            plt.xlim([x_left, x_right])
-        # Set y-limits with padding and clamping
-        if len(y_filtered) > 0:
-            y_min = np.min(y_filtered)
-            y_max = np.max(y_filtered)
-            y_bottom, y_top = smart_axis_limits(y_min, y_max)
-            plt.ylim([y_bottom, y_top])
-        plot_path = 'static/debug_images/plot.png'
-        plt.savefig(plot_path, bbox_inches='tight', pad_inches=0.3)
-        plt.close()
-        return plot_path
-    except Exception as e:
-        print(f"Error in sympy plotting: {e}")
-        import traceback
-        traceback.print_exc()
+            png = plot_equation_png.__wrapped__(key)
+    except PlotTimeout as e:
+        print(f"[PLOT] {e}: {key}")
+        ERRORS.inc(kind='plot_timeout')
         return None
+    return png_data_url(png) if png else None
+
+def _plot_later(request_id, equation):
+    """async_plot: render off the request and leave the result for GET /plot/<request_id>"""
+    try:
+        PLOTS.put(request_id, generate_plot(equation) or '')
+    except Exception as e:
+        print(f"[PLOT] Background plot failed: {e}")
+        PLOTS.put(request_id, '')
 
-def smart_axis_limits(min_val, max_val, min_limit=-10, max_limit=10, min_width=1):
-    # Clamp to reasonable limits
-    min_val = max(min_val, min_limit)
-    max_val = min(max_val, max_limit)
-    # Ensure minimum width
-    if max_val - min_val < min_width:
-        center = (max_val + min_val) / 2
-        min_val = center - min_width / 2
-        max_val = center + min_width / 2
-    # Add 10% padding
-    padding = (max_val - min_val) * 0.1
-    return min_val - padding, max_val + padding
+@app.route('/plot/<request_id>')
+def get_plot(request_id):
+    """The plot of an async_plot request, waiting as long as the pool may take for it"""
+    plot_url = PLOTS.pop(request_id, timeout=APP_CONFIG['plot_queue_timeout'] + APP_CONFIG['plot_timeout'] + 1.0)
+    if plot_url is None:
+        return jsonify({'plot': None, 'error': 'Plot not ready or unknown request'}), 404
+    return jsonify({'plot': plot_url or None})
 
 @app.route('/receive', methods=['POST'])
 def receive_prediction():
     """Endpoint for receiving prediction string from PYNQ"""
-    global LATEST_PREDICTION
+    REQUESTS.inc(endpoint='receive')
     try:
         data = request.get_json(force=True) or {}
         print("[SERVER] Prediction arrived:", data)
         
-        # Store the prediction text in the global variable
-        if 'text' in data:
-            LATEST_PREDICTION = data['text'].strip()
+        # Store the prediction under the ID of the request that produced it
+        request_id = data.get('request_id') or request.headers.get(REQUEST_ID_HEADER)
+        if 'text' in data and request_id:
+            PREDICTIONS.put(request_id, data['text'].strip())
+        elif 'text' in data:
+            print("[SERVER] Prediction without request_id ignored")
         
         # If you want to save data['text'] or update UI - this is the place
         return jsonify({"ok": True})
     except Exception as e:
         print(f"[SERVER] Error in receive_prediction: {e}")
+        ERRORS.inc(kind='receive')
         return jsonify({"ok": False, "error": str(e)}), 400
 
 # Route to handle feedback submissions
 @app.route('/feedback', methods=['POST'])
 def record_feedback():
+    REQUESTS.inc(endpoint='feedback')
     try:
         # Get feedback data from request
         data = request.json
@@ -661,50 +852,13 @@ def record_feedback():
         is_correct = data.get('is_correct', False)
         correction = data.get('correction', None)
         timestamp = data.get('timestamp', datetime.now().isoformat())
+        request_id = data.get('request_id')
         
         print(f"[FEEDBACK] Processing: recognized='{recognized}', is_correct={is_correct}, correction='{correction}'")
         
-        # Read existing feedback data
-        try:
-            with open(FEEDBACK_FILE, 'r') as f:
-                feedback_data = json.load(f)
-                print(f"[FEEDBACK] Successfully loaded existing data with {len(feedback_data.get('feedback_entries', []))} entries")
-        except (FileNotFoundError, json.JSONDecodeError) as file_error:
-            # If file doesn't exist or is invalid, create a new data structure
-            print(f"[FEEDBACK] Error loading feedback file: {file_error}. Creating new data structure.")
-            feedback_data = {
-                'feedback_entries': [],
-                'stats': {
-                    'total': 0,
-                    'correct': 0,
-                    'incorrect': 0,
-                    'accuracy': 0
-                }
-            }
-        
-        # Add new feedback entry
-        feedback_data['feedback_entries'].append({
-            'recognized': recognized,
-            'is_correct': is_correct,
-            'correction': correction,
-            'timestamp': timestamp
-        })
-        
-        # Update statistics
-        stats = feedback_data['stats']
-        stats['total'] += 1
-        if is_correct:
-            stats['correct'] += 1
-        else:
-            stats['incorrect'] += 1
-        
-        # Calculate accuracy
-        stats['accuracy'] = round((stats['correct'] / stats['total']) * 100, 2) if stats['total'] > 0 else 0
-        
-        # Save updated feedback data
-        with open(FEEDBACK_FILE, 'w') as f:
-            json.dump(feedback_data, f, indent=2)
-            print(f"[FEEDBACK] Successfully saved feedback data with {len(feedback_data['feedback_entries'])} entries")
+        # One appended row and an in-place update of the running totals
+        stats = FEEDBACK.add(recognized, is_correct, correction, timestamp, request_id)
+        print(f"[FEEDBACK] Recorded entry {stats['total']}")
         
         return jsonify({
             'success': True, 
@@ -713,10 +867,27 @@ def record_feedback():
         })
     except Exception as e:
         print(f"[FEEDBACK] Error recording feedback: {e}")
+        ERRORS.inc(kind='feedback')
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/feedback', methods=['GET'])
+def list_feedback():
+    """Page through feedback: ?after_id=<last id seen>&limit=100&is_correct=true|false"""
+    after_id = request.args.get('after_id', 0, type=int)
+    # SQLite reads a negative LIMIT as none at all
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    verdict = request.args.get('is_correct')
+    is_correct = None if verdict is None else verdict.lower() in ('1', 'true', 'yes')
+    entries = FEEDBACK.entries(after_id, limit, is_correct)
+    return jsonify({
+        'entries': entries,
+        'stats': FEEDBACK.stats(),
+        'next_after_id': entries[-1]['id'] if entries and len(entries) == limit else None
+    })
+
 
 if __name__ == '__main__':
+    # Single process development server; serve.py runs several workers
     app.run(host='0.0.0.0', port=5000, debug=False) 
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""
+End-to-end /process_equation benchmark against a local stand-in board.
+
+The stand-in serves /upload and /upload_raw like the PYNQ notebook, but runs
+the bit-exact DPUEmulator behind an EmulatedDMA that takes ``--dma-latency``
+seconds per glyph, so the whole draw-to-plot path runs without hardware.
+Equations are synthesised from the glyphs in ``Samples/`` (see
+bench_extract.py), 4-12 glyphs each.
+
+Every concurrency level reports p50/p95/p99 latency, requests/s and the mean
+per-stage split that /process_equation returns with ``report_timing`` on:
+base64, imdecode, extract, encode, network (including the board's reading,
+decoding and wait for its DPU lock), inference (preprocessing and DPU on the
+board), postprocess, plot. Results go to JSON for comparison between
+releases.
+
+    python bench_e2e.py --concurrency 1 4 16 64 --requests 200 \\
+                        [--dma-latency 0.0008] [--binary] [--output bench.json]
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import requests
+from flask import Flask, request, jsonify, abort
+from PIL import Image
+
+from bench_extract import load_samples, synthetic_equation
+from load_test import serve
+from result_store import REQUEST_ID_HEADER
+
+PYNQ_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'PYNQ')
+STAGES = ('base64', 'imdecode', 'extract', 'encode', 'network', 'inference', 'postprocess', 'plot')
+
+
+def create_board(target_url, dma_latency, ring_size=32):
+    """Stand-in for the notebook server: same endpoints, batch DMA path, emulated DPU."""
+    sys.path.insert(0, PYNQ_DIR)
+    from batch_predict import BatchPredictor
+    from dpu_emulator import DPUEmulator, EmulatedDMA, emulated_allocate
+    from golden_vectors import transform
+    from weight_image import read_weight_image
+    from app import RAW_HEADER
+
+    weights = read_weight_image(os.path.join(PYNQ_DIR, 'model_info.bin'))
+    predictor = BatchPredictor(EmulatedDMA(DPUEmulator(weights.lists), dma_latency), emulated_allocate, ring_size)
+    dpu_lock = threading.Lock()
+    callback = requests.Session()
+    board = Flask('standin_board')
+
+    def deliver(batch, preprocess=0.0):
+        with dpu_lock:
+            start = time.perf_counter()
+            indices = predictor.predict_batch(batch)
+            inference = preprocess + time.perf_counter() - start
+        expr_str = " ".join(str(weights.label_mapping[str(idx)]) for idx in indices)
+        request_id = request.headers.get(REQUEST_ID_HEADER)
+        reply = callback.post(target_url, json={"text": expr_str, "request_id": request_id}, timeout=5).json()
+        return jsonify({"text": expr_str, "request_id": request_id, "callback": reply, "inference": inference})
+
+    @board.route('/upload', methods=['POST'])
+    def upload():
+        files = sorted(request.files.getlist('file'), key=lambda f: f.filename)
+        images = [Image.open(io.BytesIO(f.read())) for f in files]
+        start = time.perf_counter()
+        batch = np.array([transform(img, weights.input_scale, weights.input_zero_point) for img in images])
+        return deliver(batch, time.perf_counter() - start)
+
+    @board.route('/upload_raw', methods=['POST'])
+    def upload_raw():
+        payload = request.get_data()
+        _, count, _, scale, zero_point = RAW_HEADER.unpack_from(payload)
+        if len(payload) != RAW_HEADER.size + count * 784:
+            abort(400, "Payload size does not match glyph count")
+        if (scale, zero_point) != (weights.input_scale, weights.input_zero_point):
+            abort(409, "Glyphs quantized for another model")
+        return deliver(np.frombuffer(payload, np.uint8, offset=RAW_HEADER.size).reshape(count, 784))
+
+    @board.route('/models', methods=['GET'])
+    def models():
+        model = {'id': 'model_info', 'input_scale': weights.input_scale,
+                 'input_zero_point': weights.input_zero_point, 'active': True}
+        return jsonify({'models': [model], 'active': model['id']})
+
+    return board
+
+
+def make_equations(count, seed=0):
+    """``count`` distinct drawings as data URLs, 4-12 glyphs each."""
+    samples = load_samples()
+    rng = np.random.default_rng(seed)
+    urls = []
+    for i in range(count):
+        canvas = synthetic_equation(samples, int(rng.integers(4, 13)), seed=seed + i)
+        png = cv2.imencode('.png', canvas)[1].tobytes()
+        urls.append('data:image/png;base64,' + base64.b64encode(png).decode('ascii'))
+    return urls
+
+
+def percentiles(values):
+    ms = np.asarray(values) * 1e3
+    return {'p50': float(np.percentile(ms, 50)), 'p95': float(np.percentile(ms, 95)),
+            'p99': float(np.percentile(ms, 99)), 'mean': float(ms.mean()), 'max': float(ms.max())}
+
+
+def run_level(url, equations, requests_count, concurrency):
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            resp = session.post(url, json={'image': equations[i % len(equations)]}, timeout=60)
+            resp.raise_for_status()
+            timing = resp.json().get('timing', {})
+        except requests.RequestException:
+            return time.perf_counter() - start, None
+        return time.perf_counter() - start, timing
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(requests_count)))
+    elapsed = time.perf_counter() - start
+
+    timings = [timing for _, timing in results if timing is not None]
+    return {
+        'concurrency': concurrency,
+        'requests': requests_count,
+        'errors': requests_count - len(timings),
+        'rps': requests_count / elapsed,
+        'latency_ms': percentiles([latency for latency, timing in results if timing is not None]),
+        'stages_ms': {stage: 1e3 * sum(t.get(stage, 0.0) for t in timings) / max(len(timings), 1)
+                      for stage in STAGES},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(level):
+    lat = level['latency_ms']
+    print(f"{level['concurrency']:>4} | {level['rps']:7.1f} | {lat['p50']:7.1f} {lat['p95']:7.1f} "
+          f"{lat['p99']:7.1f} | " + " ".join(f"{level['stages_ms'][stage]:8.2f}" for stage in STAGES)
+          + f" | {level['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--requests', type=int, default=200, help='requests per concurrency level')
+    parser.add_argument('--equations', type=int, default=32, help='distinct synthetic drawings')
+    parser.add_argument('--dma-latency', type=float, default=0.00077, help='seconds per glyph on the DPU')
+    parser.add_argument('--binary', action='store_true', help='use the raw /upload_raw protocol')
+    parser.add_argument('--no-plot-cache', action='store_true', help='render every plot from scratch')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='keep the app and board logging')
+    args = parser.parse_args()
+
+    import app as web
+    web.APP_CONFIG.update(report_timing=True, binary_protocol=args.binary, save_dataset=False,
+                          save_debug_images=False, cache_plot_png=not args.no_plot_cache)
+    if not args.verbose:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    web_server = serve(web.app, 0)
+    web_url = f'http://127.0.0.1:{web_server.server_port}'
+    board_server = serve(create_board(f'{web_url}/receive', args.dma_latency), 0)
+    board_url = f'http://127.0.0.1:{board_server.server_port}'
+    web.APP_CONFIG['endpoint_url'] = f'{board_url}/upload'
+    web.APP_CONFIG['binary_endpoint_url'] = f'{board_url}/upload_raw'
+    web.APP_CONFIG['models_url'] = f'{board_url}/models'
+
+    equations = make_equations(args.equations)
+    print(f"{'conc':>4} | {'req/s':>7} | {'p50':>7} {'p95':>7} {'p99':>7} | "
+          + " ".join(f"{stage:>8}" for stage in STAGES) + " | errors")
+
+    levels = []
+    devnull = open(os.devnull, 'w')
+    for concurrency in args.concurrency:
+        # The app prints a line per request and a traceback per unplottable equation
+        with contextlib.ExitStack() as quiet:
+            if not args.verbose:
+                quiet.enter_context(contextlib.redirect_stdout(devnull))
+                quiet.enter_context(contextlib.redirect_stderr(devnull))
+            run_level(f'{web_url}/process_equation', equations, min(concurrency, 8), concurrency)  # warm-up
+            level = run_level(f'{web_url}/process_equation', equations, args.requests, concurrency)
+        levels.append(level)
+        print_level(level)
+    print("(ms; stages are means per request)")
+
+    if args.output:
+        report = {
+            'revision': git_revision(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'config': vars(args),
+            'levels': levels,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    web_server.shutdown()
+    board_server.shutdown()
+    return 1 if any(level['errors'] for level in levels) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,75 @@
+"""
+Micro-benchmark of ``extract_characters`` split per stage.
+
+Equations are synthesised from the glyphs in ``Samples/``: each glyph is
+inverted to black on white, scaled to drawing size and placed left to right
+with some vertical jitter, like strokes on the canvas.
+
+    python bench_extract.py [--repeats 20] [--debug]
+"""
+
+import argparse
+import glob
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+GLYPH_PX = 90
+STEP_PX = 110
+
+
+def load_samples(folder="../Samples"):
+    paths = sorted(glob.glob(os.path.join(folder, "*.png")) + glob.glob(os.path.join(folder, "*.jpg")))
+    # Samples are white on black like the training set; the canvas is black on white
+    return [255 - np.array(Image.open(p).convert("L")) for p in paths]
+
+
+def synthetic_equation(samples, glyphs, seed=0):
+    rng = np.random.default_rng(seed)
+    canvas = np.full((260, glyphs * STEP_PX + 60), 255, np.uint8)
+    for i in range(glyphs):
+        glyph = cv2.resize(samples[rng.integers(len(samples))], (GLYPH_PX, GLYPH_PX))
+        top = 80 + int(rng.integers(-40, 40))
+        left = 30 + i * STEP_PX + int(rng.integers(-25, 10))
+        region = canvas[top:top + GLYPH_PX, left:left + GLYPH_PX]
+        np.minimum(region, glyph, out=region)
+    return canvas
+
+
+def time_extract(extract_characters, img, repeats, debug=False):
+    totals = {}
+    for _ in range(repeats):
+        timing = {}
+        extract_characters(img, debug=debug, timing=timing)
+        for stage, seconds in timing.items():
+            totals[stage] = totals.get(stage, 0.0) + seconds
+    return {stage: seconds / repeats for stage, seconds in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--debug', action='store_true', help='include debug image rendering')
+    args = parser.parse_args()
+
+    from app import extract_characters
+
+    samples = load_samples()
+    cases = [(f"sample {i}", synthetic_equation([s], 1)) for i, s in enumerate(samples)]
+    cases += [(f"{n} glyphs", synthetic_equation(samples, n, seed=n)) for n in (5, 10, 20, 30, 50)]
+
+    stages = None
+    for name, img in cases:
+        timing = time_extract(extract_characters, img, args.repeats, args.debug)
+        if stages is None:
+            stages = list(timing)
+            print(f"{'case':>10} | " + " ".join(f"{stage:>10}" for stage in stages) + f" | {'total':>8}")
+        print(f"{name:>10} | " + " ".join(f"{timing[stage] * 1e3:10.3f}" for stage in stages)
+              + f" | {sum(timing.values()) * 1e3:8.3f}")
+    print("(ms per call)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Uniform vs adaptive sampling for ``plot_with_sympy``.
+
+Runs a corpus of equations as they come out of /process_equation (the
+model only knows + - 0-9 = x y; exponents come from glyph positions) and,
+for each sampler, reports function evaluations, sampling and render time,
+and the worst on-screen error against a 200k-point reference: the largest
+vertical gap between the drawn polyline and the true curve, in pixels of
+the plot, ignoring the columns at poles and domain edges. "uniform" is
+what plot_with_sympy did before: 1000 evenly spaced points, values over
+1e4 and |x| < 1e-3 dropped and the rest joined by one line.
+
+    python bench_plot.py [--repeats 5] [--output plot_bench.json]
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import plotting
+
+CORPUS = [
+    'y = x', 'y = 2*x + 1', 'y = -3*x + 4', 'y = x^2', 'y = x^2 - 4', 'y = 3*x^2 - 4*x + 1',
+    'y = x^3', 'y = -x^3 + 2*x', 'y = x^4 - 5*x^2 + 4', 'y = 2*x^5 - x', 'y = x^9', 'y = x^99',
+    'y = 10*x^2 + 25', 'y = 2^x', 'y = 3^x - 5', 'y = 2^(-x)', 'y = x^x', 'y = x^(x+1)',
+    'y = x^(-1)', 'y = x^(-2)', 'y = 3*x^(-1) + 2', 'y = x^(-3) - x', 'y = 5 - x^(-2)',
+    'y = (x - 3)^(-1)', 'y = (x + 2)^(-2)', 'y = x^2 + x^(-1)', 'y = 12*x - 7', 'y = 100*x',
+]
+REFERENCE_SAMPLES = 200001
+PLOT_PIXELS = 460  # height of the axes in the 8 x 6 in, 100 dpi figure
+
+
+def uniform_samples(f, lo, hi):
+    """The previous sampler, for comparison."""
+    x_vals = np.linspace(lo, hi, 1000)
+    with np.errstate(all='ignore'):
+        y_vals = np.array(np.broadcast_to(f(x_vals), x_vals.shape), dtype=np.complex128)
+    keep = np.isfinite(y_vals) & np.isreal(y_vals) & (np.abs(y_vals) < 1e4) & (np.abs(x_vals) > 1e-3)
+    return x_vals[keep], np.real(y_vals[keep]), len(x_vals)
+
+
+def adaptive_samples(f, lo, hi):
+    return plotting.sample_function(f, lo, hi)
+
+
+SAMPLERS = {'uniform': uniform_samples, 'adaptive': adaptive_samples}
+
+
+def screen_error(x, y, ref_x, ref_y, bottom, top):
+    """Worst vertical gap in pixels between the polyline (x, y) and the reference."""
+    pixel = (top - bottom) / PLOT_PIXELS
+    ref = np.clip(ref_y, bottom, top)
+    # Drawn polyline at the reference x, NaN inside gaps and outside the drawn range
+    drawn = np.full_like(ref_x, np.nan)
+    segments = np.flatnonzero(np.isfinite(y[:-1]) & np.isfinite(y[1:]))
+    starts, ends = x[segments], x[segments + 1]
+    seg = np.searchsorted(starts, ref_x, side='right') - 1
+    inside = (seg >= 0) & (ref_x <= ends[np.maximum(seg, 0)])
+    s = segments[seg[inside]]
+    t = (ref_x[inside] - x[s]) / (x[s + 1] - x[s])
+    drawn[inside] = np.clip(y[s] + t * (y[s + 1] - y[s]), bottom, top)
+    # Where the reference jumps across the view in one step (a pole) or stops
+    # being defined, any single pixel column may legitimately differ
+    steep = np.abs(np.diff(ref)) > (top - bottom) / 2
+    edge = np.isfinite(ref_y[:-1]) != np.isfinite(ref_y[1:])
+    skip = np.zeros(len(ref_x), bool)
+    for shift in range(-2, 3):
+        skip |= np.roll(np.concatenate((steep | edge, [False])), shift)
+    both = np.isfinite(drawn) & np.isfinite(ref) & ~skip
+    # A drawn segment bridging a pole shows up as a large error here
+    return float(np.max(np.abs(drawn[both] - ref[both])) / pixel) if both.any() else 0.0
+
+
+def run(equation, repeats):
+    spec = plotting.compile_equation(equation)
+    if spec is None or 'constant' in spec:
+        return None
+    lo, hi = (1e-3, 10) if spec['restrict_positive_x'] else (-10, 10)
+    ref_x = np.linspace(lo, hi, REFERENCE_SAMPLES)
+    ref_y = plotting.evaluate(spec['f'], ref_x)
+    bottom, top = plotting.view_limits(np.clip(ref_y, -plotting.Y_CLIP, plotting.Y_CLIP))
+
+    row = {'equation': equation}
+    for name, sampler in SAMPLERS.items():
+        sample_times, render_times = [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            x, y, evaluations = sampler(spec['f'], lo, hi)
+            sample_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            plotting.draw_curve(spec, x, y)
+            render_times.append(time.perf_counter() - start)
+        row[name] = {
+            'evaluations': evaluations,
+            'sample_ms': 1e3 * min(sample_times),
+            'render_ms': 1e3 * min(render_times),
+            'error_px': screen_error(x, y, ref_x, ref_y, bottom, top),
+        }
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=5, help='best of N timings')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    print(f"{'equation':>22} | {'evals':>11} | {'sample ms':>13} | {'render ms':>13} | {'error px':>13}")
+    rows = []
+    for equation in CORPUS:
+        row = run(equation, args.repeats)
+        if row is None:
+            continue
+        rows.append(row)
+        u, a = row['uniform'], row['adaptive']
+        print(f"{equation:>22} | {u['evaluations']:5d} {a['evaluations']:5d} | "
+              f"{u['sample_ms']:6.2f} {a['sample_ms']:6.2f} | {u['render_ms']:6.1f} {a['render_ms']:6.1f} | "
+              f"{u['error_px']:6.1f} {a['error_px']:6.1f}")
+
+    totals = {name: {key: sum(row[name][key] for row in rows) for key in ('evaluations', 'sample_ms', 'render_ms')}
+              for name in SAMPLERS}
+    for name in SAMPLERS:
+        worst = max(row[name]['error_px'] for row in rows)
+        print(f"{name:>9}: {totals[name]['evaluations']} evaluations, {totals[name]['sample_ms']:.1f} ms sampling, "
+              f"{totals[name]['render_ms']:.0f} ms rendering, worst error {worst:.1f} px")
+    print("(columns: uniform adaptive)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rows': rows, 'totals': totals}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
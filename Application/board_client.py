@@ -0,0 +1,115 @@
+"""
+HTTP clients for the PYNQ inference server.
+
+``create_session`` returns one keep-alive ``requests.Session`` that all
+request threads share, so /process_equation reuses pooled TCP connections to
+the board instead of paying a handshake per equation. ``AsyncBoardClient`` is
+the asyncio equivalent (httpx, optional dependency) for callers that must not
+park a thread while the FPGA works.
+"""
+
+import asyncio
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from result_store import REQUEST_ID_HEADER
+
+try:
+    import httpx
+except ImportError:  # only needed for AsyncBoardClient
+    httpx = None
+
+# Gateway errors are safe to retry: the board never saw the request
+RETRY_STATUSES = (502, 503, 504)
+
+
+def create_session(pool_size=8, retries=2, backoff=0.1):
+    """
+    Pooled session with retry/backoff on connection failures and gateway
+    errors. Read errors are not retried since the board may already have run
+    the glyphs.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'POST']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def parse_response(text):
+    """Decode a board reply the same way for the sync and async clients."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as je:
+        print(f"[CLIENT] Warning: Could not parse JSON response: {je}")
+        return {"text": text.strip(), "raw_response": True}
+
+
+class AsyncBoardClient:
+    """
+    asyncio client with a bounded keep-alive pool and the same retry policy
+    as ``create_session``. Use one instance per event loop.
+    """
+
+    def __init__(self, pool_size=8, retries=2, backoff=0.1, timeout=10):
+        if httpx is None:
+            raise ImportError("AsyncBoardClient requires httpx (pip install httpx)")
+        self.retries = retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=timeout,
+        )
+
+    async def post(self, url, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                resp = await self.client.post(url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt == self.retries:
+                    raise
+            else:
+                if resp.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return resp
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def send_images(self, images, endpoint_url, request_id=None):
+        """Async counterpart of ``send_images_to_endpoint``: (filename, png bytes) pairs."""
+        try:
+            files = [('file', (name, png, 'image/png')) for name, png in images]
+            headers = {REQUEST_ID_HEADER: request_id} if request_id else None
+            resp = await self.post(endpoint_url, files=files, headers=headers)
+            resp.raise_for_status()
+            return parse_response(resp.text)
+        except Exception as e:
+            print(f"[CLIENT] Failed to send images: {e}")
+            return {"error": str(e)}
+
+    async def send_payload(self, payload, endpoint_url, request_id=None):
+        """Async counterpart of ``send_glyphs_binary`` for an already packed payload."""
+        try:
+            headers = {'Content-Type': 'application/octet-stream'}
+            if request_id:
+                headers[REQUEST_ID_HEADER] = request_id
+            resp = await self.post(endpoint_url, content=payload, headers=headers)
+            resp.raise_for_status()
+            return parse_response(resp.text)
+        except Exception as e:
+            print(f"[CLIENT] Failed to send glyphs: {e}")
+            return {"error": str(e)}
+
+    async def aclose(self):
+        await self.client.aclose()
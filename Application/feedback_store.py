@@ -0,0 +1,172 @@
+"""
+Append-only store for recognition feedback (SQLite in WAL mode).
+
+Each submission is one INSERT plus an in-place update of the running
+totals, in a single transaction, so recording feedback costs the same no
+matter how much has been collected. WAL lets any number of threads or
+worker processes write to the same file while readers page through the
+entries. Entries from the old ``recognition_feedback.json`` are imported
+once, the first time the database is created next to it.
+
+The ``captures`` table links a request's training glyphs in data/
+(``<glyphs>_<n>.png``) to the labels the board gave them, and feedback
+carries the request ID it is about, so Model/build_shards.py can join the
+two into labelled training data.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    recognized TEXT NOT NULL,
+    is_correct INTEGER NOT NULL,
+    correction TEXT,
+    timestamp  TEXT,
+    request_id TEXT
+);
+CREATE TABLE IF NOT EXISTS captures (
+    request_id TEXT PRIMARY KEY,
+    glyphs     TEXT NOT NULL,
+    count      INTEGER NOT NULL,
+    labels     TEXT,
+    timestamp  TEXT
+);
+CREATE TABLE IF NOT EXISTS stats (
+    id        INTEGER PRIMARY KEY CHECK (id = 1),
+    total     INTEGER NOT NULL,
+    correct   INTEGER NOT NULL,
+    incorrect INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats VALUES (1, 0, 0, 0);
+"""
+
+
+def accuracy(correct, total):
+    return round((correct / total) * 100, 2) if total > 0 else 0
+
+
+class FeedbackStore:
+    """One connection per thread; safe to share between threads and processes."""
+
+    def __init__(self, path, legacy_json=None, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        # executescript commits on its own, so not inside a _Transaction
+        self._connect().db.executescript(SCHEMA)
+        self._migrate()
+        if legacy_json and os.path.exists(legacy_json):
+            self._import_json(legacy_json)
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.row_factory = sqlite3.Row
+            self._local.db = _Transaction(db)
+        return self._local.db
+
+    def _migrate(self):
+        db = self._connect().db
+        columns = [row['name'] for row in db.execute('PRAGMA table_info(feedback)')]
+        if 'request_id' not in columns:
+            try:
+                db.execute('ALTER TABLE feedback ADD COLUMN request_id TEXT')
+            except sqlite3.OperationalError:
+                pass  # another worker added it first
+        db.execute('CREATE INDEX IF NOT EXISTS feedback_request ON feedback (request_id)')
+
+    def _import_json(self, path):
+        try:
+            with open(path, 'r') as f:
+                entries = json.load(f).get('feedback_entries', [])
+        except (OSError, ValueError):
+            return
+        with self._connect() as db:
+            # Only into an empty store, so restarts and other workers never import twice
+            if db.execute('SELECT total FROM stats').fetchone()[0] == 0 and entries:
+                for entry in entries:
+                    self._insert(db, entry.get('recognized', ''), entry.get('is_correct', False),
+                                 entry.get('correction'), entry.get('timestamp'))
+
+    @staticmethod
+    def _insert(db, recognized, is_correct, correction, timestamp, request_id=None):
+        is_correct = bool(is_correct)
+        db.execute('INSERT INTO feedback (recognized, is_correct, correction, timestamp, request_id) '
+                   'VALUES (?, ?, ?, ?, ?)', (recognized, int(is_correct), correction, timestamp, request_id))
+        db.execute('UPDATE stats SET total = total + 1, correct = correct + ?, incorrect = incorrect + ?',
+                   (int(is_correct), int(not is_correct)))
+
+    def add(self, recognized, is_correct, correction=None, timestamp=None, request_id=None):
+        """Append one entry and return the updated stats."""
+        with self._connect() as db:
+            self._insert(db, recognized, is_correct, correction, timestamp, request_id)
+            return self._stats(db)
+
+    def add_capture(self, request_id, glyphs, count, labels=None, timestamp=None):
+        """
+        Record that request ``request_id`` saved ``count`` glyphs as
+        ``<glyphs>_<n>.png``; ``labels`` are the board's, space separated.
+        """
+        self._connect().db.execute(
+            'INSERT OR REPLACE INTO captures (request_id, glyphs, count, labels, timestamp) VALUES (?, ?, ?, ?, ?)',
+            (request_id, glyphs, count, labels, timestamp))
+
+    def labelled_captures(self):
+        """
+        Every capture, oldest first, with the verdict and correction of the
+        latest feedback on its request (None when there is none yet).
+        """
+        rows = self._connect().db.execute(
+            'SELECT c.request_id, c.glyphs, c.count, c.labels, f.is_correct, f.correction '
+            'FROM captures c LEFT JOIN feedback f ON f.id = '
+            '(SELECT MAX(id) FROM feedback WHERE request_id = c.request_id) ORDER BY c.rowid')
+        for row in rows:
+            entry = dict(row)
+            if entry['is_correct'] is not None:
+                entry['is_correct'] = bool(entry['is_correct'])
+            yield entry
+
+    @staticmethod
+    def _stats(db):
+        total, correct, incorrect = db.execute('SELECT total, correct, incorrect FROM stats').fetchone()
+        return {'total': total, 'correct': correct, 'incorrect': incorrect,
+                'accuracy': accuracy(correct, total)}
+
+    def stats(self):
+        return self._stats(self._connect().db)
+
+    def entries(self, after_id=0, limit=100, is_correct=None):
+        """
+        Entries with id > ``after_id``, oldest first; pass the last id back
+        as ``after_id`` for the next page. ``is_correct`` filters by verdict.
+        """
+        query = 'SELECT * FROM feedback WHERE id > ?'
+        params = [after_id]
+        if is_correct is not None:
+            query += ' AND is_correct = ?'
+            params.append(int(is_correct))
+        query += ' ORDER BY id LIMIT ?'
+        params.append(limit)
+        rows = self._connect().db.execute(query, params).fetchall()
+        return [dict(row, is_correct=bool(row['is_correct'])) for row in rows]
+
+
+class _Transaction:
+    """``with`` wraps the block in BEGIN IMMEDIATE / COMMIT (ROLLBACK on error)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
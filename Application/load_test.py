@@ -0,0 +1,172 @@
+"""
+Concurrent /process_equation load test against a local stand-in board.
+
+Each simulated user draws a different number of vertical strokes; the
+stand-in board answers "y = d d d ..." with one digit per stroke beyond the
+first two, after a random delay so replies come back out of order. Every
+response must carry the equation derived from its own drawing.
+
+With ``--async`` the glyphs skip the web app and go straight to the board
+through ``AsyncBoardClient``, ``--concurrency`` requests in flight on one
+event loop. Every reply must echo the request ID the client sent.
+
+    python load_test.py --requests 200 --concurrency 16 [--binary] [--async]
+"""
+
+import argparse
+import asyncio
+import base64
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import requests
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+from board_client import AsyncBoardClient
+from result_store import REQUEST_ID_HEADER, new_request_id
+
+WEB_PORT = 5810
+BOARD_PORT = 5820
+
+
+def draw_strokes(count):
+    """White canvas with ``count`` separate vertical bars, as a data URL."""
+    canvas = np.full((200, 80 * count + 40), 255, np.uint8)
+    for i in range(count):
+        x = 40 + 80 * i
+        cv2.rectangle(canvas, (x, 50), (x + 12, 150), 0, -1)
+    ok, png = cv2.imencode('.png', canvas)
+    return 'data:image/png;base64,' + base64.b64encode(png.tobytes()).decode()
+
+
+def board_text(glyph_count):
+    """The stand-in board's prediction for ``glyph_count`` glyphs."""
+    digit = str(glyph_count - 2)
+    return " ".join(["y", "="] + [digit] * (glyph_count - 2))
+
+
+def expected_equation(count):
+    digit = str(count - 2)
+    return f"y = {digit * (count - 2)}"
+
+
+def create_board(target_url, max_delay):
+    """Stand-in for the PYNQ server: same endpoints, request ID echo and callback."""
+    board = Flask('standin_board')
+    callback = requests.Session()
+
+    def answer(glyph_count):
+        expr_str = board_text(glyph_count)
+        request_id = request.headers.get(REQUEST_ID_HEADER)
+        time.sleep(random.uniform(0, max_delay))
+        reply = callback.post(target_url, json={"text": expr_str, "request_id": request_id}, timeout=5).json()
+        return jsonify({"text": expr_str, "request_id": request_id, "callback": reply})
+
+    @board.route('/upload', methods=['POST'])
+    def upload():
+        return answer(len(request.files.getlist('file')))
+
+    @board.route('/upload_raw', methods=['POST'])
+    def upload_raw():
+        return answer(int.from_bytes(request.get_data()[4:6], 'little'))
+
+    return board
+
+
+async def run_async(web, counts, concurrency, binary):
+    """Send each count's glyphs to the board with AsyncBoardClient; (count, request ID, reply) triples."""
+    client = AsyncBoardClient(pool_size=concurrency)
+    slots = asyncio.Semaphore(concurrency)
+    glyph = np.zeros((28, 28), np.uint8)
+
+    async def one(count):
+        request_id = new_request_id()
+        async with slots:
+            if binary:
+                reply = await client.send_payload(web.pack_glyphs([glyph] * count),
+                                                  web.APP_CONFIG['binary_endpoint_url'], request_id)
+            else:
+                images = [(f'{i}.png', web.encode_png(glyph)) for i in range(count)]
+                reply = await client.send_images(images, web.APP_CONFIG['endpoint_url'], request_id)
+        return count, request_id, reply
+
+    try:
+        return await asyncio.gather(*(one(count) for count in counts))
+    finally:
+        await client.aclose()
+
+
+def serve(flask_app, port):
+    server = make_server('127.0.0.1', port, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--binary', action='store_true', help='use the raw /upload_raw protocol')
+    parser.add_argument('--max-delay', type=float, default=0.05, help='stand-in board latency (s)')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='send glyphs to the board with AsyncBoardClient instead of through the web app')
+    args = parser.parse_args()
+
+    import app as web
+    web.APP_CONFIG['endpoint_url'] = f'http://127.0.0.1:{BOARD_PORT}/upload'
+    web.APP_CONFIG['binary_endpoint_url'] = f'http://127.0.0.1:{BOARD_PORT}/upload_raw'
+    web.APP_CONFIG['binary_protocol'] = args.binary
+
+    servers = [
+        serve(web.app, WEB_PORT),
+        serve(create_board(f'http://127.0.0.1:{WEB_PORT}/receive', args.max_delay), BOARD_PORT),
+    ]
+
+    counts = [random.randint(3, 7) for _ in range(args.requests)]
+    if args.use_async:
+        start = time.perf_counter()
+        results = asyncio.run(run_async(web, counts, args.concurrency, args.binary))
+        elapsed = time.perf_counter() - start
+        mismatches = [(count, request_id, reply) for count, request_id, reply in results
+                      if reply.get('text') != board_text(count) or reply.get('request_id') != request_id]
+        for count, request_id, reply in mismatches[:10]:
+            print(f"MISMATCH: {count} glyphs, request {request_id} -> {reply}")
+        print(f"{len(results)} async requests, concurrency {args.concurrency}, "
+              f"{len(results) / elapsed:.1f} req/s, {len(mismatches)} mismatched")
+        for server in servers:
+            server.shutdown()
+        return 1 if mismatches else 0
+
+    client = requests.Session()
+    client.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    def one(count):
+        resp = client.post(f'http://127.0.0.1:{WEB_PORT}/process_equation',
+                           json={'image': draw_strokes(count)}, timeout=60)
+        resp.raise_for_status()
+        return count, resp.json()['equation']
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(one, counts))
+    elapsed = time.perf_counter() - start
+
+    mismatches = [(count, eq) for count, eq in results if eq != expected_equation(count)]
+    for count, eq in mismatches[:10]:
+        print(f"MISMATCH: {count} strokes -> '{eq}', expected '{expected_equation(count)}'")
+    print(f"{len(results)} requests, concurrency {args.concurrency}, "
+          f"{len(results) / elapsed:.1f} req/s, {len(mismatches)} mismatched, "
+          f"{len(web.PREDICTIONS)} results left in store")
+
+    for server in servers:
+        server.shutdown()
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
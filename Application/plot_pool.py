@@ -0,0 +1,154 @@
+"""
+Warm plotting processes with a deadline per job.
+
+A misrecognised glyph can turn into an expression SymPy or NumPy takes
+seconds over (a huge exponent from detect_and_apply_exponents, say). Run
+on the request thread, that holds PLOT_LOCK and stalls every other plot.
+Here ``render()`` hands the equation to one of ``workers`` child processes
+(this file run as a script, with plotting.py imported and one throwaway
+plot rendered before it reports ready) and waits until the deadline. The
+deadline starts when a worker takes the job: a worker that has not
+answered ``timeout`` seconds later is killed and replaced in the
+background, and ``render()`` raises ``PlotTimeout``. Waiting for an idle
+worker has its own limit, ``queue_timeout``, so a burst of requests queues
+behind the workers instead of running out the render deadline in line; a
+job still waiting after it raises ``PlotTimeout`` too. The caller is back
+within ``queue_timeout + timeout`` seconds.
+
+Workers are plain subprocesses talking over a socket pair, not
+multiprocessing children, so they never re-import the web app as their
+main module. Their output is printed by the parent, so it goes wherever
+the app's own prints go. They exit when the parent goes away.
+"""
+
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection
+
+WORKER_SCRIPT = os.path.abspath(__file__)
+WARMUP_EQUATION = 'y = x'
+
+
+class PlotTimeout(Exception):
+    """No plot by the deadline."""
+
+
+class _Worker:
+    def __init__(self):
+        self.conn, child = multiprocessing.Pipe()
+        self.proc = subprocess.Popen([sys.executable, WORKER_SCRIPT, str(child.fileno())],
+                                     pass_fds=(child.fileno(),), stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT, text=True)
+        child.close()
+        threading.Thread(target=self._relay_output, daemon=True).start()
+
+    def _relay_output(self):
+        for line in self.proc.stdout:
+            print(line, end='')
+
+    def wait_ready(self, timeout):
+        return self.conn.poll(timeout) and self.conn.recv() == 'ready'
+
+    def kill(self):
+        self.proc.kill()
+        self.proc.wait()
+        self.conn.close()
+
+
+class PlotPool:
+    """
+    ``workers`` plotting processes; ``render()`` gives up after
+    ``queue_timeout`` seconds without an idle worker or ``timeout`` seconds
+    of rendering.
+    """
+
+    def __init__(self, workers=2, timeout=2.0, queue_timeout=10.0, startup_timeout=60.0):
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.startup_timeout = startup_timeout
+        self._idle = queue.Queue()
+        self._closed = False
+        for _ in range(workers):
+            self._replace()
+
+    def _replace(self):
+        """Start a worker in the background; it joins the idle queue once warm."""
+        threading.Thread(target=self._start_worker, daemon=True).start()
+
+    def _start_worker(self):
+        while not self._closed:
+            worker = _Worker()
+            if worker.wait_ready(self.startup_timeout):
+                self._idle.put(worker)
+                return
+            print(f"[PLOT] Worker {worker.proc.pid} did not start; retrying")
+            worker.kill()
+            time.sleep(1.0)
+
+    def render(self, equation, timeout=None):
+        """
+        (PNG bytes or None, {stage: seconds}) from ``plotting.render_plot``
+        in a worker; raises ``PlotTimeout`` if no worker is free within
+        ``queue_timeout`` or the worker takes longer than ``timeout``
+        (default: the pool's) to render.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            raise PlotTimeout(f"no plot worker free after {self.queue_timeout}s") from None
+
+        try:
+            worker.conn.send(equation)
+            if worker.conn.poll(timeout):
+                result = worker.conn.recv()
+                self._idle.put(worker)
+                return result
+        except (EOFError, OSError) as e:
+            # Died mid-job (crash in native code); treat the equation as unplottable
+            print(f"[PLOT] Worker {worker.proc.pid} failed on '{equation}': {e}")
+            worker.kill()
+            self._replace()
+            return None, {}
+
+        print(f"[PLOT] '{equation}' missed its deadline; restarting worker {worker.proc.pid}")
+        worker.kill()
+        self._replace()
+        raise PlotTimeout(f"plot not ready after {timeout}s")
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+def worker_main(fd):
+    # Lines, not blocks, so the parent relays each print as it happens
+    sys.stdout.reconfigure(line_buffering=True)
+    conn = Connection(fd)
+    import plotting
+    plotting.render_plot(WARMUP_EQUATION)  # fonts, Agg canvas, the lambdify code path
+    try:
+        conn.send('ready')
+        while True:
+            equation = conn.recv()
+            try:
+                result = plotting.render_plot(equation)
+            except Exception as e:
+                print(f"[PLOT] Error plotting '{equation}': {e}")
+                result = (None, {})
+            conn.send(result)
+    except (EOFError, OSError):
+        return  # the parent closed its end
+
+
+if __name__ == '__main__':
+    worker_main(int(sys.argv[1]))
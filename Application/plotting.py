@@ -0,0 +1,350 @@
+"""
+Equation plotting: SymPy parse / lambdify and a Matplotlib Agg render to PNG.
+
+Free of Flask and of app.py's state so it can run in the request thread or
+in the worker processes of plot_pool.py. ``render_plot()`` is the entry
+point; it returns the PNG and the seconds spent per stage (sympy_parse,
+lambdify, sample, render), which the caller adds to its own metrics.
+"""
+
+import functools
+import io
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import matplotlib; matplotlib.use('Agg')
+import numpy as np
+import sympy as sp
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from sympy import lambdify
+from sympy.parsing.sympy_parser import parse_expr, standard_transformations, implicit_multiplication_application
+
+# Distinct equations kept parsed/compiled per process
+COMPILE_CACHE_SIZE = 256
+
+# Adaptive sampling (sample_function): a coarse grid, then the intervals
+# that need it cut into up to MAX_PIECES, never finer than
+# MIN_STEP_FRACTION of the coarse spacing, at most MAX_SAMPLES evaluations
+COARSE_SAMPLES = 129
+MIN_STEP_FRACTION = 1 / 256
+MAX_PIECES = 16
+EDGE_PIECES = 4
+MAX_SAMPLES = 2000
+TOLERANCE = 0.002  # chord error as a fraction of the view height, about a pixel
+Y_CLIP = 1e4       # drawn values are clipped here; the axes show at most +-10
+
+# Persistent plot figures, keyed by size; only one thread may draw at a time
+PLOT_FIGURES = {}
+PLOT_LOCK = threading.Lock()
+
+# Stage seconds of the render_plot() call running on this thread
+_STAGES = threading.local()
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = getattr(_STAGES, 'timing', None)
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start
+
+
+def render_plot(equation):
+    """
+    Render a calculation equation. Returns (PNG bytes or None if it cannot
+    be plotted, {stage: seconds}).
+    """
+    _STAGES.timing = timing = {}
+    try:
+        print(f"Starting to generate plot for equation: {equation}")
+        spec = compile_equation(equation)
+        if spec is None:
+            png = None
+        elif 'constant' in spec:
+            png = plot_constant(spec)
+        else:
+            png = plot_with_sympy(spec)
+    finally:
+        _STAGES.timing = None
+    return png, timing
+
+# Keyed on the normalised calculation equation: the parsed expression,
+# compiled NumPy callable and domain decision
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_equation(equation):
+    """
+    Parse a calculation equation into everything plotting needs, once per
+    distinct equation. Returns a dict with the axis
+    variables and either the constant of a horizontal line or the lambdified
+    right side plus its domain decision, or None if it cannot be plotted.
+    """
+    try:
+        # Split equation by equals sign
+        parts = equation.split('=')
+        if len(parts) != 2:
+            print(f"Error: Invalid equation format, needs an equals sign: {equation}")
+            return None
+        
+        left_side = parts[0].strip()
+        right_side = parts[1].strip()
+                
+        # Determine the variable names
+        # Left side is the dependent variable (y-axis)
+        y_var = left_side if len(left_side) == 1 else 'y'  # Use single letter variable or default to 'y'
+        
+        # Determine independent variable (x-axis) from the right side
+        # Default to 'x' if we can't find another variable
+        x_var = 'x'
+        spec = {'x_var': x_var, 'y_var': y_var}
+                
+        # Try direct numerical evaluation for non-pi constants
+        if x_var not in right_side:
+            try:
+                spec['constant'] = float(right_side)
+                return spec
+            except ValueError:
+                print(f"Not a simple numeric constant: {right_side}")
+                # Continue with other parsing methods
+        
+        # Default to using sympy for all other cases
+        # Ensure negative exponents (including -3x, -2.5x, -x, etc.) are wrapped in parentheses
+        right_side = re.sub(r'(\^|\*\*)\s*(-[a-zA-Z0-9.]+)', r'\1(\2)', right_side)
+        right_side_normalized = right_side.replace('^', '**')
+        sym_var = sp.symbols(x_var)
+        transformations = (standard_transformations + (implicit_multiplication_application,))
+        with timed('sympy_parse'):
+            expr = parse_expr(right_side_normalized.replace('pi', 'sp.pi'), transformations=transformations, local_dict={"sp": sp, x_var: sym_var})
+        # Robustly restrict x domain if x is in the base of a power with non-integer exponent
+        spec['restrict_positive_x'] = contains_x_pow_nonint(expr, x_var)
+        spec['expr'] = expr
+        with timed('lambdify'):
+            spec['f'] = lambdify(sym_var, expr, "numpy")
+        return spec
+            
+    except Exception as e:
+        print(f"General error in plot generation: {e}")
+        import traceback
+        traceback.print_exc()
+        
+    # If we reach here, plotting failed
+    return None
+
+def _plot_axes(figsize):
+    """Reuse one object-oriented Agg figure per plot size instead of pyplot state (caller holds PLOT_LOCK)"""
+    fig = PLOT_FIGURES.get(figsize)
+    if fig is None:
+        fig = Figure(figsize=figsize, dpi=100)
+        FigureCanvasAgg(fig)
+        PLOT_FIGURES[figsize] = fig
+    fig.clear()
+    return fig, fig.add_subplot()
+
+def _render_png(fig):
+    buf = io.BytesIO()
+    with timed('render'):
+        fig.savefig(buf, format='png', bbox_inches='tight', pad_inches=0.3)
+    return buf.getvalue()
+
+
+def plot_constant(spec):
+    # Generate horizontal line
+    x_vals = np.linspace(-10, 10, 2)
+    y_vals = np.full_like(x_vals, spec['constant'])
+    
+    with PLOT_LOCK:
+        # Create a wider canvas with a narrower plot area
+        fig, ax = _plot_axes((14, 6))  # Increased width even more
+        ax.plot(x_vals, y_vals, 'b-', linewidth=1.5)
+        ax.axhline(y=0, color='k', linestyle='-', alpha=0.3)
+        ax.axvline(x=0, color='k', linestyle='-', alpha=0.3)
+        ax.grid(True, alpha=0.3)
+        ax.set_xlabel(spec['x_var'])
+        ax.set_ylabel(spec['y_var'])
+        return _render_png(fig)
+
+def contains_x_pow_nonint(expr, x_var):
+    # Recursively check if any Pow node has x as the base and a non-integer or variable exponent
+    if isinstance(expr, sp.Pow):
+        base, exp = expr.args
+        if base == sp.Symbol(x_var):
+            # If exponent is a constant integer (Python int, float with integer value, or SymPy Integer)
+            if (
+                isinstance(exp, int)
+                or (isinstance(exp, float) and exp.is_integer())
+                or (hasattr(exp, 'is_integer') and exp.is_integer and exp.is_number)
+            ):
+                return False
+            else:
+                return True
+    for arg in getattr(expr, 'args', []):
+        if contains_x_pow_nonint(arg, x_var):
+            return True
+    return False
+
+def evaluate(f, x):
+    """``f`` on ``x`` as float64, NaN wherever it is complex, infinite or undefined."""
+    with np.errstate(all='ignore'):
+        y = f(x)
+    if not isinstance(y, np.ndarray) or y.shape != x.shape:
+        y = np.broadcast_to(y, x.shape)
+    if np.iscomplexobj(y):
+        y = np.where(y.imag == 0, y.real, np.nan)
+    y = np.array(y, dtype=np.float64)
+    y[~np.isfinite(y)] = np.nan
+    return y
+
+def view_limits(y):
+    """The y range the axes will show for samples ``y`` (see smart_axis_limits)."""
+    finite = y[np.isfinite(y)]
+    if not finite.size:
+        return smart_axis_limits(0.0, 0.0)
+    return smart_axis_limits(finite.min(), finite.max())
+
+def refine_pieces(x, y, bottom, top):
+    """
+    How many pieces to cut each interval [x[i], x[i + 1]] into (1: keep),
+    judged by what shows between ``bottom`` and ``top``.
+    """
+    valid = np.isfinite(y)
+    height = top - bottom
+    # Clipped a view height beyond the edges: a straight line leaving the
+    # view stays straight, a curve shooting off it still shows its bend
+    yc = np.clip(y, bottom - height, top + height)
+    # Bends: a sample off the chord of its neighbours by more than TOLERANCE
+    # of the view height, for triples that reach into the view (NaN
+    # compares False, so only defined ones). The error falls with the
+    # square of the spacing, so cut into sqrt(error / TOLERANCE) pieces;
+    # the next round catches any shortfall.
+    t = (x[1:-1] - x[:-2]) / (x[2:] - x[:-2])
+    chord = yc[:-2] + t * (yc[2:] - yc[:-2])
+    low = np.minimum(np.minimum(yc[:-2], yc[1:-1]), yc[2:])
+    high = np.maximum(np.maximum(yc[:-2], yc[1:-1]), yc[2:])
+    with np.errstate(invalid='ignore'):
+        ratio = np.abs(yc[1:-1] - chord) / (TOLERANCE * height)
+        ratio[(low >= top) | (high <= bottom)] = 0
+    bend = np.where(ratio > 1, np.ceil(np.sqrt(ratio)), 1)
+    pieces = np.ones(len(x) - 1)
+    pieces[:-1] = bend
+    pieces[1:] = np.maximum(pieces[1:], bend)
+    # Domain edges (defined at one end only) and jumps from below the view
+    # to above it (very steep, or a pole): close in by quarters
+    edge = valid[:-1] != valid[1:]
+    edge |= ((y[:-1] <= bottom) & (y[1:] >= top)) | ((y[:-1] >= top) & (y[1:] <= bottom))
+    pieces[edge] = np.maximum(pieces[edge], EDGE_PIECES)
+    return np.minimum(pieces, MAX_PIECES)
+
+def split_poles(f, x, y, bottom, top):
+    """
+    Break the line at poles: an interval that still jumps across the whole
+    view after refinement is a pole if the function leaves the range of its
+    ends in between (a steep but monotonic stretch stays inside). Returns
+    x, y with a NaN sample at each pole and the number of evaluations.
+    """
+    jump = ((y[:-1] <= bottom) & (y[1:] >= top)) | ((y[:-1] >= top) & (y[1:] <= bottom))
+    idx = np.flatnonzero(jump)
+    if not idx.size:
+        return x, y, 0
+    mid = (x[idx] + x[idx + 1]) / 2
+    y_mid = evaluate(f, mid)
+    pole = ~((y_mid >= np.minimum(y[idx], y[idx + 1])) & (y_mid <= np.maximum(y[idx], y[idx + 1])))
+    return np.insert(x, idx[pole] + 1, mid[pole]), np.insert(y, idx[pole] + 1, np.nan), len(mid)
+
+def sample_function(f, lo, hi):
+    """
+    Adaptive samples of ``f`` on [lo, hi]: a coarse grid whose intervals
+    are cut further where the curve bends on screen, crosses the view or
+    reaches a domain edge, down to MIN_STEP_FRACTION of the coarse spacing
+    or MAX_SAMPLES evaluations, with the line split at poles. Straight and
+    gently curved stretches keep the coarse spacing. Returns x, y (NaN
+    where undefined or split) and the number of evaluations.
+    """
+    x = np.linspace(lo, hi, COARSE_SAMPLES)
+    y = evaluate(f, x)
+    evaluations = len(x)
+    bottom, top = view_limits(y)
+    min_step = (hi - lo) / (COARSE_SAMPLES - 1) * MIN_STEP_FRACTION
+
+    while evaluations < MAX_SAMPLES:
+        steps = np.diff(x)
+        pieces = np.minimum(refine_pieces(x, y, bottom, top), np.floor(steps / min_step)).astype(np.intp)
+        idx = np.flatnonzero(pieces > 1)
+        if not idx.size:
+            break
+        # pieces - 1 evenly spaced new points inside each chosen interval
+        count = pieces[idx] - 1
+        keep = np.cumsum(count) <= MAX_SAMPLES - evaluations
+        idx, count = idx[keep], count[keep]
+        if not idx.size:
+            break
+        at = np.repeat(idx, count)
+        first = np.repeat(np.cumsum(count) - count, count)
+        fraction = (np.arange(len(at)) - first + 1) / np.repeat(count + 1, count)
+        new_x = x[at] + fraction * steps[at]
+        xy = np.insert(np.stack((x, y)), at + 1, np.stack((new_x, evaluate(f, new_x))), axis=1)
+        x, y = xy[0], xy[1]
+        evaluations += len(new_x)
+
+    x, y, probes = split_poles(f, x, y, bottom, top)
+    return x, y, evaluations + probes
+
+def plot_with_sympy(spec):
+    """
+    Helper function to handle plotting with sympy for non-constant expressions
+    Sets x-range based on the mathematical domain of the expression.
+    Plots only where the function is real and finite.
+    """
+    try:
+        if spec['restrict_positive_x']:
+            lo, hi = 1e-3, 10  # Wider positive domain
+        else:
+            lo, hi = -10, 10   # Wider full domain
+        with timed('sample'):
+            x_vals, y_vals, _ = sample_function(spec['f'], lo, hi)
+        return draw_curve(spec, x_vals, y_vals)
+    except Exception as e:
+        print(f"Error in sympy plotting: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def draw_curve(spec, x_vals, y_vals):
+    """Render samples to PNG; NaN samples break the line."""
+    # Far off-screen values only need to leave the view in the right direction
+    y_vals = np.clip(y_vals, -Y_CLIP, Y_CLIP)
+    defined = np.isfinite(y_vals)
+    with PLOT_LOCK:
+        fig, ax = _plot_axes((8, 6))
+        ax.plot(x_vals, y_vals, 'b-', linewidth=2)
+        ax.axhline(y=0, color='k', linestyle='-', alpha=0.3)
+        ax.axvline(x=0, color='k', linestyle='-', alpha=0.3)
+        ax.grid(True, alpha=0.3)
+        ax.set_xlabel(spec['x_var'])
+        ax.set_ylabel(spec['y_var'])
+        # Set x-limits with padding and clamping
+        if defined.any():
+            x_left, x_right = smart_axis_limits(x_vals[defined].min(), x_vals[defined].max())
+            ax.set_xlim([x_left, x_right])
+            # Set y-limits with padding and clamping
+            y_bottom, y_top = view_limits(y_vals)
+            ax.set_ylim([y_bottom, y_top])
+        return _render_png(fig)
+
+
+def smart_axis_limits(min_val, max_val, min_limit=-10, max_limit=10, min_width=1):
+    # Clamp to reasonable limits
+    min_val = max(min_val, min_limit)
+    max_val = min(max_val, max_limit)
+    # Ensure minimum width
+    if max_val - min_val < min_width:
+        center = (max_val + min_val) / 2
+        min_val = center - min_width / 2
+        max_val = center + min_width / 2
+    # Add 10% padding
+    padding = (max_val - min_val) * 0.1
+    return min_val - padding, max_val + padding
@@ -0,0 +1,208 @@
+"""
+Incremental recognition: segment the drawing while it is being drawn.
+
+/process_equation gets the whole canvas once, on submit, and only then
+binarises it, scans it for components and sends every glyph to the board.
+A session instead receives the canvas piece by piece as strokes end (a
+patch of pixels and where it goes) and keeps
+
+* the grey drawing, its binarised form for the component scan and its
+  cleaned form for the crops (segmentation.py)
+* the component table: the box and area of every 8-connected component
+* one entry per glyph box: its 28 x 28 image and, once the board has seen
+  it, its label
+
+``update()`` re-thresholds only the patch (plus the dilation margin),
+rescans only the components that touch it, and re-crops only the glyphs
+whose padded box overlaps it. A glyph whose image did not change keeps its
+label, so on submit the board has usually seen every glyph already and only
+the plot is left to do. The result is the same as running
+``extract_characters`` on the full drawing.
+
+Sessions live in the memory of one process; with several serve.py workers
+a session's requests can land on different workers, so sessions are only
+for single-process serving (the page falls back to /process_equation).
+"""
+
+import collections
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from segmentation import (binarize, clean_glyphs, component_stats, glyph_boxes, crop_glyphs,
+                          glyph_positions, padded_boxes)
+
+MAX_CANVAS_SIDE = 4096  # pixels; larger sessions are refused
+SCAN_MARGIN = 1  # binary pixels a grey change can reach through the 2 x 2 dilation
+
+
+def _overlapping(boxes, region):
+    """Mask of (x, y, w, h) ``boxes`` that overlap ``region`` = (x0, y0, x1, y1)."""
+    x0, y0, x1, y1 = region
+    return ((boxes[:, 0] < x1) & (boxes[:, 0] + boxes[:, 2] > x0) &
+            (boxes[:, 1] < y1) & (boxes[:, 1] + boxes[:, 3] > y0))
+
+
+class RecognitionSession:
+    """Segmentation state of one drawing of ``width`` x ``height`` pixels."""
+
+    def __init__(self, width, height):
+        if not (0 < width <= MAX_CANVAS_SIDE and 0 < height <= MAX_CANVAS_SIDE):
+            raise ValueError(f"canvas must be 1..{MAX_CANVAS_SIDE} px per side, got {width} x {height}")
+        self.width = width
+        self.height = height
+        self.gray = np.full((height, width), 255, np.uint8)
+        self.clean = np.full((height, width), 255, np.uint8)
+        self.binary = np.zeros((height, width), np.uint8)
+        # x, y, w, h, area and scan_keys() key per component, in no particular order
+        self.stats = np.empty((0, 6), np.int64)
+        self.boxes = []   # glyph boxes in reading order
+        self.glyphs = {}  # glyph box -> {'image': 28 x 28 uint8, 'label': str or None}
+        # Held by the caller around update(), label() and reads; not while
+        # the board labels a pending() snapshot
+        self.lock = threading.Lock()
+
+    def _clip(self, x0, y0, x1, y1):
+        return max(0, x0), max(0, y0), min(self.width, x1), min(self.height, y1)
+
+    def update(self, x, y, patch):
+        """
+        Paint the grey ``patch`` with its top-left corner at (x, y); returns
+        the number of glyphs that now need a label.
+        """
+        x0, y0, x1, y1 = self._clip(x, y, x + patch.shape[1], y + patch.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            return len(self.pending())
+        self.gray[y0:y1, x0:x1] = patch[y0 - y:y1 - y, x0 - x:x1 - x]
+        self.clean[y0:y1, x0:x1] = clean_glyphs(self.gray[y0:y1, x0:x1])
+
+        # Binarise with a margin so the dilation sees the neighbours, keep
+        # the pixels the change can reach
+        m = SCAN_MARGIN
+        bx0, by0, bx1, by1 = self._clip(x0 - m, y0 - m, x1 + m, y1 + m)
+        cx0, cy0, cx1, cy1 = self._clip(x0 - 2 * m, y0 - 2 * m, x1 + 2 * m, y1 + 2 * m)
+        binary = binarize(self.gray[cy0:cy1, cx0:cx1])
+        self.binary[by0:by1, bx0:bx1] = binary[by0 - cy0:by1 - cy0, bx0 - cx0:bx1 - cx0]
+
+        self._rescan((bx0, by0, bx1, by1))
+        self._refresh_glyphs((x0, y0, x1, y1))
+        return len(self.pending())
+
+    def _rescan(self, region):
+        """Replace the components in and around ``region`` with a fresh scan of it."""
+        # Grow the region over every component it touches (8-connected: one
+        # pixel away counts) until none is left half inside; nothing outside
+        # it can then connect to anything inside
+        while True:
+            touching = _overlapping(self.stats[:, :4] + [-1, -1, 2, 2], region)
+            if not touching.any():
+                break
+            near = self.stats[touching]
+            grown = (min(region[0], near[:, 0].min()), min(region[1], near[:, 1].min()),
+                     max(region[2], (near[:, 0] + near[:, 2]).max()),
+                     max(region[3], (near[:, 1] + near[:, 3]).max()))
+            if grown == region:
+                break
+            region = grown
+
+        x0, y0, x1, y1 = region
+        stats = component_stats(self.binary[y0:y1, x0:x1], origin=(x0, y0))
+        self.stats = np.concatenate((self.stats[~touching], stats.astype(np.int64)))
+
+    def _refresh_glyphs(self, dirty):
+        """Re-crop the glyphs whose padded box overlaps ``dirty``; keep the rest."""
+        # In the label order of a scan of the whole drawing, as extract_characters sees them
+        boxes = glyph_boxes(self.stats[np.argsort(self.stats[:, 5]), :5])
+        x_start, y_start, x_end, y_end = padded_boxes(boxes, self.width, self.height)
+        padded = np.stack((x_start, y_start, x_end - x_start, y_end - y_start), axis=1)
+        changed = _overlapping(padded, dirty)
+
+        glyphs = {box: self.glyphs[box] for box, hit in zip(boxes, changed)
+                  if not hit and box in self.glyphs}
+        stale = [box for box in boxes if box not in glyphs]
+        for box, image in zip(stale, crop_glyphs(self.clean, stale)):
+            previous = self.glyphs.get(box)
+            if previous is not None and np.array_equal(previous['image'], image):
+                glyphs[box] = previous  # touched, but the same pixels: keep the label
+            else:
+                glyphs[box] = {'image': image, 'label': None}
+        self.boxes = boxes
+        self.glyphs = glyphs
+
+    def pending(self):
+        """Glyphs (in reading order) the board has not labelled yet."""
+        return [glyph for glyph in self.in_order() if glyph['label'] is None]
+
+    def label(self, glyphs, labels):
+        """Record the board's ``labels`` for ``glyphs`` (from ``pending()``)."""
+        for glyph, label in zip(glyphs, labels):
+            glyph['label'] = label
+
+    def in_order(self):
+        """Glyph entries in reading order."""
+        return [self.glyphs[box] for box in self.boxes]
+
+    def char_images(self):
+        """N x 28 x 28, as ``extract_characters`` returns them for the same drawing."""
+        if not self.boxes:
+            return np.empty((0, 28, 28), np.uint8)
+        return np.stack([glyph['image'] for glyph in self.in_order()])
+
+    def char_positions(self):
+        return glyph_positions(self.boxes)
+
+    def labels(self):
+        """Labels in reading order; None for glyphs not labelled yet."""
+        return [glyph['label'] for glyph in self.in_order()]
+
+
+class SessionStore:
+    """
+    Thread-safe sessions by ID. A session unused for ``ttl`` seconds
+    expires; beyond ``max_sessions`` the least recently used one goes.
+    """
+
+    def __init__(self, ttl=600.0, max_sessions=64):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = collections.OrderedDict()  # ID -> (last use, session), oldest first
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, (last_used, _) = next(iter(self._sessions.items()))
+            if last_used > now - self.ttl and len(self._sessions) <= self.max_sessions:
+                return
+            del self._sessions[session_id]
+
+    def create(self, width, height):
+        """(ID, session) of a new blank session; ValueError on a bad size."""
+        session = RecognitionSession(width, height)
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            now = time.monotonic()
+            self._sessions[session_id] = (now, session)
+            self._evict(now)
+        return session_id, session
+
+    def get(self, session_id):
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+            return entry[1]
+
+    def discard(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._sessions)
@@ -0,0 +1,121 @@
+"""
+Request-ID keyed store for predictions delivered by the PYNQ /receive callback.
+
+Every /process_equation call tags its upload with a fresh ID (``X-Request-ID``
+header); the board echoes it back both in the callback and in its reply, so
+each request only ever sees its own equation no matter how many are in
+flight. Entries nobody collects (reply lost, client gone) expire after
+``ttl`` seconds.
+
+``ResultStore`` lives in one process. With several worker processes the
+callback can land on a different worker than the one waiting for it, so
+serve.py switches to ``SharedResultStore``, the same interface on a SQLite
+file they all open.
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+class ResultStore:
+    """Thread-safe dict of request ID -> result with TTL eviction."""
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._results = {}  # request ID -> (expiry time, value)
+        self._cond = threading.Condition()
+
+    def _evict(self, now):
+        expired = [key for key, (expiry, _) in self._results.items() if expiry <= now]
+        for key in expired:
+            del self._results[key]
+
+    def put(self, request_id, value):
+        with self._cond:
+            now = time.monotonic()
+            self._evict(now)
+            self._results[request_id] = (now + self.ttl, value)
+            self._cond.notify_all()
+
+    def pop(self, request_id, timeout=0.0, default=None):
+        """
+        Remove and return the result for ``request_id``, waiting up to
+        ``timeout`` seconds for it to arrive.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while request_id not in self._results:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return default
+                self._cond.wait(remaining)
+            expiry, value = self._results.pop(request_id)
+            return value if expiry > time.monotonic() else default
+
+    def __len__(self):
+        with self._cond:
+            self._evict(time.monotonic())
+            return len(self._results)
+
+
+class SharedResultStore:
+    """
+    ``ResultStore`` for several processes: one row per pending result in a
+    SQLite file (WAL mode), one connection per thread. ``pop`` polls every
+    ``poll`` seconds while it waits. Stores sharing a file need their own
+    ``table``.
+    """
+
+    def __init__(self, path, ttl=60.0, poll=0.005, timeout=5.0, table='results'):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.poll = poll
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(f'CREATE TABLE IF NOT EXISTS {self.table} '
+                       '(request_id TEXT PRIMARY KEY, expiry REAL NOT NULL, value TEXT)')
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=OFF')  # results live for seconds; no need to survive a crash
+            self._local.db = db
+        return db
+
+    def put(self, request_id, value):
+        # Wall clock: monotonic clocks are not comparable between processes everywhere
+        now = time.time()
+        with self._connect() as db:
+            db.execute(f'DELETE FROM {self.table} WHERE expiry <= ?', (now,))
+            db.execute(f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)', (request_id, now + self.ttl, value))
+
+    def pop(self, request_id, timeout=0.0, default=None):
+        deadline = time.time() + timeout
+        while True:
+            with self._connect() as db:
+                row = db.execute(f'DELETE FROM {self.table} WHERE request_id = ? RETURNING expiry, value',
+                                 (request_id,)).fetchone()
+            now = time.time()
+            if row is not None:
+                return row[1] if row[0] > now else default
+            if now >= deadline:
+                return default
+            time.sleep(min(self.poll, deadline - now))
+
+    def __len__(self):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(f'DELETE FROM {self.table} WHERE expiry <= ?', (now,))
+            return db.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
@@ -0,0 +1,211 @@
+"""
+Connected-component segmentation of a drawing into 28 x 28 glyphs.
+
+``extract_characters`` (app.py) runs these steps over a whole drawing;
+``RecognitionSession`` (recognition_session.py) runs them over the parts
+of a drawing that changed and reuses the rest. Both get the same glyphs for
+the same pixels because every step here is local:
+
+* ``binarize`` and the glyph threshold are per pixel (plus a 2 x 2 dilation)
+* a component's box only depends on its own pixels; ``glyph_boxes`` then
+  orders the boxes and merges the two bars of '=' from the boxes alone.
+  Boxes level on x keep the scan's label order, which a session rebuilds
+  from every component's first 2 x 2 block (``scan_keys``)
+* a glyph image only depends on the drawing inside its padded box
+  (``padded_boxes``): ``crop_glyphs`` cleans every glyph in its own square,
+  with white gutters between them on the batch canvas
+"""
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Binarisation for the component scan; the dilation thickens thin strokes
+SCAN_THRESHOLD = 180
+SCAN_KERNEL = np.ones((2, 2), np.uint8)
+MIN_COMPONENT_AREA = 20  # pixels; smaller components are noise
+# Context kept around each glyph (tuned empirically); the generous vertical
+# padding keeps superscripts intact
+H_PADDING = 15
+V_PADDING = 10
+# Per-glyph cleanup: re-binarise to drop anti-aliased grey, then thicken strokes
+GLYPH_THRESHOLD = 245
+GLYPH_KERNEL = np.ones((2, 2), np.uint8)
+GLYPH_DILATE_ITERATIONS = 2
+# White columns between glyphs on the batch canvas; wider than the 2 px a
+# stroke grows, so neighbouring glyphs never bleed into each other
+BATCH_GUTTER = 4
+
+
+def binarize(img):
+    """Foreground 255 on 0 (inverted), strokes thickened for the component scan."""
+    _, binary_inv = cv2.threshold(img, SCAN_THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+    return cv2.dilate(binary_inv, SCAN_KERNEL, iterations=1)
+
+
+def clean_glyphs(img):
+    """Black-on-white drawing with anti-aliased grey dropped, the source of the crops."""
+    _, clean = cv2.threshold(img, GLYPH_THRESHOLD, 255, cv2.THRESH_BINARY)
+    return clean
+
+
+def component_stats(binary_inv, origin=None):
+    """
+    x, y, width, height, area of every 8-connected component, background
+    excluded, in label order. ``origin`` is the (x, y) of ``binary_inv``
+    inside a larger drawing: the boxes are moved there and a sixth column
+    holds each component's ``scan_keys`` key in that drawing.
+    """
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(binary_inv, connectivity=8)
+    if origin is None:
+        return stats[1:, :5]
+    x0, y0 = origin
+    return np.column_stack((stats[1:, :5] + [x0, y0, 0, 0, 0], scan_keys(labels, count, x0, y0)))
+
+
+def scan_keys(labels, count, x0=0, y0=0):
+    """
+    Key per component 1..count-1 of ``labels`` (a part at (x0, y0) of a
+    larger drawing) that sorts them in the label order a scan of the whole
+    drawing gives: connectedComponentsWithStats visits 2 x 2 pixel blocks
+    in raster order, so labels follow each component's first block.
+    """
+    ys, xs = np.nonzero(labels)
+    keys = ((ys + y0) // 2).astype(np.int64) << 32 | (xs + x0) // 2
+    first = np.full(count, np.iinfo(np.int64).max)
+    np.minimum.at(first, labels[ys, xs], keys)
+    return first[1:]
+
+
+def glyph_boxes(stats):
+    """
+    (x, y, w, h) of the glyphs in ``stats`` (label order): noise dropped,
+    left to right to match reading direction (label order on ties), and the
+    bars of '=' merged.
+    """
+    stats = np.asarray(stats).reshape(-1, 5)
+    boxes = stats[stats[:, cv2.CC_STAT_AREA] >= MIN_COMPONENT_AREA, :4]
+    boxes = boxes[np.argsort(boxes[:, 0], kind='stable')]
+    return merge_equals([tuple(box) for box in boxes.tolist()])
+
+
+def merge_equals(components):
+    """Merge consecutive pairs of horizontal bars that form an '=' sign."""
+    merged_components = []
+    i = 0
+    while i < len(components):
+        x1, y1, w1, h1 = components[i]
+
+        # Height-to-width ratio for a typical stroke of '=' is very small
+        # Check if this component looks like a horizontal bar
+        is_small_bar_1 = h1 < w1 * 0.6  # More permissive ratio to catch thicker bars
+
+        # Look ahead to see if next component forms the second bar
+        if i + 1 < len(components):
+            x2, y2, w2, h2 = components[i + 1]
+
+            # Calculate horizontal overlap percentage
+            horiz_overlap = min(x1 + w1, x2 + w2) - max(x1, x2)
+            # Avoid division by zero
+            min_width = min(w1, w2)
+            if min_width > 0:
+                horiz_overlap_percent = horiz_overlap / min_width
+            else:
+                horiz_overlap_percent = 0
+
+            # More relaxed width similarity check
+            widths_similar = abs(w1 - w2) < 0.5 * max(w1, w2)  # Much more lenient
+            is_small_bar_2 = h2 < w2 * 0.6  # More permissive ratio
+
+            # Calculate vertical positioning metrics
+            center_y1 = y1 + h1 // 2
+            center_y2 = y2 + h2 // 2
+            vertical_gap = abs(center_y1 - center_y2)
+
+            # Require reasonable vertical proximity (bars stacked, not far apart)
+            stacked = vertical_gap < max(h1, h2) * 5  # Even more generous allowance
+
+            # Improved equals sign detection with more relaxed conditions
+            # At least ensure both are horizontal bars with some overlap
+            if (is_small_bar_1 and is_small_bar_2 and
+                horiz_overlap_percent > 0.3 and  # Reduced overlap requirement
+                widths_similar and stacked):
+
+                # Merge into one component representing '='
+                x_merge = min(x1, x2)
+                y_merge = min(y1, y2)
+                right_merge = max(x1 + w1, x2 + w2)
+                bottom_merge = max(y1 + h1, y2 + h2)
+                merged_components.append((x_merge, y_merge, right_merge - x_merge, bottom_merge - y_merge))
+                i += 2  # Skip the next component as it's merged
+                continue
+
+        # If not merged, append the current component as is
+        merged_components.append((x1, y1, w1, h1))
+        i += 1
+    return merged_components
+
+
+def padded_boxes(boxes, width, height):
+    """Crop rectangles (x_start, y_start, x_end, y_end) of ``boxes``, clipped to the image."""
+    x, y, w, h = np.asarray(boxes, dtype=np.int64).reshape(-1, 4).T
+    return (np.maximum(0, x - H_PADDING), np.maximum(0, y - V_PADDING),
+            np.minimum(width, x + w + H_PADDING), np.minimum(height, y + h + V_PADDING))
+
+
+def crop_glyphs(clean, boxes, lap=None):
+    """
+    N x 28 x 28 uint8 glyphs (black on white) for ``boxes`` of the
+    ``clean_glyphs`` image. The padded crops are centred side by side on
+    one white canvas that gets one morphology pass. ``lap(stage)`` is
+    called after the crop, morphology and resize stages.
+    """
+    lap = lap or (lambda stage: None)
+    height, width = clean.shape
+    x_start, y_start, x_end, y_end = padded_boxes(boxes, width, height)
+    count = len(x_start)
+    if count == 0:
+        return np.empty((0, 28, 28), np.uint8)
+
+    # Each crop centred on a square
+    h_char = y_end - y_start
+    w_char = x_end - x_start
+    max_dim = np.maximum(h_char, w_char)
+    y_offset = (max_dim - h_char) // 2
+    x_offset = (max_dim - w_char) // 2
+    canvas_x = np.concatenate(([0], np.cumsum(max_dim + BATCH_GUTTER)[:-1]))
+
+    canvas = np.full((int(max_dim.max()), int(canvas_x[-1] + max_dim[-1])), 255, dtype=np.uint8)
+    for n in range(count):
+        top, left = y_offset[n], canvas_x[n] + x_offset[n]
+        canvas[top:top + h_char[n], left:left + w_char[n]] = clean[y_start[n]:y_end[n], x_start[n]:x_end[n]]
+    lap('crop')
+
+    # Eroding black-on-white == the old invert / dilate / invert, in one pass for every glyph
+    canvas = cv2.erode(canvas, GLYPH_KERNEL, iterations=GLYPH_DILATE_ITERATIONS)
+    lap('morphology')
+
+    # Same bilinear 28x28 resize as transform() on the board
+    char_images = np.empty((count, 28, 28), dtype=np.uint8)
+    for n in range(count):
+        square = canvas[:max_dim[n], canvas_x[n]:canvas_x[n] + max_dim[n]]
+        char_images[n] = Image.fromarray(np.ascontiguousarray(square)).resize((28, 28), resample=Image.BILINEAR)
+    lap('resize')
+    return char_images
+
+
+def glyph_positions(boxes):
+    """Positional metadata (centre and bounds) of each box, for exponent detection."""
+    return [
+        {
+            'x': bx + bw // 2,
+            'y': by + bh // 2,
+            'width': bw,
+            'height': bh,
+            'top': by,
+            'bottom': by + bh,
+            'left': bx,
+            'right': bx + bw
+        }
+        for bx, by, bw, bh in boxes
+    ]
@@ -0,0 +1,153 @@
+"""
+Production serving mode: several worker processes sharing one listening port.
+
+``app.run`` is one process, so segmentation, SymPy and Matplotlib (all
+CPU-bound and serialised by the GIL) use a single core no matter how many
+requests are waiting. This binds the port once, forks ``--workers``
+processes that each import app.py and serve it with a thread per request,
+and restarts any worker that dies.
+
+The workers share no memory; what has to be shared goes through files:
+
+* /receive results: the board's callback can reach any worker, so they all
+  use one ``SharedResultStore`` (``result_store_path``, a SQLite file)
+* feedback: ``FeedbackStore`` was already safe for several processes
+* configuration: app.py reads ``APP_CONFIG_FILE`` / ``APP_*`` variables at
+  import (settings.py), so every worker starts with the same settings
+* glyphs and plots go back inline as data URLs, and debug images are
+  written under a per-request folder, so no two requests share a path
+
+/metrics and the plot caches are per worker, and each worker starts its own
+``plot_workers`` plotting processes (plot_pool.py). Incremental recognition
+sessions (recognition_session.py) are held in a worker's memory, so they
+are turned off with more than one worker; the page then posts the whole
+canvas on submit.
+
+    python serve.py [--workers 8] [--port 5000] [--config app_config.json]
+
+gunicorn can run app.py the same way; give it the result store explicitly:
+
+    APP_RESULT_STORE_PATH=/tmp/results.db gunicorn -w 8 --threads 8 -b 0.0.0.0:5000 app:app
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_GRACE = 5.0  # a worker dying this soon after starting is a startup failure, not a crash
+
+
+def run_worker(sock, host, port):
+    """Body of a forked worker: fresh import of the app on the inherited socket."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    import cv2
+    cv2.setNumThreads(1)  # the workers already fill the cores
+    from werkzeug.serving import make_server
+    import app as web
+    make_server(host, port, web.app, threaded=True, fd=sock.fileno()).serve_forever()
+
+
+def spawn(sock, host, port):
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            run_worker(sock, host, port)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
+    return pid
+
+
+def terminate(pid):
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def supervise(sock, host, port, workers):
+    children = {}  # pid -> start time
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            terminate(pid)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        children[spawn(sock, host, port)] = time.monotonic()
+    print(f"[SERVE] {workers} workers on http://{host}:{port} (pids {', '.join(map(str, children))})")
+
+    status = 0
+    while children:
+        try:
+            pid, wait_status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(wait_status)
+        if time.monotonic() - started < STARTUP_GRACE and code != 0:
+            print(f"[SERVE] Worker {pid} failed to start (exit {code}); shutting down")
+            status = 1
+            stop(None, None)
+            continue
+        print(f"[SERVE] Worker {pid} exited ({code}); restarting")
+        children[spawn(sock, host, port)] = time.monotonic()
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--config', help='JSON file of APP_CONFIG overrides (sets APP_CONFIG_FILE)')
+    parser.add_argument('--result-store', help='SQLite file for /receive results '
+                        '(default: one per port in the temp folder)')
+    args = parser.parse_args()
+
+    if args.config:
+        os.environ['APP_CONFIG_FILE'] = os.path.abspath(args.config)
+    if args.result_store:
+        os.environ['APP_RESULT_STORE_PATH'] = os.path.abspath(args.result_store)
+    elif args.workers > 1 and 'APP_RESULT_STORE_PATH' not in os.environ:
+        os.environ['APP_RESULT_STORE_PATH'] = os.path.join(tempfile.gettempdir(),
+                                                           f'equation_app_results_{args.port}.db')
+    if args.workers > 1:
+        # A session's deltas could reach any worker
+        os.environ['APP_INCREMENTAL_SESSIONS'] = '0'
+    # app.py keeps its folders (static/, data/, feedback/) relative to itself
+    os.chdir(APP_DIR)
+
+    if args.workers <= 1 or not hasattr(os, 'fork'):
+        import app as web
+        web.app.run(host=args.host, port=args.port, debug=False, threaded=True)
+        return 0
+
+    sock = socket.create_server((args.host, args.port), backlog=128)
+    sock.set_inheritable(True)
+    try:
+        return supervise(sock, args.host, args.port, args.workers)
+    finally:
+        sock.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
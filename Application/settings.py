@@ -0,0 +1,64 @@
+"""
+Startup configuration for app.py, read once when the module is imported.
+
+``APP_CONFIG`` in app.py holds the defaults. They can be overridden,
+without touching the code, by
+
+* a JSON file named by the ``APP_CONFIG_FILE`` environment variable, and
+* one environment variable per key, ``APP_`` + the key in upper case
+  (``APP_ENDPOINT_URL``, ``APP_BINARY_PROTOCOL=1``, ``APP_HTTP_POOL_SIZE=16``),
+
+in that order, so the environment wins. Values are converted to the type of
+the default; unknown keys in the file are an error. Every worker process of
+serve.py (or gunicorn) imports app.py and so sees the same configuration.
+"""
+
+import json
+import os
+
+CONFIG_FILE_VARIABLE = 'APP_CONFIG_FILE'
+ENV_PREFIX = 'APP_'
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off', '')
+
+
+def parse_value(text, default):
+    """Convert an environment string to the type of ``default``."""
+    if isinstance(default, bool):
+        value = text.strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise ValueError(f"expected a boolean, got {text!r}")
+    if isinstance(default, int):
+        return int(text)
+    if isinstance(default, float):
+        return float(text)
+    if default is None and text == '':
+        return None
+    return text
+
+
+def load_overrides(defaults, environ=None):
+    """Overrides for ``defaults`` from the config file and the environment."""
+    environ = os.environ if environ is None else environ
+    overrides = {}
+
+    path = environ.get(CONFIG_FILE_VARIABLE)
+    if path:
+        with open(path, 'r') as f:
+            from_file = json.load(f)
+        unknown = sorted(set(from_file) - set(defaults))
+        if unknown:
+            raise ValueError(f"{path}: unknown settings {', '.join(unknown)}")
+        overrides.update(from_file)
+
+    for key, default in defaults.items():
+        name = ENV_PREFIX + key.upper()
+        if name in environ:
+            try:
+                overrides[key] = parse_value(environ[name], default)
+            except ValueError as e:
+                raise ValueError(f"{name}: {e}") from None
+    return overrides
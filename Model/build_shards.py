@@ -0,0 +1,150 @@
+"""
+Pack the web app's labelled glyphs into training shards (glyph_shards.py).
+
+The web app saves every glyph it segments under Application/data/ as
+``char_<timestamp>_<n>.png`` and records, per request, the file prefix and
+the board's labels in the feedback database. A request's glyphs become
+training data once its feedback says how to label them:
+
+    confirmed correct          the board's labels
+    marked wrong, corrected    the correction's characters, if there is one
+                               per glyph (spaces and unknown characters
+                               dropped); otherwise skipped as unaligned
+    no feedback yet            skipped, or the board's labels with
+                               ``--unconfirmed``
+
+Requests already in the shards are skipped, so running this again after
+more feedback only appends what is new. Requests skipped for lack of
+feedback are picked up by a later run. ``--image-folder`` adds a
+hand-sorted dataset laid out as ImageFolder expects (one subfolder per
+class, white strokes on black like data/), for example the one
+Model.ipynb used to read.
+
+    python build_shards.py shards [--data ../Application/data]
+                           [--feedback ../Application/feedback/recognition_feedback.db]
+                           [--image-folder DIR] [--unconfirmed] [--shard-size 65536]
+"""
+
+import argparse
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+from PIL import Image
+
+from glyph_shards import (BOARD, CONFIRMED, CORRECTED, FOLDER, IMAGE_SIDE, ORIGINS, SHARD_SIZE,
+                          GlyphShards, ShardWriter)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, '..', 'Application'))
+
+from feedback_store import FeedbackStore  # noqa: E402
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def load_glyph(path):
+    """28 x 28 uint8, in the polarity of the file (white on black in data/)."""
+    img = Image.open(path).convert('L')
+    if img.size != (IMAGE_SIDE, IMAGE_SIDE):
+        img = img.resize((IMAGE_SIDE, IMAGE_SIDE), Image.BILINEAR)
+    return np.asarray(img, dtype=np.uint8)
+
+
+def capture_labels(capture, writer, unconfirmed):
+    """(class indices, origin) for a capture, or (None, reason it was skipped)."""
+    if capture['is_correct'] is None:
+        if not unconfirmed or not capture['labels']:
+            return None, 'no feedback'
+        names, origin = capture['labels'].split(), BOARD
+    elif capture['is_correct']:
+        if not capture['labels']:
+            return None, 'no board labels'
+        names, origin = capture['labels'].split(), CONFIRMED
+    else:
+        correction = capture['correction'] or ''
+        names = [char for char in correction.lower() if char in writer.classes]
+        origin = CORRECTED
+        if not names:
+            return None, 'no correction'
+    if len(names) != capture['count']:
+        return None, 'unaligned'
+    try:
+        return [writer.label_index(name) for name in names], origin
+    except KeyError:
+        return None, 'unknown label'
+
+
+def ingest_captures(writer, store, data_dir, unconfirmed):
+    skipped = Counter()
+    for capture in store.labelled_captures():
+        key = f"capture:{capture['request_id']}"
+        if key in writer:
+            continue
+        labels, origin = capture_labels(capture, writer, unconfirmed)
+        if labels is None:
+            skipped[origin] += 1
+            continue
+        paths = [os.path.join(data_dir, f"{capture['glyphs']}_{n}.png") for n in range(1, capture['count'] + 1)]
+        if not all(os.path.exists(path) for path in paths):
+            skipped['files missing'] += 1
+            continue
+        writer.add(key, [load_glyph(path) for path in paths], labels, origin)
+    return skipped
+
+
+def ingest_folder(writer, folder):
+    skipped = Counter()
+    for name in sorted(os.listdir(folder)):
+        class_dir = os.path.join(folder, name)
+        if not os.path.isdir(class_dir):
+            continue
+        try:
+            label = writer.label_index(name)
+        except KeyError:
+            skipped[f'class {name!r}'] += 1
+            continue
+        for file_name in sorted(os.listdir(class_dir)):
+            if not file_name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            key = f'folder:{name}/{file_name}'
+            if key not in writer:
+                writer.add(key, [load_glyph(os.path.join(class_dir, file_name))], [label], FOLDER)
+    return skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('shards', help='shard folder, created if missing')
+    parser.add_argument('--data', default=os.path.join(HERE, '..', 'Application', 'data'),
+                        help="the web app's glyph folder")
+    parser.add_argument('--feedback', default=os.path.join(HERE, '..', 'Application', 'feedback',
+                                                           'recognition_feedback.db'))
+    parser.add_argument('--image-folder', help='also add a hand-sorted dataset, one subfolder per class')
+    parser.add_argument('--unconfirmed', action='store_true',
+                        help="take the board's labels for requests without feedback")
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='glyphs per shard (new folders only)')
+    args = parser.parse_args()
+
+    writer = ShardWriter(args.shards, args.shard_size)
+    before = len(writer)
+    skipped = Counter()
+    if os.path.exists(args.feedback):
+        skipped.update(ingest_captures(writer, FeedbackStore(args.feedback), args.data, args.unconfirmed))
+    elif not args.image_folder:
+        parser.error(f"no feedback database at {args.feedback}")
+    if args.image_folder:
+        skipped.update(ingest_folder(writer, args.image_folder))
+    writer.commit()
+
+    added = len(writer) - before
+    print(f"{added} glyphs added, {len(writer)} in {len(writer.index['shards'])} shard(s) at {args.shards}")
+    if skipped:
+        print("Skipped: " + ', '.join(f'{reason} {count}' for reason, count in sorted(skipped.items())))
+    origins = Counter(GlyphShards(args.shards).origins().tolist())
+    print("By label source: " + ', '.join(f'{ORIGINS[origin]} {count}' for origin, count in sorted(origins.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+End-to-end check of the training input, from web app captures to a training step.
+
+In a temporary folder, ``--captures`` synthetic requests are saved the way
+the web app saves them: glyph PNGs under data/, plus a capture row and
+feedback in a feedback database. A quarter of the requests are confirmed,
+a quarter corrected, a quarter have no feedback and a quarter carry a
+correction with the wrong number of characters. They are ingested with
+build_shards.py into shards of ``--shard-size`` glyphs. Every glyph,
+label and label source read back through ``GlyphShards`` must be what was
+written, and a second ingest must add nothing.
+
+Then Model.ipynb's loading code (``ShardDataset``, ``random_split``,
+``DataLoader`` with ``GlyphBatch``) feeds one SGD step of the LeNet-5
+layout Custom_CNN trains. The batch must be N x 1 x 28 x 28 in [-1, 1],
+the loss finite and every layer must get a gradient. Exits with 1 on any
+failure.
+
+    python check_shards.py [--captures 24] [--shard-size 16] [--batch-size 32]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from build_shards import FeedbackStore, ingest_captures
+from glyph_shards import (CLASSES, CONFIRMED, CORRECTED, IMAGE_SIDE, GlyphBatch, GlyphShards,
+                          ShardDataset, ShardWriter, read_index)
+
+try:
+    import torch
+    import torch.nn as nn
+    from torch.utils.data import DataLoader, random_split
+except ImportError:
+    torch = None
+
+
+def write_captures(store, data_dir, count, rng):
+    """
+    Save ``count`` requests; returns (glyphs, labels, origins) of those
+    build_shards.py should ingest, in ingest order.
+    """
+    expected = ([], [], [])
+    for n in range(count):
+        request_id = f'{n:032x}'
+        prefix = f'char_20260101_000000_{n:06d}'
+        size = int(rng.integers(3, 8))
+        labels = [CLASSES[i] for i in rng.integers(0, len(CLASSES), size)]
+        glyphs = np.zeros((size, IMAGE_SIDE, IMAGE_SIDE), np.uint8)
+        for glyph in glyphs:
+            # A few white strokes on black, as data/ holds them
+            for _ in range(3):
+                y, x = rng.integers(4, IMAGE_SIDE - 8, 2)
+                glyph[y:y + rng.integers(2, 6), x:x + rng.integers(2, 12)] = 255
+        for i, glyph in enumerate(glyphs, 1):
+            Image.fromarray(glyph).save(os.path.join(data_dir, f'{prefix}_{i}.png'))
+        store.add_capture(request_id, prefix, size, ' '.join(labels))
+
+        kind = n % 4
+        if kind == 0:
+            store.add(' '.join(labels), True, request_id=request_id)
+            origin = CONFIRMED
+        elif kind == 1:
+            labels = [CLASSES[i] for i in rng.integers(0, len(CLASSES), size)]
+            store.add('?', False, correction=' '.join(labels), request_id=request_id)
+            origin = CORRECTED
+        elif kind == 2:
+            continue  # no feedback: skipped
+        else:
+            store.add('?', False, correction='1' * (size + 1), request_id=request_id)
+            continue  # unaligned: skipped
+        expected[0].append(glyphs)
+        expected[1].extend(CLASSES.index(label) for label in labels)
+        expected[2].extend([origin] * size)
+    return np.concatenate(expected[0]), np.array(expected[1]), np.array(expected[2])
+
+
+def check_ingest(folder, store, data_dir, captures, expected, shard_size):
+    """Failures, as messages."""
+    failures = []
+    writer = ShardWriter(folder, shard_size)
+    skipped = ingest_captures(writer, store, data_dir, unconfirmed=False)
+    writer.commit()
+    if dict(skipped) != {'no feedback': captures // 4, 'unaligned': captures // 4}:
+        failures.append(f"unexpected skips {dict(skipped)}")
+
+    shards = GlyphShards(folder)
+    glyphs, labels, origins = expected
+    if len(shards) != len(labels):
+        return failures + [f"{len(shards)} glyphs in the shards, expected {len(labels)}"]
+    read_glyphs, read_labels = shards.take(np.arange(len(shards)))
+    if not np.array_equal(read_glyphs, glyphs):
+        failures.append("glyphs differ")
+    if not np.array_equal(read_labels, labels):
+        failures.append("labels differ")
+    if not np.array_equal(shards.origins(), origins):
+        failures.append("label sources differ")
+    # Shuffled take() against single reads
+    order = np.random.default_rng(1).permutation(len(shards))[:50]
+    batch, batch_labels = shards.take(order)
+    if any(not np.array_equal(batch[k], shards[i][0]) or batch_labels[k] != shards[i][1]
+           for k, i in enumerate(order)):
+        failures.append("take() disagrees with indexing")
+
+    writer = ShardWriter(folder)
+    ingest_captures(writer, store, data_dir, unconfirmed=False)
+    writer.commit()
+    if len(GlyphShards(folder)) != len(labels):
+        failures.append("a second ingest added glyphs again")
+    return failures
+
+
+def lenet(num_classes):
+    """Custom_CNN's layers (Model.ipynb) without the quantization stubs."""
+    return nn.Sequential(
+        nn.Conv2d(1, 6, kernel_size=5, stride=1, padding=2), nn.ReLU(), nn.MaxPool2d(2, 2),
+        nn.Conv2d(6, 16, kernel_size=5, stride=1), nn.ReLU(), nn.MaxPool2d(2, 2),
+        nn.Flatten(), nn.Linear(16 * 5 * 5, 64), nn.ReLU(), nn.Linear(64, num_classes))
+
+
+def check_training_step(folder, batch_size):
+    """Failures, as messages, and the loss of the step."""
+    failures = []
+    dataset = ShardDataset(folder)
+    torch.manual_seed(42)
+    train_size = int(len(dataset) * 0.7)
+    train_set, _ = random_split(dataset, [train_size, len(dataset) - train_size])
+    loader = DataLoader(train_set, batch_size=batch_size, shuffle=True,
+                        collate_fn=GlyphBatch(rotation=20, blur_size=5, blur_sigma=0.5))
+    images, labels = next(iter(loader))
+    if images.shape != (min(batch_size, train_size), 1, IMAGE_SIDE, IMAGE_SIDE) or images.dtype != torch.float32:
+        failures.append(f"batch is {tuple(images.shape)} {images.dtype}")
+    if images.min() < -1 or images.max() > 1:
+        failures.append(f"batch spans [{images.min():.3f}, {images.max():.3f}], expected [-1, 1]")
+    if labels.dtype != torch.int64:
+        failures.append(f"labels are {labels.dtype}")
+
+    model = lenet(len(dataset.classes))
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.01, momentum=0.9)
+    loss = nn.CrossEntropyLoss()(model(images), labels)
+    optimizer.zero_grad()
+    loss.backward()
+    optimizer.step()
+    if not torch.isfinite(loss):
+        failures.append(f"loss is {loss.item()}")
+    without = [name for name, p in model.named_parameters() if p.grad is None or not p.grad.abs().sum() > 0]
+    if without:
+        failures.append(f"no gradient for {', '.join(without)}")
+    return failures, loss.item()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--captures', type=int, default=24, help='synthetic requests, a multiple of 4')
+    parser.add_argument('--shard-size', type=int, default=16, help='small, so the glyphs span several shards')
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+    if torch is None:
+        sys.exit("check_shards.py needs PyTorch")
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, 'data')
+        os.makedirs(data_dir)
+        store = FeedbackStore(os.path.join(tmp, 'recognition_feedback.db'))
+        expected = write_captures(store, data_dir, args.captures, rng)
+        folder = os.path.join(tmp, 'shards')
+
+        failures = check_ingest(folder, store, data_dir, args.captures, expected, args.shard_size)
+        print(f"ingest: {args.captures} captures, {len(GlyphShards(folder))} glyphs in "
+              f"{len(read_index(folder)['shards'])} shard(s): {'ok' if not failures else 'FAILED'}")
+        step_failures, loss = check_training_step(folder, args.batch_size)
+        print(f" train: one SGD step, loss {loss:.3f}: {'ok' if not step_failures else 'FAILED'}")
+        failures += step_failures
+
+    for failure in failures:
+        print(f"        {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""
+Training glyphs packed into fixed-size, memory-mapped shards.
+
+A shard folder holds ``index.json`` and, per shard, three .npy files of
+``shard_size`` rows each:
+
+    glyphs-00000.npy   shard_size x 28 x 28 uint8, white strokes on black as
+                       the web app saves them under data/
+    labels-00000.npy   shard_size uint8, index into ``classes``
+    origins-00000.npy  shard_size uint8, where the label came from (ORIGINS)
+
+The index lists the shards with the number of rows filled in each, the
+class names and the keys of everything ingested so far
+(build_shards.py). Only the last shard is ever partly filled; new glyphs go
+into its free rows and the index is replaced last, so an interrupted ingest
+leaves the previous state readable.
+
+``GlyphShards`` reads a folder through ``np.load(mmap_mode='r')``: opening
+it costs nothing and a batch is one fancy-indexing gather per shard, with
+no image decoding. ``ShardDataset`` wraps it as a PyTorch ``Dataset`` that
+also fetches whole batches (``__getitems__``), and ``GlyphBatch`` is the
+``collate_fn`` that does Model.ipynb's augmentation and normalisation on
+the whole batch with tensor ops.
+"""
+
+import json
+import os
+
+import numpy as np
+
+try:
+    import torch
+    import torch.nn.functional as F
+    from torch.utils.data import Dataset
+except ImportError:  # only needed for ShardDataset and GlyphBatch
+    torch = None
+    Dataset = object
+
+IMAGE_SIDE = 28
+SHARD_SIZE = 65536  # glyphs per shard, about 51 MB
+INDEX_FILE = 'index.json'
+VERSION = 1
+# ImageFolder's class order (sorted folder names), the order of label_mapping in model_info.json
+CLASSES = ('+', '-', '0', '1', '2', '3', '4', '5', '6', '7', '8', '9', '=', 'x', 'y')
+# Label sources
+CONFIRMED = 0  # board label, confirmed correct by feedback
+CORRECTED = 1  # from the correction typed in feedback
+BOARD = 2      # board label without feedback (build_shards.py --unconfirmed)
+FOLDER = 3     # class folder of a hand-sorted dataset
+ORIGINS = ('confirmed', 'corrected', 'board', 'folder')
+
+
+def shard_files(n):
+    return {part: f'{part}-{n:05d}.npy' for part in ('glyphs', 'labels', 'origins')}
+
+
+def read_index(folder):
+    with open(os.path.join(folder, INDEX_FILE), 'r') as f:
+        index = json.load(f)
+    if index.get('version') != VERSION:
+        raise ValueError(f"{folder}: unsupported shard index version {index.get('version')}")
+    return index
+
+
+class ShardWriter:
+    """
+    Appends labelled glyphs to a shard folder, creating it if needed.
+    Nothing is visible to readers before ``commit()``.
+    """
+
+    def __init__(self, folder, shard_size=SHARD_SIZE, classes=CLASSES):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        if os.path.exists(os.path.join(folder, INDEX_FILE)):
+            self.index = read_index(folder)
+        else:
+            self.index = {'version': VERSION, 'shard_size': shard_size, 'classes': list(classes),
+                          'shards': [], 'ingested': []}
+        self.shard_size = self.index['shard_size']
+        self.classes = self.index['classes']
+        self._class_index = {name: n for n, name in enumerate(self.classes)}
+        self._ingested = set(self.index['ingested'])
+        self._open = None  # (shard entry, {part: memmap}) of the shard being filled
+
+    def __contains__(self, key):
+        return key in self._ingested
+
+    def label_index(self, name):
+        """Class index of label ``name``; KeyError if it is not a class."""
+        return self._class_index[name]
+
+    def _tail(self):
+        shards = self.index['shards']
+        if not shards or shards[-1]['count'] == self.shard_size:
+            files = shard_files(len(shards))
+            shapes = {'glyphs': (self.shard_size, IMAGE_SIDE, IMAGE_SIDE),
+                      'labels': (self.shard_size,), 'origins': (self.shard_size,)}
+            for part, name in files.items():
+                np.lib.format.open_memmap(os.path.join(self.folder, name), mode='w+',
+                                          dtype=np.uint8, shape=shapes[part]).flush()
+            shards.append({**files, 'count': 0})
+        entry = shards[-1]
+        if self._open is None or self._open[0] is not entry:
+            self._close()
+            self._open = (entry, {part: np.load(os.path.join(self.folder, entry[part]), mmap_mode='r+')
+                                  for part in ('glyphs', 'labels', 'origins')})
+        return self._open
+
+    def _close(self):
+        if self._open is not None:
+            for array in self._open[1].values():
+                array.flush()
+            self._open = None
+
+    def add(self, key, glyphs, labels, origin):
+        """
+        Append N x 28 x 28 ``glyphs`` with class indices ``labels``, all
+        from ``origin``, and remember ``key`` as ingested.
+        """
+        glyphs = np.asarray(glyphs, dtype=np.uint8).reshape(-1, IMAGE_SIDE, IMAGE_SIDE)
+        labels = np.asarray(labels, dtype=np.uint8).reshape(-1)
+        start = 0
+        while start < len(glyphs):
+            entry, arrays = self._tail()
+            row = entry['count']
+            n = min(len(glyphs) - start, self.shard_size - row)
+            arrays['glyphs'][row:row + n] = glyphs[start:start + n]
+            arrays['labels'][row:row + n] = labels[start:start + n]
+            arrays['origins'][row:row + n] = origin
+            entry['count'] = row + n
+            start += n
+        self._ingested.add(key)
+        self.index['ingested'].append(key)
+
+    def commit(self):
+        """Flush the shards, then atomically replace the index."""
+        self._close()
+        path = os.path.join(self.folder, INDEX_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(path + '.tmp', path)
+
+    def __len__(self):
+        return sum(entry['count'] for entry in self.index['shards'])
+
+
+class GlyphShards:
+    """Read-only view of a shard folder: ``len()``, ``[i]`` and batched ``take()``."""
+
+    def __init__(self, folder):
+        index = read_index(folder)
+        self.classes = index['classes']
+        self._glyphs, self._labels, self._origins = [], [], []
+        for entry in index['shards']:
+            count = entry['count']
+            self._glyphs.append(np.load(os.path.join(folder, entry['glyphs']), mmap_mode='r')[:count])
+            self._labels.append(np.load(os.path.join(folder, entry['labels']), mmap_mode='r')[:count])
+            self._origins.append(np.load(os.path.join(folder, entry['origins']), mmap_mode='r')[:count])
+        counts = [len(labels) for labels in self._labels]
+        self._starts = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def __len__(self):
+        return int(self._starts[-1])
+
+    def _locate(self, index):
+        shard = int(np.searchsorted(self._starts, index, side='right')) - 1
+        return shard, index - int(self._starts[shard])
+
+    def __getitem__(self, index):
+        shard, row = self._locate(index)
+        return np.array(self._glyphs[shard][row]), int(self._labels[shard][row])
+
+    def take(self, indices):
+        """(N x 28 x 28 glyphs, N labels) for ``indices``, in that order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        glyphs = np.empty((len(indices), IMAGE_SIDE, IMAGE_SIDE), dtype=np.uint8)
+        labels = np.empty(len(indices), dtype=np.uint8)
+        shards = np.searchsorted(self._starts, indices, side='right') - 1
+        for shard in np.unique(shards):
+            mask = shards == shard
+            rows = indices[mask] - self._starts[shard]
+            # Sorted rows read the memory map front to back
+            order = np.argsort(rows, kind='stable')
+            picked = np.flatnonzero(mask)[order]
+            glyphs[picked] = self._glyphs[shard][rows[order]]
+            labels[picked] = self._labels[shard][rows[order]]
+        return glyphs, labels
+
+    def origins(self):
+        """Origin (CONFIRMED, ...) of every glyph, in order."""
+        if not self._origins:
+            return np.empty(0, dtype=np.uint8)
+        return np.concatenate([np.asarray(origins) for origins in self._origins])
+
+
+class ShardDataset(Dataset):
+    """
+    PyTorch view of a shard folder: items are (1 x 28 x 28 uint8 tensor,
+    label); ``origins`` keeps only glyphs labelled one of those ways.
+    Use ``GlyphBatch`` as the DataLoader's ``collate_fn``.
+    """
+
+    def __init__(self, folder, origins=None):
+        if torch is None:
+            raise ImportError("ShardDataset needs PyTorch")
+        self.shards = GlyphShards(folder)
+        self.classes = self.shards.classes
+        self.indices = None
+        if origins is not None:
+            self.indices = np.flatnonzero(np.isin(self.shards.origins(), list(origins)))
+
+    def __len__(self):
+        return len(self.shards) if self.indices is None else len(self.indices)
+
+    def _rows(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        return indices if self.indices is None else self.indices[indices]
+
+    def __getitem__(self, index):
+        glyph, label = self.shards[int(self._rows([index])[0])]
+        return torch.from_numpy(glyph).unsqueeze(0), label
+
+    def __getitems__(self, indices):
+        """A whole batch in one gather (DataLoader and Subset call this when present)."""
+        glyphs, labels = self.shards.take(self._rows(indices))
+        return torch.from_numpy(glyphs).unsqueeze(1), torch.from_numpy(labels.astype(np.int64))
+
+
+class GlyphBatch:
+    """
+    ``collate_fn`` turning a uint8 batch into the network's input, as
+    Model.ipynb's per-image transform did: random rotation by up to
+    ``rotation`` degrees (0: none, for validation and test), inversion to
+    black on white, a ``blur_size`` Gaussian blur and normalisation to
+    [-1, 1]. Every step runs once on the whole batch.
+    """
+
+    def __init__(self, rotation=20.0, blur_size=5, blur_sigma=0.5):
+        if torch is None:
+            raise ImportError("GlyphBatch needs PyTorch")
+        self.rotation = rotation
+        self.blur_size = blur_size
+        offsets = torch.arange(blur_size, dtype=torch.float32) - (blur_size - 1) / 2
+        kernel = torch.exp(-offsets ** 2 / (2 * blur_sigma ** 2))
+        self.kernel = kernel / kernel.sum()
+
+    def __call__(self, batch):
+        if isinstance(batch, tuple):
+            glyphs, labels = batch  # from ShardDataset.__getitems__
+        else:
+            glyphs = torch.stack([glyph for glyph, _ in batch])
+            labels = torch.tensor([label for _, label in batch], dtype=torch.int64)
+        x = glyphs.float().div_(255.0)
+        if self.rotation:
+            x = self.rotate(x)
+        x = 1.0 - x
+        x = self.blur(x)
+        return x.sub_(0.5).div_(0.5), labels
+
+    def rotate(self, x):
+        """Each glyph by its own random angle about the centre; the corners fill with background (0)."""
+        angles = (torch.rand(len(x)) * 2 - 1) * np.deg2rad(self.rotation)
+        cos, sin = torch.cos(angles), torch.sin(angles)
+        zeros = torch.zeros_like(angles)
+        theta = torch.stack((torch.stack((cos, -sin, zeros), 1), torch.stack((sin, cos, zeros), 1)), 1)
+        grid = F.affine_grid(theta, x.shape, align_corners=False)
+        # Nearest, like transforms.RandomRotation's default
+        return F.grid_sample(x, grid, mode='nearest', padding_mode='zeros', align_corners=False)
+
+    def blur(self, x):
+        """Separable Gaussian with reflected borders, as transforms.GaussianBlur."""
+        pad = self.blur_size // 2
+        x = F.pad(x, (pad, pad, pad, pad), mode='reflect')
+        x = F.conv2d(x, self.kernel.view(1, 1, 1, -1))
+        return F.conv2d(x, self.kernel.view(1, 1, -1, 1))
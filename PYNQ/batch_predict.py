@@ -0,0 +1,78 @@
+"""
+Batched multi-glyph inference over a single DMA send/recv pair.
+
+N images can be streamed in one transfer and N label bytes come back in one
+transfer once dma_predict ends each image after 784 bytes and only raises tlast
+on the result of the image that carried the input tlast. The dma_predict.vhd in
+RTL/Design still ends an image on tlast, so with it every transfer must carry
+one image (``ring_size=1``).
+"""
+
+import time
+
+import numpy as np
+
+IMAGE_SIZE = 784
+
+
+class BatchPredictor:
+    """
+    Packs N x 784 quantized images into one preallocated contiguous buffer.
+    Batches larger than ``ring_size`` are sent in ``ring_size`` chunks. The
+    per-stage time split of the last call is kept in ``timing``.
+    """
+
+    def __init__(self, dma, allocate, ring_size=32):
+        self.dma = dma
+        self.ring_size = ring_size
+        self.input_buffer = allocate(shape=(ring_size, IMAGE_SIZE), dtype=np.uint8)
+        self.output_buffer = allocate(shape=(ring_size,), dtype=np.uint8)
+        self.transfers = 0
+        self.timing = {}
+
+    def predict_batch(self, images, preprocess=None):
+        """
+        Return the predicted class index (uint8) for each quantized image.
+        With ``preprocess`` (a preprocess.InputQuantizer), ``images`` are raw
+        glyphs that it quantizes straight into the DMA buffer, chunk by chunk.
+        """
+        if preprocess is None:
+            images = np.asarray(images, dtype=np.uint8).reshape(-1, IMAGE_SIZE)
+        predictions = np.empty(len(images), dtype=np.uint8)
+        timing = {'transform': 0.0, 'flush': 0.0, 'dma_wait': 0.0, 'total': 0.0}
+        start_total = time.perf_counter()
+
+        for start in range(0, len(images), self.ring_size):
+            chunk = images[start:start + self.ring_size]
+            n = len(chunk)
+
+            t0 = time.perf_counter()
+            if preprocess is None:
+                self.input_buffer[:n] = chunk
+            else:
+                preprocess(chunk, out=self.input_buffer[:n])
+                t1 = time.perf_counter()
+                timing['transform'] += t1 - t0
+                t0 = t1
+            self.input_buffer.flush()
+            timing['flush'] += time.perf_counter() - t0
+
+            # One send/recv pair for the whole chunk
+            self.dma.sendchannel.transfer(self.input_buffer, nbytes=n * IMAGE_SIZE)
+            self.dma.recvchannel.transfer(self.output_buffer, nbytes=n)
+            t0 = time.perf_counter()
+            self.dma.sendchannel.wait()
+            self.dma.recvchannel.wait()
+            timing['dma_wait'] += time.perf_counter() - t0
+
+            self.output_buffer.invalidate()
+            predictions[start:start + n] = self.output_buffer[:n]
+            self.transfers += 1
+
+        timing['total'] = time.perf_counter() - start_total
+        self.timing = timing
+        return predictions
+
+    def close(self):
+        self.input_buffer.freebuffer()
+        self.output_buffer.freebuffer()
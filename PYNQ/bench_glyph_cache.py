@@ -0,0 +1,107 @@
+"""
+Replay of the web app's glyph corpus through ``GlyphCache``.
+
+The web app keeps every glyph it segments under Application/data/ as
+``char_<timestamp>_<n>.png``, inverted to white on black for training.
+This undoes the inversion, regroups the files into the uploads they came
+from (one timestamp per equation), quantizes them with the notebook's
+``transform()`` and replays the uploads in order through a cache in front
+of the bit-exact DPU emulator: exact keys only, then with the signature
+tier. It reports the hit rate, how many signature answers differ from
+what the DPU says for that glyph, the cache's own cost per glyph and the
+DPU time saved, at ``--glyph-ms`` per glyph the DPU runs (``predict()``
+prints about 0.78 ms on the board; calibrate with perf_model.py).
+
+    python bench_glyph_cache.py [../Application/data] [--weights model_info.bin]
+                                [--max-entries 4096] [--glyph-ms 0.78]
+"""
+
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from dpu_emulator import DPUEmulator
+from glyph_cache import GlyphCache
+from golden_vectors import load_weights, transform
+from model_registry import model_hash
+
+GLYPH_FILE = re.compile(r'char_(\d{8}_\d{6}_\d+)_(\d+)\.png$')
+
+
+def load_uploads(folder, weights):
+    """Quantized N x 784 batch per upload, oldest first."""
+    uploads = {}
+    for name in os.listdir(folder):
+        match = GLYPH_FILE.match(name)
+        if match:
+            uploads.setdefault(match.group(1), []).append((int(match.group(2)), name))
+    batches = []
+    for timestamp in sorted(uploads):
+        images = []
+        for _, name in sorted(uploads[timestamp]):
+            # Back to black on white, as the glyph left the web app
+            img = ImageOps.invert(Image.open(os.path.join(folder, name)).convert('L'))
+            images.append(transform(img, weights.input_scale, weights.input_zero_point))
+        batches.append(np.stack(images))
+    return batches
+
+
+def replay(batches, model_id, emulator, max_entries, signatures):
+    cache = GlyphCache(max_entries, signatures=signatures)
+    dpu = {'glyphs': 0, 'seconds': 0.0}
+
+    def predict(images):
+        start = time.perf_counter()
+        indices = emulator.predict_batch(images)
+        dpu['seconds'] += time.perf_counter() - start
+        dpu['glyphs'] += len(images)
+        return indices
+
+    wrong = 0
+    start = time.perf_counter()
+    answers = [cache.predict_batch(batch, model_id, predict) for batch in batches]
+    elapsed = time.perf_counter() - start
+    for batch, indices in zip(batches, answers):
+        wrong += int(np.count_nonzero(indices != emulator.predict_batch(batch)))
+    stats = cache.stats()
+    stats['wrong'] = wrong
+    stats['dpu_glyphs'] = dpu['glyphs']
+    stats['overhead_us'] = 1e6 * (elapsed - dpu['seconds']) / max(1, stats['lookups'])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('folder', nargs='?', default='../Application/data')
+    parser.add_argument('--weights', default='model_info.bin', help='model_info.bin or model_info.json')
+    parser.add_argument('--max-entries', type=int, default=4096)
+    parser.add_argument('--glyph-ms', type=float, default=0.78, help='DPU time per glyph on the board')
+    args = parser.parse_args()
+
+    weights = load_weights(args.weights)
+    batches = load_uploads(args.folder, weights)
+    if not batches:
+        parser.error(f"no char_<timestamp>_<n>.png glyphs in {args.folder}")
+    glyphs = sum(len(batch) for batch in batches)
+    distinct = len({glyph.tobytes() for batch in batches for glyph in batch})
+    print(f"{len(batches)} uploads, {glyphs} glyphs, {distinct} distinct after transform()")
+
+    emulator = DPUEmulator(weights.lists)
+    model_id = model_hash(weights)
+    print(f"{'tier':>10} | {'hit':>6} {'similar':>7} {'miss':>6} | {'hit rate':>8} | {'wrong':>5} | "
+          f"{'cache us':>8} | {'DPU glyphs':>10} | {'saved ms':>8}")
+    for name, signatures in (('exact', False), ('signature', True)):
+        stats = replay(batches, model_id, emulator, args.max_entries, signatures)
+        saved_ms = (glyphs - stats['dpu_glyphs']) * args.glyph_ms - glyphs * stats['overhead_us'] / 1e3
+        print(f"{name:>10} | {stats['hit']:6d} {stats['similar']:7d} {stats['miss']:6d} | "
+              f"{100 * stats['hit_rate']:7.1f}% | {stats['wrong']:5d} | {stats['overhead_us']:8.1f} | "
+              f"{stats['dpu_glyphs']:10d} | {saved_ms:8.1f}")
+    print(f"(saved ms: DPU glyphs avoided x {args.glyph_ms} ms, less the cache's own time)")
+
+
+if __name__ == '__main__':
+    main()
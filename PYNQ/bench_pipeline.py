@@ -0,0 +1,68 @@
+"""
+Serial vs pipelined glyph loop benchmark.
+
+Serial is the current ``predict_sequence`` loop: ``transform()`` then a
+blocking ``predict()`` per glyph. Pipelined is ``PipelinedPredictor``. Both
+are timed per stage over equations of 10-30 glyphs built from ``Samples/``.
+"""
+
+import contextlib
+import glob
+import io
+import os
+import time
+
+from PIL import Image
+
+
+def load_samples(folder="../Samples"):
+    paths = sorted(glob.glob(os.path.join(folder, "*.png")) + glob.glob(os.path.join(folder, "*.jpg")))
+    return [Image.open(p).copy() for p in paths]
+
+
+def time_serial(images, transform, predict):
+    timing = {'transform': 0.0, 'predict': 0.0, 'total': 0.0}
+    start_total = time.perf_counter()
+    # predict() prints its DMA time per glyph; keep that out of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        for img in images:
+            t0 = time.perf_counter()
+            img_quant = transform(img)
+            t1 = time.perf_counter()
+            predict(img_quant)
+            t2 = time.perf_counter()
+            timing['transform'] += t1 - t0
+            timing['predict'] += t2 - t1
+    timing['total'] = time.perf_counter() - start_total
+    return timing
+
+
+def time_pipelined(images, pipeline):
+    pipeline.predict_sequence(images)
+    return dict(pipeline.timing)
+
+
+def _mean(runs):
+    return {key: sum(run[key] for run in runs) / len(runs) for key in runs[0]}
+
+
+def run_benchmark(transform, predict, pipeline, samples=None, lengths=(10, 20, 30), repeats=5):
+    """Print the per-stage split (ms per equation) and return the raw numbers."""
+    samples = samples or load_samples()
+    results = {}
+
+    print(f"{'glyphs':>6} | {'serial':>8} {'transf':>8} {'predict':>8} | "
+          f"{'pipe':>8} {'transf':>8} {'flush':>8} {'dma wait':>8} | {'speedup':>7}")
+    for length in lengths:
+        images = [samples[i % len(samples)] for i in range(length)]
+        serial = _mean([time_serial(images, transform, predict) for _ in range(repeats)])
+        piped = _mean([time_pipelined(images, pipeline) for _ in range(repeats)])
+        speedup = serial['total'] / piped['total'] if piped['total'] else float('inf')
+        results[length] = {'serial': serial, 'pipelined': piped, 'speedup': speedup}
+
+        ms = lambda value: f"{value * 1e3:8.2f}"
+        print(f"{length:>6} | {ms(serial['total'])} {ms(serial['transform'])} {ms(serial['predict'])} | "
+              f"{ms(piped['total'])} {ms(piped['transform'])} {ms(piped['flush'])} {ms(piped['dma_wait'])} | "
+              f"{speedup:6.2f}x")
+
+    return results
@@ -0,0 +1,135 @@
+"""
+Bit-exactness check of preprocess.py against the notebook's ``transform()``.
+
+Every image is quantized both ways, with the model's input scale and zero
+point and with ``--tables`` further random (scale, zero point) pairs, and
+the bytes must be identical. Glyphs the web app saved under data/
+(``char_<timestamp>_<n>.png``, white on black) are inverted back first, as
+bench_glyph_cache.py does, so they are checked as the board receives them.
+``--sizes`` adds random images of every height and width up to that many
+pixels, since Samples/ and data/ hold mostly 28 x 28 glyphs, which skip
+the resize. Also prints the time per glyph of both on this machine, for
+the 28 x 28 glyphs and for the rest.
+Exits with 1 on any mismatch.
+
+    python check_preprocess.py [../Samples ../Application/data] [--weights model_info.bin]
+                               [--tables 32] [--sizes 64]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from golden_vectors import find_images, load_weights, transform
+from preprocess import InputQuantizer, glyph_arrays
+
+GLYPH_FILE = re.compile(r'char_\d{8}_\d{6}_\d+_\d+\.png$')
+
+
+def load_images(paths):
+    images = []
+    for path in find_images(paths):
+        img = Image.open(path)
+        if GLYPH_FILE.match(os.path.basename(path)):
+            img = ImageOps.invert(img.convert('L'))
+        img.load()
+        images.append(img)
+    return images
+
+
+def synthetic_images(max_side, seed=0):
+    """One random image per (height, width) up to ``max_side``; half are black and white strokes."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for height in range(1, max_side + 1):
+        for width in range(1, max_side + 1):
+            pixels = rng.integers(0, 256, (height, width), dtype=np.uint8)
+            if (height + width) % 2:
+                pixels = np.where(pixels > 127, 255, 0).astype(np.uint8)
+            images.append(Image.fromarray(pixels))
+    return images
+
+
+def compare(images, params):
+    """Images whose bytes differ, for each (scale, zero point)."""
+    glyphs = glyph_arrays(images)
+    mismatches = {}
+    for scale, zero_point in params:
+        expected = np.stack([transform(img, scale, zero_point) for img in images])
+        actual = InputQuantizer(scale, zero_point)(glyphs)
+        wrong = np.flatnonzero((expected != actual).any(axis=1))
+        if len(wrong):
+            mismatches[(scale, zero_point)] = wrong
+    return mismatches
+
+
+def time_per_glyph(images, scale, zero_point, repeats=5):
+    """(transform(), InputQuantizer) microseconds per glyph, best of ``repeats``."""
+    quantizer = InputQuantizer(scale, zero_point)
+    reference, table = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        np.stack([transform(img, scale, zero_point) for img in images])
+        reference.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        quantizer(images)
+        table.append(time.perf_counter() - start)
+    return 1e6 * min(reference) / len(images), 1e6 * min(table) / len(images)
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('images', nargs='*',
+                        help='images or folders (default: Samples/ and Application/data/, if present)')
+    parser.add_argument('--weights', default=os.path.join(here, 'model_info.bin'),
+                        help='model_info.bin or model_info.json')
+    parser.add_argument('--tables', type=int, default=32, help='random (scale, zero point) pairs besides the model')
+    parser.add_argument('--sizes', type=int, default=64, help='random images of every size up to this')
+    args = parser.parse_args()
+
+    weights = load_weights(args.weights)
+    rng = np.random.default_rng(0)
+    params = [(weights.input_scale, weights.input_zero_point)]
+    params += [(float(rng.uniform(1e-3, 0.1)), int(rng.integers(0, 256))) for _ in range(args.tables)]
+
+    images = args.images
+    if not images:
+        # Application/data only exists once the web app has saved glyphs
+        images = [os.path.join(here, '..', 'Samples'), os.path.join(here, '..', 'Application', 'data')]
+        for folder in images:
+            if not os.path.isdir(folder):
+                print(f"skipping {os.path.normpath(folder)}: no such folder")
+        images = [folder for folder in images if os.path.isdir(folder)]
+    corpus = load_images(images)
+    failed = False
+    for name, images in (('corpus', corpus), ('sizes', synthetic_images(args.sizes))):
+        if not images:
+            print(f"{name:>6}: no images")
+            continue
+        mismatches = compare(images, params)
+        sizes = len({img.size for img in images})
+        print(f"{name:>6}: {len(images)} images, {sizes} sizes, {len(params)} quantizations: "
+              f"{'bit-exact' if not mismatches else f'{len(mismatches)} quantizations differ'}")
+        for (scale, zero_point), wrong in list(mismatches.items())[:5]:
+            print(f"        scale {scale:.6g} zero point {zero_point}: {len(wrong)} images, "
+                  f"first {images[wrong[0]].size}")
+        failed |= bool(mismatches)
+
+    glyph_size = [img for img in corpus if img.size == (28, 28)]
+    other_size = [img for img in corpus if img.size != (28, 28)]
+    for name, images in (('28 x 28', glyph_size), ('resized', other_size)):
+        if images:
+            reference, table = time_per_glyph(images, *params[0])
+            print(f"{name:>7}: transform() {reference:.1f} us/glyph, InputQuantizer {table:.1f} us/glyph "
+                  f"({reference / table:.1f}x) on this machine")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""
+Bit-exact software model of the int8 DPU (RTL/Design, layer_1 .. layer_6).
+
+The emulator consumes the same packed streams that ``init()`` sends
+(``WeightImage.lists``: CONV_1, CONV_2, FC_1, FC_2, SCALES_ZERO_POINT) and
+reproduces the integer arithmetic of the VHDL pipeline:
+
+    relu_conv1       conv 5x5 / pad 2, (pixel - input_zero_point) as signed 8-bit
+    channel_max_pool 2x2 / stride 2 max over unsigned bytes
+    relu_conv2       conv 5x5 over 6 input channels, no padding
+    channel_layer_5  FC 400 -> 64
+    channel_layer_6  FC 64 -> 15, plus output_zero_point
+    layer_6          argmax (first maximum wins)
+
+Every layer ends with the same NORMALIZE_RELU step: a 32-bit product with the
+fixed-point scale (Final_Scales, x2^16), an arithmetic shift right by 16 and a
+clamp to [0, 255].
+"""
+
+import time
+
+import numpy as np
+
+CONV1_OUT = 6
+CONV2_OUT = 16
+FC1_OUT = 64
+FC2_OUT = 15
+KERNEL = 5
+FC1_IN = CONV2_OUT * 5 * 5
+IMAGE_SIZE = 28 * 28
+
+# Images per vectorized step; bounds the im2col scratch memory (~10 MB)
+CHUNK = 256
+
+
+def join_bytes(chunks):
+    """Rebuild signed 32-bit words from 4-byte chunks, MSB first (as dma_init does)."""
+    b = np.asarray(chunks).astype(np.uint8).astype(np.uint32).reshape(-1, 4)
+    words = (b[:, 0] << 24) | (b[:, 1] << 16) | (b[:, 2] << 8) | b[:, 3]
+    return words.astype(np.int32).astype(np.int64)
+
+
+def unpack_lists(lists):
+    """
+    Split the five DMA init streams into weight tensors, biases, scales and
+    zero points. Shapes follow the PyTorch layout (out, in, kh, kw).
+    """
+    conv1, conv2, fc1, fc2, scales = (np.asarray(l).astype(np.int8) for l in lists)
+
+    conv1 = conv1.reshape(CONV1_OUT, KERNEL * KERNEL + 4)
+    conv2 = conv2.reshape(CONV2_OUT, CONV1_OUT * KERNEL * KERNEL + 4)
+    fc1 = fc1.reshape(FC1_OUT, FC1_IN + 4)
+    fc2 = fc2.reshape(FC2_OUT, FC1_OUT + 4)
+
+    params = {
+        'conv1_w': conv1[:, :-4].reshape(CONV1_OUT, 1, KERNEL, KERNEL),
+        'conv1_b': join_bytes(conv1[:, -4:]),
+        'conv2_w': conv2[:, :-4].reshape(CONV2_OUT, CONV1_OUT, KERNEL, KERNEL),
+        'conv2_b': join_bytes(conv2[:, -4:]),
+        'fc1_w': fc1[:, :-4],
+        'fc1_b': join_bytes(fc1[:, -4:]),
+        'fc2_w': fc2[:, :-4],
+        'fc2_b': join_bytes(fc2[:, -4:]),
+        # scales arrive as unsigned 32-bit words, zero points as unsigned bytes
+        'scales': join_bytes(scales[:16]) & 0xFFFFFFFF,
+        'input_zero_point': int(scales[16].astype(np.uint8)),
+        'output_zero_point': int(scales[17].astype(np.uint8)),
+    }
+    return params
+
+
+def _wrap32(x):
+    """Two's-complement wrap of int64 values to 32 bits (VHDL signed(31 downto 0))."""
+    return x.astype(np.int32).astype(np.int64)
+
+
+def _scale_shift(acc, scale):
+    """NORMALIZE_RELU steps 1-2: 32-bit multiply then shift_right(..., 16)."""
+    return _wrap32(_wrap32(acc) * int(scale)) >> 16
+
+
+def _relu_clamp(scaled):
+    """NORMALIZE_RELU step 3: saturate to an unsigned byte."""
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+def _conv(x, w, bias):
+    """
+    Valid 5x5 convolution of x (N, C, H, W) with w (O, C, 5, 5) via im2col.
+
+    The MACs run as float64 matmul: every product and partial sum is an integer
+    well below 2^53, so the result is exact, and BLAS keeps it fast. The 32-bit
+    wraparound of the hardware accumulators is applied afterwards, which is
+    equivalent because addition modulo 2^32 is order independent.
+    """
+    n, c, h, _ = x.shape
+    out = h - KERNEL + 1
+    windows = np.lib.stride_tricks.sliding_window_view(x, (KERNEL, KERNEL), axis=(2, 3))
+    # (N, C, out, out, 5, 5) -> (N, out, out, C*25) to match w.reshape(O, C*25)
+    cols = windows.transpose(0, 2, 3, 1, 4, 5).reshape(n * out * out, c * KERNEL * KERNEL)
+    acc = cols.astype(np.float64) @ w.reshape(w.shape[0], -1).T.astype(np.float64)
+    acc = acc.astype(np.int64).reshape(n, out, out, -1).transpose(0, 3, 1, 2)
+    return acc + bias[None, :, None, None]
+
+
+def _max_pool(x):
+    """2x2 / stride 2 max pooling of unsigned bytes (channel_max_pooling)."""
+    n, c, h, w = x.shape
+    return x.reshape(n, c, h // 2, 2, w // 2, 2).max(axis=(3, 5))
+
+
+class DPUEmulator:
+    """
+    Software stand-in for the overlay. ``predict_batch`` returns the same byte
+    that ``dma_predict`` writes into the output buffer, one per image.
+    """
+
+    def __init__(self, lists):
+        p = unpack_lists(lists)
+        self.params = p
+        self.scales = [int(s) for s in p['scales']]
+        self.input_zero_point = p['input_zero_point']
+        self.output_zero_point = p['output_zero_point']
+
+    def forward(self, images):
+        """
+        Run a batch of quantized images (N x 784 uint8, as produced by
+        ``transform()``) and return every intermediate activation.
+        """
+        p = self.params
+        x = np.asarray(images, dtype=np.uint8).reshape(-1, 1, 28, 28)
+
+        # relu_conv1 PREPROCESS: to_signed(pixel - input_zero_point, 8), padding reads 0
+        centred = (x.astype(np.int16) - self.input_zero_point).astype(np.int8)
+        centred = np.pad(centred, ((0, 0), (0, 0), (2, 2), (2, 2)))
+        conv1 = _relu_clamp(_scale_shift(_conv(centred, p['conv1_w'], p['conv1_b']), self.scales[0]))
+        pool1 = _max_pool(conv1)
+
+        conv2 = _relu_clamp(_scale_shift(_conv(pool1, p['conv2_w'], p['conv2_b']), self.scales[1]))
+        pool2 = _max_pool(conv2)
+
+        # FC1 walks the 16 pool2 BRAMs channel by channel: index = c * 25 + row * 5 + col
+        flat = pool2.reshape(pool2.shape[0], FC1_IN).astype(np.float64)
+        acc = (flat @ p['fc1_w'].T.astype(np.float64)).astype(np.int64) + p['fc1_b']
+        fc1 = _relu_clamp(_scale_shift(acc, self.scales[2]))
+
+        acc = (fc1.astype(np.float64) @ p['fc2_w'].T.astype(np.float64)).astype(np.int64) + p['fc2_b']
+        scaled = _scale_shift(acc, self.scales[3])
+        # channel_layer_6 saturates on the raw value but wraps after adding the zero point
+        shifted = scaled + self.output_zero_point
+        fc2 = np.where(scaled > 255, 255, np.where(shifted < 0, 0, shifted & 0xFF)).astype(np.uint8)
+
+        return {
+            'conv1': conv1,
+            'pool1': pool1,
+            'conv2': conv2,
+            'pool2': pool2,
+            'fc1': fc1,
+            'fc2': fc2,
+            # strict '>' scan from index 0 == first occurrence of the maximum
+            'predict': np.argmax(fc2, axis=1).astype(np.uint8),
+        }
+
+    def predict_batch(self, images):
+        """Return the predicted class index (uint8) for each image in the batch."""
+        images = np.asarray(images, dtype=np.uint8).reshape(-1, IMAGE_SIZE)
+        out = np.empty(len(images), dtype=np.uint8)
+        for start in range(0, len(images), CHUNK):
+            out[start:start + CHUNK] = self.forward(images[start:start + CHUNK])['predict']
+        return out
+
+    def predict(self, image):
+        """Single-image equivalent of reading ``output_buffer[0]`` after a DMA run."""
+        return int(self.predict_batch(image)[0])
+
+
+class EmulatedBuffer(np.ndarray):
+    """ndarray with the cache-maintenance methods of a pynq ``allocate()`` buffer."""
+
+    def flush(self):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def freebuffer(self):
+        pass
+
+
+def emulated_allocate(shape, dtype=np.uint8):
+    """Drop-in for ``pynq.allocate`` backed by ordinary host memory."""
+    return np.zeros(shape, dtype=dtype).view(EmulatedBuffer)
+
+
+class _Channel:
+    """Mimics the ``transfer``/``wait``/``idle`` interface of a pynq DMA channel."""
+
+    def __init__(self, dma):
+        self._dma = dma
+        self.pending = None
+
+    def transfer(self, array, start=0, nbytes=0):
+        if not self.idle:
+            raise RuntimeError("DMA channel not idle")
+        view = array.reshape(-1).view(np.uint8)
+        nbytes = nbytes or view.nbytes - start
+        self.pending = view[start:start + nbytes]
+        self._dma._start()
+
+    def wait(self):
+        self._dma._wait()
+
+    @property
+    def idle(self):
+        self._dma._poll()
+        return self.pending is None
+
+
+class EmulatedDMA:
+    """
+    Local stand-in for ``overlay.axi_dma_0`` in predict mode.
+
+    ``sendchannel`` streams images (784 bytes each, several per transfer
+    allowed, as BatchPredictor sends them for the batch framing);
+    ``recvchannel`` receives one label byte per image. Once both sides of a transfer are posted the run completes
+    asynchronously after ``latency`` seconds per image, so callers can poll
+    ``idle`` or block in ``wait()`` just like on the board.
+    """
+
+    def __init__(self, emulator, latency=0.0):
+        self.emulator = emulator
+        self.latency = latency
+        self.sendchannel = _Channel(self)
+        self.recvchannel = _Channel(self)
+        self.transfers = 0
+        self._result = None
+        self._done_at = 0.0
+
+    def _start(self):
+        send, recv = self.sendchannel.pending, self.recvchannel.pending
+        if send is None or recv is None or self._result is not None:
+            return
+        if send.size % IMAGE_SIZE or send.size // IMAGE_SIZE != recv.size:
+            # The real stream would stall waiting for tlast; fail loudly instead
+            raise RuntimeError(f"DMA size mismatch: sent {send.size} bytes, receiving {recv.size}")
+        self._result = self.emulator.predict_batch(send)
+        self._done_at = time.perf_counter() + self.latency * recv.size
+
+    def _poll(self):
+        if self._result is not None and time.perf_counter() >= self._done_at:
+            self.recvchannel.pending[:] = self._result
+            self.sendchannel.pending = None
+            self.recvchannel.pending = None
+            self._result = None
+            self.transfers += 1
+
+    def _wait(self):
+        if self._result is None:
+            if self.sendchannel.pending is not None or self.recvchannel.pending is not None:
+                raise RuntimeError("DMA wait would block: only one side of the transfer was posted")
+            return
+        time.sleep(max(0.0, self._done_at - time.perf_counter()))
+        self._poll()
@@ -0,0 +1,158 @@
+"""
+Content-addressed cache of DPU predictions, in front of the batch DMA.
+
+People write the same few symbols over and over, and after ``transform()``
+many glyphs quantize to exactly the same 784 bytes. ``GlyphCache`` maps
+(model ID, BLAKE2b digest of the quantized glyph) to the class index the
+DPU returned for it. Lookups and inserts are O(1), the least recently used
+entry goes once ``max_entries`` is reached, and a batch whose glyphs are
+all cached never touches the DMA. The model ID is part of the key, so a
+model switch (model_registry.py) never serves another model's answers, and
+switching back finds the old entries still there.
+
+An optional second tier, ``signatures=True``, also answers near-identical
+glyphs: the glyph is binarised at the middle of its own value range and
+shrunk to ``SIGNATURE_SIZE`` x ``SIGNATURE_SIZE`` blocks (a block is set if
+any pixel in it is), so a stroke shifted or thickened by a pixel usually
+keeps its signature. That is a guess, not the DPU's answer: a signature is
+only used after ``min_votes`` exact predictions with that signature all
+agreed, and never again once two of them disagree. Copies of one glyph in
+a batch reach the DPU once, so they count as one miss and one vote; the
+other copies count as hits.
+
+Counts of the last call are kept in ``last`` and running totals in
+``stats()``.
+"""
+
+import collections
+import hashlib
+import threading
+
+import numpy as np
+
+IMAGE_SIDE = 28
+IMAGE_SIZE = IMAGE_SIDE * IMAGE_SIDE
+SIGNATURE_SIZE = 7     # blocks per side; 4 x 4 pixels each
+CONFLICT = -1          # signature seen with two different labels
+RESULTS = ('hit', 'similar', 'miss')
+
+
+def glyph_digest(glyph):
+    """16-byte content hash of one quantized glyph."""
+    return hashlib.blake2b(glyph.tobytes(), digest_size=16).digest()
+
+
+def glyph_signatures(images):
+    """Binarised block signature (bytes) of each quantized image in an N x 784 batch."""
+    images = np.asarray(images, dtype=np.uint8).reshape(-1, IMAGE_SIZE)
+    low = images.min(axis=1, keepdims=True).astype(np.int16)
+    high = images.max(axis=1, keepdims=True).astype(np.int16)
+    # Strokes are the dark side: transform() maps black ink to the low end
+    ink = images < (low + high) // 2
+    block = IMAGE_SIDE // SIGNATURE_SIZE
+    blocks = ink.reshape(-1, SIGNATURE_SIZE, block, SIGNATURE_SIZE, block).any(axis=(2, 4))
+    packed = np.packbits(blocks.reshape(len(images), -1), axis=1)
+    return [row.tobytes() for row in packed]
+
+
+class GlyphCache:
+    """
+    LRU of quantized glyph -> class index, at most ``max_entries`` exact
+    entries (about 200 bytes each) and as many signatures.
+    """
+
+    def __init__(self, max_entries=4096, signatures=False, min_votes=2):
+        self.max_entries = max_entries
+        self.signatures = signatures
+        self.min_votes = min_votes
+        self._exact = collections.OrderedDict()       # (model, digest) -> index, oldest first
+        self._similar = collections.OrderedDict()     # (model, signature) -> [index or CONFLICT, votes]
+        self._lock = threading.Lock()
+        self.totals = dict.fromkeys(RESULTS, 0)
+        self.last = dict.fromkeys(RESULTS, 0)
+
+    def _remember(self, table, key, value):
+        table[key] = value
+        table.move_to_end(key)
+        if len(table) > self.max_entries:
+            table.popitem(last=False)
+
+    def _vote(self, key, index):
+        entry = self._similar.get(key)
+        if entry is None:
+            entry = [int(index), 0]
+        elif entry[0] != index:
+            entry[0] = CONFLICT
+        entry[1] += 1
+        self._remember(self._similar, key, entry)
+
+    def predict_batch(self, images, model_id, predict):
+        """
+        Class index for each quantized image of an N x 784 batch; only the
+        misses are passed to ``predict`` (an N x 784 -> N indices function,
+        ``BatchPredictor.predict_batch`` on the board), in one call.
+        """
+        images = np.asarray(images, dtype=np.uint8).reshape(-1, IMAGE_SIZE)
+        keys = [(model_id, glyph_digest(glyph)) for glyph in images]
+        signatures = [(model_id, s) for s in glyph_signatures(images)] if self.signatures else None
+        indices = np.empty(len(images), dtype=np.uint8)
+        missing = []
+        last = dict.fromkeys(RESULTS, 0)
+
+        with self._lock:
+            for n, key in enumerate(keys):
+                index = self._exact.get(key)
+                if index is not None:
+                    self._exact.move_to_end(key)
+                    indices[n] = index
+                    last['hit'] += 1
+                    continue
+                if signatures is not None:
+                    entry = self._similar.get(signatures[n])
+                    if entry is not None and entry[0] != CONFLICT and entry[1] >= self.min_votes:
+                        self._similar.move_to_end(signatures[n])
+                        indices[n] = entry[0]
+                        last['similar'] += 1
+                        continue
+                missing.append(n)
+        first = {}  # digest -> first missing copy in the batch
+        for n in missing:
+            first.setdefault(keys[n], n)
+        unique = list(first.values())
+        last['miss'] = len(unique)
+        last['hit'] += len(missing) - len(unique)
+
+        if unique:
+            # Outside the cache lock; the caller serialises access to the DPU
+            indices[unique] = predict(images[unique])
+            indices[missing] = indices[[first[keys[n]] for n in missing]]
+            with self._lock:
+                for n in unique:
+                    self._remember(self._exact, keys[n], int(indices[n]))
+                    if signatures is not None:
+                        self._vote(signatures[n], indices[n])
+
+        with self._lock:
+            for result, count in last.items():
+                self.totals[result] += count
+        self.last = last
+        return indices
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._similar.clear()
+
+    def stats(self):
+        with self._lock:
+            totals = dict(self.totals)
+            entries, signatures = len(self._exact), len(self._similar)
+        lookups = sum(totals.values())
+        return {
+            **totals,
+            'lookups': lookups,
+            'hit_rate': (totals['hit'] + totals['similar']) / lookups if lookups else 0.0,
+            'entries': entries,
+            'signatures': signatures,
+            'max_entries': self.max_entries,
+        }
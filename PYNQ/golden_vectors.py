@@ -0,0 +1,229 @@
+"""
+Golden vectors for the VHDL testbenches, and a batch comparator for them.
+
+``generate`` runs images through the notebook's ``transform()`` and the
+bit-exact int8 reference (``DPUEmulator``, same weight image as the board)
+and writes every intermediate activation:
+
+    input   784 bytes, the DMA input stream
+    conv1   6 x 28 x 28      pool1   6 x 14 x 14
+    conv2   16 x 10 x 10     pool2   16 x 5 x 5
+    fc1     64               fc2     15
+    predict 1 byte, what dma_predict sends back
+
+Each layer goes to ``<layer>.bin`` (raw uint8, images back to back, channel
+major) and, with ``--hex``, to ``<layer>.hex`` with one byte per line as two
+hex digits, which a testbench reads with ``std.textio``::
+
+    readline(vectors, l); hread(l, byte);  -- byte : std_logic_vector(7 downto 0)
+
+``manifest.json`` lists the images, the layer shapes and the model hash.
+
+``compare`` loads a testbench dump in the same format (``.bin`` or ``.hex``;
+layers it did not write are skipped) and reports, per image, the first
+layer that differs and the (channel, row, col) of the first wrong byte.
+
+    python golden_vectors.py generate ../Samples vectors/ [--hex] [--weights model_info.bin]
+    python golden_vectors.py compare vectors/ tb_out/ [--show 10]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+from dpu_emulator import CHUNK, DPUEmulator
+from model_registry import model_hash
+from weight_image import WeightImage, read_weight_image
+
+LAYER_SHAPES = {
+    'input': (1, 28, 28),
+    'conv1': (6, 28, 28),
+    'pool1': (6, 14, 14),
+    'conv2': (16, 10, 10),
+    'pool2': (16, 5, 5),
+    'fc1': (64,),
+    'fc2': (15,),
+    'predict': (1,),
+}
+IMAGE_TYPES = ('*.png', '*.jpg', '*.jpeg', '*.bmp')
+
+
+def transform(image, scale, zero_point):
+    """Same quantization as ``transform()`` in lenetv5_accelerator.ipynb."""
+    img = image.convert("L").resize((28, 28), resample=Image.BILINEAR)
+    img_normalized = (np.array(img, dtype=np.float32) / 255.0 - 0.5) / 0.5
+    return np.clip(np.round(img_normalized.flatten() / scale + zero_point), 0, 255).astype(np.uint8)
+
+
+def find_images(paths):
+    """Expand files and folders (searched recursively) into a sorted list of image paths."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in IMAGE_TYPES:
+                found += glob.glob(os.path.join(path, '**', pattern), recursive=True)
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def load_weights(path):
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            return WeightImage.from_model_info(json.load(f))
+    return read_weight_image(path)
+
+
+def generate(images, weights):
+    """
+    Quantize ``images`` (PIL images) and run the reference; returns
+    {layer: (N, size) uint8} in ``LAYER_SHAPES`` order.
+    """
+    emulator = DPUEmulator(weights.lists)
+    inputs = np.stack([transform(img, weights.input_scale, weights.input_zero_point) for img in images])
+
+    layers = {name: [] for name in LAYER_SHAPES}
+    layers['input'].append(inputs)
+    for start in range(0, len(inputs), CHUNK):
+        out = emulator.forward(inputs[start:start + CHUNK])
+        for name in LAYER_SHAPES:
+            if name != 'input':
+                layers[name].append(out[name].reshape(len(out[name]), -1))
+    return {name: np.concatenate(chunks) for name, chunks in layers.items()}
+
+
+def write_hex(path, data):
+    with open(path, 'w') as f:
+        f.write('\n'.join(bytes(data.reshape(-1)).hex(' ').split(' ')) + '\n')
+
+
+def read_hex(path):
+    with open(path, 'r') as f:
+        return np.frombuffer(bytes.fromhex(''.join(f.read().split())), dtype=np.uint8)
+
+
+def write_vectors(folder, names, layers, model_id=None, hex_files=False):
+    os.makedirs(folder, exist_ok=True)
+    for name, data in layers.items():
+        data.tofile(os.path.join(folder, f"{name}.bin"))
+        if hex_files:
+            write_hex(os.path.join(folder, f"{name}.hex"), data)
+
+    manifest = {
+        'count': len(names),
+        'images': names,
+        'model': model_id,
+        'layers': {name: list(shape) for name, shape in LAYER_SHAPES.items()},
+    }
+    with open(os.path.join(folder, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+def read_vectors(folder, count=None):
+    """Load every layer present in ``folder`` as (N, size) arrays; ``.bin`` wins over ``.hex``."""
+    layers = {}
+    for name, shape in LAYER_SHAPES.items():
+        size = int(np.prod(shape))
+        base = os.path.join(folder, name)
+        if os.path.exists(base + '.bin'):
+            data = np.fromfile(base + '.bin', dtype=np.uint8)
+        elif os.path.exists(base + '.hex'):
+            data = read_hex(base + '.hex')
+        else:
+            continue
+        if data.size % size:
+            raise ValueError(f"{base}: {data.size} bytes is not a whole number of {name} vectors ({size} each)")
+        layers[name] = data.reshape(-1, size)[:count]
+    return layers
+
+
+def compare(expected, actual):
+    """
+    Vectorized diff of two ``read_vectors`` results. Returns one entry per
+    mismatching image: (image index, layer, flat offset, expected, actual),
+    for the first layer in pipeline order that differs.
+    """
+    common = [name for name in LAYER_SHAPES if name in expected and name in actual]
+    if not common:
+        raise ValueError("no layers in common")
+    count = min(min(len(expected[name]), len(actual[name])) for name in common)
+
+    first_layer = np.full(count, -1)
+    first_offset = np.zeros(count, dtype=np.int64)
+    # Walk the layers backwards so the earliest mismatching layer wins
+    for index in reversed(range(len(common))):
+        name = common[index]
+        diff = expected[name][:count] != actual[name][:count]
+        bad = diff.any(axis=1)
+        first_layer[bad] = index
+        first_offset[bad] = diff[bad].argmax(axis=1)
+
+    mismatches = []
+    for image in np.flatnonzero(first_layer >= 0):
+        name = common[first_layer[image]]
+        offset = first_offset[image]
+        mismatches.append((int(image), name, int(offset),
+                           int(expected[name][image, offset]), int(actual[name][image, offset])))
+    return mismatches, common, count
+
+
+def coordinate(layer, offset):
+    return tuple(int(i) for i in np.unravel_index(offset, LAYER_SHAPES[layer]))
+
+
+def cmd_generate(args):
+    paths = find_images(args.images)[:args.limit]
+    if not paths:
+        sys.exit("no images found")
+    weights = load_weights(args.weights)
+    layers = generate([Image.open(p) for p in paths], weights)
+    write_vectors(args.output, [os.path.relpath(p) for p in paths], layers, model_hash(weights), args.hex)
+    print(f"Wrote {len(paths)} vectors x {len(layers)} layers to {args.output}")
+
+
+def cmd_compare(args):
+    expected = read_vectors(args.expected)
+    actual = read_vectors(args.actual)
+    mismatches, layers, count = compare(expected, actual)
+
+    with open(os.path.join(args.expected, 'manifest.json'), 'r') as f:
+        names = json.load(f)['images']
+    for image, layer, offset, want, got in mismatches[:args.show]:
+        print(f"{names[image]}: first mismatch in {layer} at {coordinate(layer, offset)}: "
+              f"expected {want}, got {got}")
+
+    per_layer = {name: sum(1 for m in mismatches if m[1] == name) for name in layers}
+    print(f"{count} images, layers {', '.join(layers)}: {len(mismatches)} mismatched "
+          f"({', '.join(f'{name} {n}' for name, n in per_layer.items() if n) or 'all match'})")
+    return 1 if mismatches else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    gen = commands.add_parser('generate', help='write golden vectors')
+    gen.add_argument('images', nargs='+', help='image files or folders')
+    gen.add_argument('output')
+    gen.add_argument('--weights', default='model_info.bin', help='weight image or model_info.json')
+    gen.add_argument('--hex', action='store_true', help='also write textio .hex files')
+    gen.add_argument('--limit', type=int, default=None)
+    gen.set_defaults(run=cmd_generate)
+
+    cmp = commands.add_parser('compare', help='diff a testbench dump against golden vectors')
+    cmp.add_argument('expected')
+    cmp.add_argument('actual')
+    cmp.add_argument('--show', type=int, default=10, help='mismatching images to print')
+    cmp.set_defaults(run=cmd_compare)
+
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
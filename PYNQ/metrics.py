@@ -0,0 +1,210 @@
+"""
+Lightweight metrics and per-request stage tracing for the /upload server in
+lenetv5_accelerator.ipynb. The web app has its own copy
+(Application/metrics.py); keep the two in step.
+
+Counters, gauges and histograms are created on a ``MetricsRegistry`` and
+served in the Prometheus text format by ``render()`` from a /metrics route.
+A ``Trace`` follows one request: ``lap(stage)`` charges the time since the
+previous lap to ``stage``, both in the request's own ``timing`` dict and in
+a shared per-stage histogram. Its ID is the ``X-Request-ID`` the web app
+already sends with every upload, so a request can be followed from the web
+app to the board and back.
+
+With ``registry.enabled`` False an update costs one attribute test; only
+the per-request ``timing`` dict is still filled in.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_HEADER = 'X-Request-ID'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Seconds; covers a single 0.8 ms DPU run up to a slow plot
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, registry, name, help_text, labels=()):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.values = {}  # label values -> value (histograms: [bucket counts, sum, count])
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in sorted(items):
+            yield '', list(zip(self.label_names, key)), value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the block as in flight while it runs."""
+        if not self.registry.enabled:
+            yield
+            return
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help_text, labels=(), buckets=TIME_BUCKETS):
+        super().__init__(registry, name, help_text, labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        if not self.registry.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            items = [(key, (list(counts), total, n)) for key, (counts, total, n) in self.values.items()]
+        for key, (counts, total, n) in sorted(items):
+            pairs = list(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield '_bucket', pairs + [('le', _format_value(bound))], cumulative
+            yield '_sum', pairs, total
+            yield '_count', pairs, n
+
+
+class MetricsRegistry:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = {}
+
+    def _add(self, cls, name, *args, **kwargs):
+        if name not in self.metrics:
+            self.metrics[name] = cls(self, name, *args, **kwargs)
+        return self.metrics[name]
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=TIME_BUCKETS):
+        return self._add(Histogram, name, help_text, labels, buckets)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, pairs, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{_format_labels(pairs)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class Trace:
+    """
+    Stage timings of one request. ``timing`` always holds seconds per stage
+    (it is what /process_equation returns with report_timing); ``stages``
+    also receives every lap when metrics are enabled.
+    """
+
+    def __init__(self, stages, trace_id=None):
+        self.stages = stages
+        self.trace_id = trace_id
+        self.timing = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage, **parts):
+        """
+        Close ``stage`` at the current time. ``parts`` are sub-stages timed
+        elsewhere (the board's own inference time, say); they are carved out
+        of this lap and recorded under their own names.
+        """
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        for name, seconds in parts.items():
+            self.add(name, seconds)
+            elapsed -= seconds
+        self.add(stage, elapsed)
+
+    def add(self, stage, seconds):
+        self.timing[stage] = self.timing.get(stage, 0.0) + seconds
+        self.stages.observe(seconds, stage=stage)
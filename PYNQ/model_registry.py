@@ -0,0 +1,99 @@
+"""
+Resident weight images with hot-swap of the active model.
+
+Every registered model keeps its packed weight image (see weight_image.py)
+in its own CMA buffer, filled and flushed once. Switching models only
+re-runs the dma_init stream from that buffer; the overlay stays loaded.
+Models are keyed by a hash of their packed bytes, so registering the same
+checkpoint twice is a no-op and activating the model that is already
+loaded skips the re-init entirely.
+"""
+
+import hashlib
+import json
+import threading
+
+import numpy as np
+
+
+def model_hash(weights):
+    """Stable ID of a weight image: its streams plus the quantization metadata."""
+    digest = hashlib.sha256(weights.data.tobytes())
+    meta = [weights.input_scale, weights.input_zero_point, weights.label_mapping]
+    digest.update(json.dumps(meta, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class ModelEntry:
+    def __init__(self, model_id, name, weights, buffer):
+        self.model_id = model_id
+        self.name = name
+        self.weights = weights
+        self.buffer = buffer
+
+    def describe(self):
+        # The input quantization lets the web app requantize raw uploads after a switch
+        return {'id': self.model_id, 'name': self.name, 'bytes': int(self.weights.data.size),
+                'input_scale': self.weights.input_scale, 'input_zero_point': self.weights.input_zero_point}
+
+
+class ModelRegistry:
+    """
+    ``load(entry)`` performs the actual switch (MMIO start bit plus the init
+    transfers on the board, a new DPUEmulator in emulator mode). It always
+    runs while holding ``lock`` - the same lock every prediction takes - so
+    in-flight requests drain before the weights change under them.
+    """
+
+    def __init__(self, allocate, load, lock=None, max_models=8):
+        self.allocate = allocate
+        self.load = load
+        self.lock = lock or threading.Lock()
+        self.max_models = max_models
+        self.models = {}
+        self.active_id = None
+
+    @property
+    def active(self):
+        return self.models.get(self.active_id)
+
+    def register(self, weights, name=None):
+        """Make ``weights`` resident and return its model ID (existing ID if already registered)."""
+        model_id = model_hash(weights)
+        with self.lock:
+            if model_id in self.models:
+                return model_id
+            if len(self.models) >= self.max_models:
+                raise ValueError(f"registry full ({self.max_models} models), remove one first")
+
+            buffer = self.allocate(shape=(weights.data.size,), dtype=np.int8)
+            buffer[:] = weights.data
+            buffer.flush()
+            self.models[model_id] = ModelEntry(model_id, name or model_id, weights, buffer)
+            return model_id
+
+    def activate(self, model_id):
+        """Switch the DPU to ``model_id``. Returns False if it was already active."""
+        with self.lock:
+            # Checked under the lock, so a concurrent remove() cannot drop it before load()
+            if model_id not in self.models:
+                raise KeyError(model_id)
+            if model_id == self.active_id:
+                return False
+            self.load(self.models[model_id])
+            self.active_id = model_id
+            return True
+
+    def remove(self, model_id):
+        with self.lock:
+            # Checked under the lock, so two removes of the same model cannot both pass it
+            if model_id not in self.models:
+                raise KeyError(model_id)
+            if model_id == self.active_id:
+                raise ValueError("cannot remove the active model")
+            entry = self.models.pop(model_id)
+        entry.buffer.freebuffer()
+
+    def describe(self):
+        return [dict(entry.describe(), active=model_id == self.active_id)
+                for model_id, entry in self.models.items()]
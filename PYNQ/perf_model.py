@@ -0,0 +1,231 @@
+"""
+Cycle-approximate performance model of the DPU, for capacity planning.
+
+Every compute layer in RTL/Design runs the same step FSM (IDLE, FIRST_READ,
+then READ_COMPUTE / WAIT_READ_COMPUTE per step, LAST_COMPUTE, DONE): a step
+starts the BRAM reader for the next window and the channel units on the
+current one, and only advances once both have finished. A step therefore
+costs the slower of the two plus the handshake cycles, and the layer is
+"reader" or "compute" bound depending on which side that is. The model
+walks those FSMs with the same step counts and per-state cycle counts as
+the VHDL; it does not simulate data.
+
+    bram_reader_*     1 cycle to latch the first address, READ_CYCLES per
+                      address (counter 0..2), 1 cycle in DONE
+    relu_conv1/2      clkb domain; one MAC per cycle per kernel, then
+                      3 cycles of NORMALIZE_RELU
+    channel_layer_5/6 one MAC per step (IDLE, FC, DONE)
+    dma_predict       one byte per clka cycle on the input stream
+
+The result is calibrated against the times ``predict()`` prints on the board
+(seconds per glyph, DMA wait included): the difference to the modelled DPU
+time is reported as fixed host/DMA overhead and carried into the throughput
+estimate for other configurations.
+
+    python perf_model.py [--clka-mhz 100] [--clkb-mhz 50] [--conv1-pixels 2]
+                         [--kernel-macs 1] [--fc1-units 16] [--batch 1]
+                         [--measured 0.00077 0.00079 ...]
+"""
+
+import argparse
+import math
+import statistics
+
+from dpu_emulator import CONV1_OUT, CONV2_OUT, FC1_IN, FC1_OUT, FC2_OUT, IMAGE_SIZE, KERNEL
+from weight_image import LAYERS
+
+READ_CYCLES = 3     # bram_reader READ state: two wait cycles, capture on the third
+STEP_OVERHEAD = 3   # READ_COMPUTE, finish latch, latch compare in WAIT_READ_COMPUTE
+NORMALIZE = 3       # NORMALIZE_RELU: scale multiply, shift, clamp
+TOP_STATES = 9      # IDLE, WAIT_INPUT_READ, LAYER_1..6_PROC, SEND in top.vhd
+CONV1_SIZE = 28     # layer_1 output rows / cols (padding 2)
+POOL1_SIZE = 14
+CONV2_SIZE = 10     # layer_3 row / col 2..11
+POOL2_SIZE = 5
+CONV1_PORTS = 2     # pixels read per address slot (BRAM ports a and b)
+
+
+class DPUConfig:
+    """
+    Clocks and datapath widths. The defaults are the shipped design: clka
+    100 MHz, compute units on the 50 MHz clkb, two conv1 output pixels per
+    step, conv2 summing two input channels per pass and 16 FC1 neurons in
+    parallel. ``kernel_macs`` is the number of MACs each conv kernel unit
+    retires per clkb cycle.
+    """
+
+    def __init__(self, clka_mhz=100.0, clkb_mhz=50.0, conv1_pixels=2, conv2_channels=2,
+                 kernel_macs=1, fc1_units=16, read_cycles=READ_CYCLES):
+        self.clka_mhz = clka_mhz
+        self.clkb_mhz = clkb_mhz
+        self.conv1_pixels = conv1_pixels
+        self.conv2_channels = conv2_channels
+        self.kernel_macs = kernel_macs
+        self.fc1_units = fc1_units
+        self.read_cycles = read_cycles
+
+    def clkb(self, cycles):
+        """clkb cycles in clka cycles, plus the wait for the first clkb edge."""
+        ratio = self.clka_mhz / self.clkb_mhz
+        return math.ceil(cycles * ratio) + math.ceil(ratio) - 1
+
+    def reader(self, slots):
+        return 1 + slots * self.read_cycles + 1
+
+    def mac_cycles(self, macs):
+        return math.ceil(macs / self.kernel_macs)
+
+
+def step_layer(name, steps, reader, compute, fixed=0, last_compute=None):
+    """
+    One layer of the step FSM: FIRST_READ, ``steps`` overlapped
+    read/compute steps and the LAST_COMPUTE drain. ``compute`` may be a
+    list with one entry per step kind when steps differ (conv2 passes).
+    """
+    computes = compute if isinstance(compute, list) else [compute]
+    per_step = [STEP_OVERHEAD + max(reader, c) for c in computes]
+    cycles = steps // len(computes) * sum(per_step)
+    cycles += 2 + reader + (last_compute or computes[-1]) + fixed
+    return {
+        'layer': name,
+        'steps': steps,
+        'step_cycles': sum(per_step) / len(per_step),
+        'reader': reader,
+        'compute': max(computes),
+        'cycles': cycles,
+        'bound': 'reader' if reader >= max(computes) else 'compute',
+    }
+
+
+def conv1(cfg):
+    slots = KERNEL * KERNEL * math.ceil(cfg.conv1_pixels / CONV1_PORTS)
+    # relu_conv1: PREPROCESS, 25 MACs, bias, NORMALIZE_RELU, DONE
+    kernel = 1 + cfg.mac_cycles(KERNEL * KERNEL) + 1 + NORMALIZE + 1
+    # channel_layer_1: IDLE, finish latch, one write cycle per output pixel, DONE
+    compute = 1 + cfg.clkb(kernel) + 1 + cfg.conv1_pixels + 1
+    steps = math.ceil(CONV1_SIZE * CONV1_SIZE / cfg.conv1_pixels)
+    return step_layer('conv1', steps, cfg.reader(slots), compute)
+
+
+def pool(name, size, cfg):
+    # channel_max_pooling: IDLE, MAXPOOL, DONE
+    return step_layer(name, size * size, cfg.reader(4), 3)
+
+
+def conv2(cfg):
+    slots = math.ceil(KERNEL * KERNEL / 2) * math.ceil(cfg.conv2_channels / 2)
+    passes = math.ceil(CONV1_OUT / cfg.conv2_channels)
+    # relu_conv2: IDLE, 25 MACs per input channel, NORMALIZE_RELU on the last pass
+    kernel = 1 + cfg.mac_cycles(KERNEL * KERNEL) + 1
+    compute = [1 + cfg.clkb(kernel) + 1] * (passes - 1)
+    compute.append(1 + cfg.clkb(kernel + NORMALIZE) + 1)
+    return step_layer('conv2', CONV2_SIZE * CONV2_SIZE * passes, cfg.reader(slots), compute)
+
+
+def fc1(cfg):
+    batches = math.ceil(FC1_OUT / cfg.fc1_units)
+    layer = step_layer('fc1', FC1_IN, cfg.reader(1), 3, last_compute=3 + NORMALIZE)
+    # layer_5 restarts from IDLE for each batch of units, then writes 8 words
+    layer['steps'] *= batches
+    layer['cycles'] = layer['cycles'] * batches + batches + 9
+    return layer
+
+
+def fc2(cfg):
+    # One step per fc1 output, then the argmax over the 15 outputs in POST_PROCESS
+    return step_layer('fc2', FC1_OUT, cfg.reader(1), 3,
+                      fixed=FC2_OUT + 1, last_compute=3 + NORMALIZE)
+
+
+def dma_stage(name, nbytes):
+    """AXI stream stage: IDLE, one byte per cycle, LAST_WRITE / DONE."""
+    return {'layer': name, 'steps': nbytes, 'step_cycles': 1, 'reader': nbytes,
+            'compute': 0, 'cycles': nbytes + 3, 'bound': 'stream'}
+
+
+def estimate(cfg):
+    """Per-stage cycle estimates (clka) for one glyph, in pipeline order."""
+    return [
+        dma_stage('dma in', IMAGE_SIZE),
+        conv1(cfg),
+        pool('pool1', POOL1_SIZE, cfg),
+        conv2(cfg),
+        pool('pool2', POOL2_SIZE, cfg),
+        fc1(cfg),
+        fc2(cfg),
+        dma_stage('dma out', 1),
+        {'layer': 'control', 'steps': TOP_STATES, 'step_cycles': 1, 'reader': 0,
+         'compute': 0, 'cycles': TOP_STATES, 'bound': 'fsm'},
+    ]
+
+
+def init_cycles(cfg):
+    """dma_init: one byte per cycle for each of the five weight streams."""
+    sizes = [CONV1_OUT * (KERNEL * KERNEL + 4),
+             CONV2_OUT * (CONV1_OUT * KERNEL * KERNEL + 4),
+             FC1_OUT * (FC1_IN + 4),
+             FC2_OUT * (FC1_OUT + 4),
+             4 * len(LAYERS) + 2]
+    return sum(size + 3 for size in sizes)
+
+
+def calibrate(model_cycles, cfg, measured):
+    """
+    Host/DMA overhead per ``predict()`` call in seconds: the median of the
+    measured times minus the modelled DPU time, floored at zero.
+    """
+    if not measured:
+        return 0.0
+    return max(0.0, statistics.median(measured) - model_cycles / (cfg.clka_mhz * 1e6))
+
+
+def print_report(stages, cfg, overhead=0.0, batch=1):
+    total = sum(stage['cycles'] for stage in stages)
+    us_per_cycle = 1.0 / cfg.clka_mhz
+
+    print(f"{'stage':>8} | {'steps':>6} | {'cyc/step':>8} | {'reader':>6} | {'compute':>7} | "
+          f"{'cycles':>7} | {'us':>8} | {'share':>6} | bound")
+    for stage in stages:
+        print(f"{stage['layer']:>8} | {stage['steps']:6d} | {stage['step_cycles']:8.1f} | "
+              f"{stage['reader']:6d} | {stage['compute']:7d} | {stage['cycles']:7d} | "
+              f"{stage['cycles'] * us_per_cycle:8.2f} | {stage['cycles'] / total:6.1%} | {stage['bound']}")
+    print(f"{'total':>8} | {'':>6} | {'':>8} | {'':>6} | {'':>7} | {total:7d} | "
+          f"{total * us_per_cycle:8.2f} |")
+
+    bottleneck = max(stages, key=lambda stage: stage['cycles'])
+    print(f"\nBottleneck: {bottleneck['layer']} ({bottleneck['bound']} bound, "
+          f"{bottleneck['cycles'] / total:.0%} of the glyph)")
+
+    dpu_seconds = total / (cfg.clka_mhz * 1e6)
+    per_glyph = dpu_seconds + overhead / batch
+    print(f"DPU only: {dpu_seconds * 1e3:.3f} ms/glyph, {1 / dpu_seconds:.0f} glyphs/s")
+    if overhead:
+        print(f"Host/DMA overhead (calibrated): {overhead * 1e3:.3f} ms per transfer")
+        print(f"Batch of {batch}: {per_glyph * 1e3:.3f} ms/glyph, {1 / per_glyph:.0f} glyphs/s")
+    print(f"Weight init: {init_cycles(cfg)} cycles ({init_cycles(cfg) * us_per_cycle:.1f} us)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clka-mhz', type=float, default=100.0, help='AXI / control clock')
+    parser.add_argument('--clkb-mhz', type=float, default=50.0, help='conv kernel clock (clk_wiz_0)')
+    parser.add_argument('--conv1-pixels', type=int, default=2, help='conv1 output pixels per step')
+    parser.add_argument('--conv2-channels', type=int, default=2, help='conv2 input channels per pass')
+    parser.add_argument('--kernel-macs', type=int, default=1, help='MACs per clkb cycle per conv kernel')
+    parser.add_argument('--fc1-units', type=int, default=16, help='parallel fc1 neurons')
+    parser.add_argument('--read-cycles', type=int, default=READ_CYCLES, help='clka cycles per BRAM read')
+    parser.add_argument('--batch', type=int, default=1, help='glyphs per DMA transfer')
+    parser.add_argument('--measured', type=float, nargs='*', default=[],
+                        help='seconds per glyph as printed by predict() on the board (calibration)')
+    args = parser.parse_args()
+
+    cfg = DPUConfig(args.clka_mhz, args.clkb_mhz, args.conv1_pixels, args.conv2_channels,
+                    args.kernel_macs, args.fc1_units, args.read_cycles)
+    # Calibrate on the shipped design: the board measurements were taken with it
+    reference = sum(stage['cycles'] for stage in estimate(DPUConfig(read_cycles=args.read_cycles)))
+    overhead = calibrate(reference, DPUConfig(), args.measured)
+    print_report(estimate(cfg), cfg, overhead, args.batch)
+
+
+if __name__ == '__main__':
+    main()
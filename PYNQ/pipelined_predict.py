@@ -0,0 +1,100 @@
+"""
+Double-buffered glyph pipeline: overlap ``transform()`` on the ARM core with
+the DPU run of the previous glyph.
+
+The DMA holds one image in flight (one send/recv pair per glyph, so any
+dpu.bit build works). While it runs, the producer side fills the spare input
+buffers with the next transformed and flushed glyphs; the consumer side polls
+``idle`` and starts the next transfer as soon as the channel frees up.
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+
+IMAGE_SIZE = 784
+
+
+class PipelinedPredictor:
+    """
+    ``depth`` input buffers rotate between "prepared" and "in flight".
+    ``predict_sequence`` returns class indices in input order and leaves the
+    per-stage time split of the last call in ``timing``.
+    """
+
+    def __init__(self, dma, allocate, transform, depth=2):
+        if depth < 2:
+            raise ValueError("depth must be at least 2 for double buffering")
+        self.dma = dma
+        self.transform = transform
+        self.input_buffers = [allocate(shape=(IMAGE_SIZE,), dtype=np.uint8) for _ in range(depth)]
+        self.output_buffer = allocate(shape=(1,), dtype=np.uint8)
+        self.timing = {}
+
+    def _idle(self):
+        return self.dma.sendchannel.idle and self.dma.recvchannel.idle
+
+    def _finish(self):
+        self.dma.sendchannel.wait()
+        self.dma.recvchannel.wait()
+        self.output_buffer.invalidate()
+        return self.output_buffer[0]
+
+    def predict_sequence(self, images):
+        n = len(images)
+        predictions = np.empty(n, dtype=np.uint8)
+        free = deque(range(len(self.input_buffers)))
+        ready = deque()  # (buffer index, glyph index) waiting for the DMA
+        in_flight = None
+        next_glyph = 0
+        done = 0
+        timing = {'transform': 0.0, 'flush': 0.0, 'dma_wait': 0.0, 'total': 0.0}
+
+        start_total = time.perf_counter()
+        while done < n:
+            # Consumer: launch the oldest prepared glyph as soon as the DMA is free
+            if in_flight is None and ready:
+                buf, glyph = ready.popleft()
+                self.dma.sendchannel.transfer(self.input_buffers[buf])
+                self.dma.recvchannel.transfer(self.output_buffer)
+                in_flight = (buf, glyph)
+
+            elif in_flight is not None and self._idle():
+                buf, glyph = in_flight
+                predictions[glyph] = self._finish()
+                free.append(buf)
+                in_flight = None
+                done += 1
+
+            # Producer: prepare the next glyph while the current one runs
+            elif next_glyph < n and free:
+                buf = free.popleft()
+                t0 = time.perf_counter()
+                self.input_buffers[buf][:] = self.transform(images[next_glyph])
+                t1 = time.perf_counter()
+                self.input_buffers[buf].flush()
+                t2 = time.perf_counter()
+                timing['transform'] += t1 - t0
+                timing['flush'] += t2 - t1
+                ready.append((buf, next_glyph))
+                next_glyph += 1
+
+            # Nothing left to overlap: block on the in-flight glyph
+            else:
+                t0 = time.perf_counter()
+                buf, glyph = in_flight
+                predictions[glyph] = self._finish()
+                timing['dma_wait'] += time.perf_counter() - t0
+                free.append(buf)
+                in_flight = None
+                done += 1
+
+        timing['total'] = time.perf_counter() - start_total
+        self.timing = timing
+        return predictions
+
+    def close(self):
+        for buf in self.input_buffers:
+            buf.freebuffer()
+        self.output_buffer.freebuffer()
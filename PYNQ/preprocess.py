@@ -0,0 +1,100 @@
+"""
+Glyph preprocessing bit-exact with the notebook's ``transform()``, with its
+float quantization replaced by a lookup table.
+
+``transform()`` resizes with PIL's BILINEAR filter and then maps every
+pixel through float32 math: ``/ 255``, ``(x - 0.5) / 0.5``, ``/ scale``,
+``+ zero_point``, round and clip. After the resize that map depends only
+on the pixel value, so ``quant_table()`` evaluates it once for all 256
+values. Quantizing is then one table lookup per pixel, with no float work
+on the Cortex-A9.
+
+The resize itself stays PIL's (``resize_glyphs()``): Pillow's C resampler
+is faster than any numpy version of it. The web app already sends 28 x 28
+glyphs, which skip the resize.
+
+``InputQuantizer`` combines the two for the active model and can write
+straight into a DMA input buffer (``out``). check_preprocess.py compares it
+with ``transform()`` over Samples/ and the web app's data/ corpus.
+"""
+
+import functools
+
+import numpy as np
+from PIL import Image
+
+IMAGE_SIDE = 28
+IMAGE_SIZE = IMAGE_SIDE * IMAGE_SIDE
+
+
+@functools.lru_cache(maxsize=8)
+def quant_table(scale, zero_point):
+    """
+    uint8 -> quantized input byte, for every pixel value, with the exact
+    float32 operations of ``transform()``.
+    """
+    img_array = np.arange(256, dtype=np.float32) / 255.0
+    img_normalized = (img_array - 0.5) / 0.5
+    table = np.clip(np.round(img_normalized / scale + zero_point), 0, 255).astype(np.uint8)
+    table.flags.writeable = False  # shared between callers through the cache
+    return table
+
+
+def resize_glyphs(glyphs, size=IMAGE_SIDE):
+    """
+    N x size x size uint8 from an N x H x W uint8 array or a list of 2-D
+    uint8 arrays of any sizes. Glyphs of another size go through PIL's
+    ``Image.resize((size, size), Image.BILINEAR)``, as in ``transform()``.
+    """
+    if isinstance(glyphs, np.ndarray) and glyphs.shape[1:] == (size, size):
+        return glyphs.astype(np.uint8, copy=False)
+    out = np.empty((len(glyphs), size, size), dtype=np.uint8)
+    for n, glyph in enumerate(glyphs):
+        glyph = np.asarray(glyph, dtype=np.uint8)
+        if glyph.shape != (size, size):
+            glyph = np.asarray(Image.fromarray(glyph).resize((size, size), Image.BILINEAR))
+        out[n] = glyph
+    return out
+
+
+def glyph_arrays(images):
+    """
+    PIL images -> list of 28 x 28 uint8 arrays, converted to grayscale and
+    resized as ``transform()`` does.
+    """
+    arrays = []
+    for image in images:
+        if image.mode != "L":
+            image = image.convert("L")
+        if image.size != (IMAGE_SIDE, IMAGE_SIDE):
+            image = image.resize((IMAGE_SIDE, IMAGE_SIDE), Image.BILINEAR)
+        # tobytes() is cheaper than np.asarray()'s array interface for small images
+        arrays.append(np.frombuffer(image.tobytes(), dtype=np.uint8).reshape(image.height, image.width))
+    return arrays
+
+
+class InputQuantizer:
+    """
+    The DPU input for a batch of glyphs: BILINEAR resize to 28 x 28 and the
+    lookup table of one model's input quantization.
+    """
+
+    def __init__(self, scale, zero_point):
+        self.scale = scale
+        self.zero_point = zero_point
+        self.table = quant_table(scale, zero_point)
+
+    def __call__(self, glyphs, out=None):
+        """
+        N x 784 quantized bytes for N glyphs (PIL images, or arrays as
+        ``resize_glyphs`` takes them). ``out``, for example a slice of the
+        DMA input buffer, receives them in place and is returned.
+        """
+        if not isinstance(glyphs, np.ndarray) and len(glyphs) and hasattr(glyphs[0], "convert"):
+            glyphs = glyph_arrays(glyphs)
+        resized = resize_glyphs(glyphs)
+        if out is None:
+            out = np.empty((len(resized), IMAGE_SIZE), dtype=np.uint8)
+        # Indices are uint8, always in range: 'clip' skips the bounds check and the buffered copy
+        np.take(self.table, resized.reshape(len(resized), IMAGE_SIZE), out=out, mode='clip')
+        return out
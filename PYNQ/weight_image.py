@@ -0,0 +1,172 @@
+"""
+Precompiled DPU weight image (``model_info.bin``).
+
+The image holds the five init streams that ``dma_init`` consumes, already in
+DMA byte order (CONV_1, CONV_2, FC_1, FC_2, SCALES_ZERO_POINT), so bring-up
+is one file read, one buffer copy and five back-to-back transfers instead
+of parsing ``model_info.json`` element by element.
+
+File layout (little-endian header, then metadata, then payload)::
+
+    magic "DPUW" | version u16 | section count u16 | metadata bytes u32 |
+    section bytes u32 x 5 | crc32(metadata + payload) u32
+    metadata: UTF-8 JSON with quant scale / zero point and label mapping
+    payload:  int8 streams, back to back
+
+Build it offline from ``load_model_info()`` output (Model/JsonCreator.ipynb)
+or from an existing JSON::
+
+    python weight_image.py model_info.json model_info.bin
+"""
+
+import json
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+MAGIC = b"DPUW"
+VERSION = 1
+LAYERS = ('conv1', 'conv2', 'fc1', 'fc2')
+SECTIONS = ('CONV_1', 'CONV_2', 'FC_1', 'FC_2', 'SCALES_ZERO_POINT')
+HEADER = struct.Struct(f"<4sHHI{len(SECTIONS)}II")
+# Stream bytes of the LeNet-5 the bitstream implements: one row per output
+# channel of kernel / weights plus 4 bias bytes; 4 scale words and 2 zero points
+SECTION_BYTES = (6 * (25 + 4), 16 * (150 + 4), 64 * (400 + 4), 15 * (64 + 4), 4 * 4 + 2)
+METADATA_KEYS = ('input_scale', 'input_zero_point', 'label_mapping')
+
+
+def bias_bytes(values):
+    """32-bit words as 4 signed bytes each, MSB first (what dma_init reassembles)."""
+    words = np.asarray(values, dtype=np.int64) & 0xFFFFFFFF
+    return words.astype('>u4').view(np.int8).reshape(-1, 4)
+
+
+def pack_layer(weights, biases):
+    """One row per output channel: its flattened kernel / weight vector, then the bias bytes."""
+    w = np.asarray(weights, dtype=np.int64)
+    rows = w.reshape(w.shape[0], -1).astype(np.int8)
+    return np.hstack([rows, bias_bytes(biases)]).reshape(-1)
+
+
+def pack_model_info(model_info):
+    """
+    Build the five init streams from a ``load_model_info()`` dict. Returns
+    the same int8 arrays, in the same order, as the lists ``init()`` sends.
+    """
+    streams = [pack_layer(model_info[layer]['weights'], model_info[layer]['biases']) for layer in LAYERS]
+
+    scales = bias_bytes([model_info['Final_Scales'][layer] for layer in LAYERS]).reshape(-1)
+    # The output zero point may exceed 127; it wraps like the DMA byte
+    zero_points = np.array([model_info['quant']['zero_point'],
+                            model_info['fc2']['layer_zero_point']]).astype(np.int8)
+    streams.append(np.concatenate([scales, zero_points]))
+    return streams
+
+
+def model_metadata(model_info):
+    return {
+        'input_scale': model_info['quant']['scale'],
+        'input_zero_point': model_info['quant']['zero_point'],
+        'label_mapping': model_info['label_mapping'],
+    }
+
+
+def write_weight_image(path, model_info):
+    """Pack ``model_info`` and write it as a versioned, checksummed image."""
+    streams = pack_model_info(model_info)
+    meta = json.dumps(model_metadata(model_info), separators=(',', ':')).encode('utf-8')
+    payload = np.concatenate(streams).tobytes()
+    header = HEADER.pack(MAGIC, VERSION, len(streams), len(meta),
+                         *(s.size for s in streams), zlib.crc32(payload, zlib.crc32(meta)))
+    with open(path, 'wb') as f:
+        f.write(header + meta + payload)
+    return len(header) + len(meta) + len(payload)
+
+
+def check_layout(sizes, metadata, path="weight image"):
+    """
+    ValueError unless the streams fit the DPU's fixed architecture and the
+    metadata has what the notebook reads from it.
+    """
+    if tuple(sizes) != SECTION_BYTES:
+        raise ValueError(f"{path}: section sizes {list(sizes)} do not match the DPU ({list(SECTION_BYTES)})")
+    if not isinstance(metadata, dict):
+        raise ValueError(f"{path}: metadata is not a JSON object")
+    missing = [key for key in METADATA_KEYS if key not in metadata]
+    if missing:
+        raise ValueError(f"{path}: metadata lacks {', '.join(missing)}")
+    scale, zero_point = metadata['input_scale'], metadata['input_zero_point']
+    if isinstance(scale, bool) or not isinstance(scale, (int, float)) or not scale > 0:
+        raise ValueError(f"{path}: bad input_scale {scale!r}")
+    if isinstance(zero_point, bool) or not isinstance(zero_point, int) or not 0 <= zero_point <= 255:
+        raise ValueError(f"{path}: bad input_zero_point {zero_point!r}")
+    if not isinstance(metadata['label_mapping'], dict):
+        raise ValueError(f"{path}: label_mapping is not a JSON object")
+
+
+class WeightImage:
+    """
+    A loaded image. ``data`` is the whole payload (one int8 array, ready to
+    copy into a single DMA buffer), ``sections`` the (offset, nbytes) of each
+    init stream inside it and ``lists`` the matching views.
+    """
+
+    def __init__(self, data, sizes, metadata):
+        self.data = data
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).tolist()
+        self.sections = list(zip(offsets, sizes))
+        self.lists = [data[start:start + nbytes] for start, nbytes in self.sections]
+        self.input_scale = metadata['input_scale']
+        self.input_zero_point = metadata['input_zero_point']
+        self.label_mapping = metadata['label_mapping']
+
+    @classmethod
+    def from_model_info(cls, model_info):
+        """Pack in memory, for boards that only have model_info.json."""
+        streams = pack_model_info(model_info)
+        sizes, metadata = [s.size for s in streams], model_metadata(model_info)
+        check_layout(sizes, metadata, "model_info")
+        return cls(np.concatenate(streams), sizes, metadata)
+
+
+def read_weight_image(path):
+    """Load and validate a weight image; raises ValueError if it is not usable."""
+    return parse_weight_image(np.fromfile(path, dtype=np.uint8), path)
+
+
+def parse_weight_image(raw, path="weight image"):
+    """Validate an image already in memory (uint8 array or bytes)."""
+    raw = np.frombuffer(raw, dtype=np.uint8)
+    if raw.size < HEADER.size:
+        raise ValueError(f"{path}: truncated weight image")
+
+    magic, version, count, meta_len, *fields = HEADER.unpack_from(raw)
+    sizes, checksum = fields[:-1], fields[-1]
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a DPU weight image")
+    if version != VERSION or count != len(SECTIONS):
+        raise ValueError(f"{path}: unsupported weight image version {version} ({count} sections)")
+
+    body = raw[HEADER.size:]
+    if body.size != meta_len + sum(sizes):
+        raise ValueError(f"{path}: expected {meta_len + sum(sizes)} bytes after the header, found {body.size}")
+    if zlib.crc32(body) != checksum:
+        raise ValueError(f"{path}: checksum mismatch")
+
+    try:
+        metadata = json.loads(body[:meta_len].tobytes().decode('utf-8'))
+    except ValueError as e:  # JSONDecodeError and UnicodeDecodeError
+        raise ValueError(f"{path}: unreadable metadata ({e})") from None
+    check_layout(sizes, metadata, path)
+    return WeightImage(body[meta_len:].view(np.int8), sizes, metadata)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: python weight_image.py model_info.json model_info.bin")
+    with open(sys.argv[1], 'r') as f:
+        info = json.load(f)
+    size = write_weight_image(sys.argv[2], info)
+    print(f"Wrote {sys.argv[2]} ({size} bytes)")
@@ -0,0 +1,330 @@
+-- Behavioural models of the Vivado IP that top.vhd instantiates, so the design
+-- simulates without the Xilinx libraries (GHDL, see run_cosim.py).
+--
+-- The .xci files are not in the repository, and PYNQ/dpu.hwh lists top as one
+-- module reference without the IP inside it. The port lists follow the component
+-- declarations in top.vhd and memory_controller.vhd. Against what dpu.hwh does show:
+--   clk_wiz_0      clk_out_50 = clk_in1 / 2. clk_in1 is top's clk, which dpu.hwh
+--                  gives as FCLK_CLK0 at 100 MHz; the 50 MHz is the port name's,
+--                  phase alignment and LOCK_CYCLES are assumed
+--   blk_mem_gen_*  8-bit words, 2^ADDR_WIDTH deep, zero-initialised. READ_LATENCY
+--                  and the write mode are not recorded anywhere in the tree and
+--                  do not change the results: every bram_reader_* sets the address
+--                  and captures the data two clka edges later, which suits a
+--                  latency of 1 or 2, and a port that is read is never written in
+--                  the same phase (top muxes addra per phase and the idle writer
+--                  holds wea low), so write-first and read-first give the same
+--                  douta. The models use 2 and write-first
+-- memory_controller clocks both ports of every memory with clka, so the models
+-- run both ports on clka.
+
+library IEEE;
+use IEEE.STD_LOGIC_1164.ALL;
+use IEEE.NUMERIC_STD.ALL;
+
+entity clk_wiz_0 is
+    Generic (
+        LOCK_CYCLES : positive := 64 -- clk_in1 cycles from reset release to locked
+    );
+    Port (
+        clk_in1    : in  std_logic;
+        resetn     : in  std_logic;
+        clk_out_50 : out std_logic;
+        locked     : out std_logic
+    );
+end clk_wiz_0;
+
+architecture Behavioral of clk_wiz_0 is
+
+    signal clk_out : std_logic := '0';
+
+begin
+
+    clk_out_50 <= clk_out;
+
+    -- Rising edges of clk_out_50 follow every other rising edge of clk_in1 by a
+    -- delta cycle, as the MMCM model's follow it by its insertion delay
+    process(clk_in1)
+    begin
+        if rising_edge(clk_in1) then
+            clk_out <= not clk_out;
+        end if;
+    end process;
+
+    process(clk_in1, resetn)
+        variable counter : integer range 0 to LOCK_CYCLES := 0;
+    begin
+        if resetn = '0' then
+            counter := 0;
+            locked  <= '0';
+        elsif rising_edge(clk_in1) then
+            if counter = LOCK_CYCLES then
+                locked <= '1';
+            else
+                counter := counter + 1;
+            end if;
+        end if;
+    end process;
+end Behavioral;
+
+library IEEE;
+use IEEE.STD_LOGIC_1164.ALL;
+use IEEE.NUMERIC_STD.ALL;
+
+-- True dual-port block RAM; the simple dual-port memories tie off port B's
+-- write side and leave douta open
+entity sim_bram is
+    Generic (
+        ADDR_WIDTH   : positive;
+        READ_LATENCY : positive := 2
+    );
+    Port (
+        clka  : in  std_logic;
+        wea   : in  std_logic_vector(0 downto 0);
+        addra : in  std_logic_vector(ADDR_WIDTH - 1 downto 0);
+        dina  : in  std_logic_vector(7 downto 0);
+        douta : out std_logic_vector(7 downto 0);
+        web   : in  std_logic_vector(0 downto 0);
+        addrb : in  std_logic_vector(ADDR_WIDTH - 1 downto 0);
+        dinb  : in  std_logic_vector(7 downto 0);
+        doutb : out std_logic_vector(7 downto 0)
+    );
+end sim_bram;
+
+architecture Behavioral of sim_bram is
+
+    type ram_type is array (0 to 2 ** ADDR_WIDTH - 1) of std_logic_vector(7 downto 0);
+    type pipe_type is array (1 to READ_LATENCY) of std_logic_vector(7 downto 0);
+
+    signal ram    : ram_type  := (others => (others => '0'));
+    signal a_pipe : pipe_type := (others => (others => '0'));
+    signal b_pipe : pipe_type := (others => (others => '0'));
+
+begin
+
+    douta <= a_pipe(READ_LATENCY);
+    doutb <= b_pipe(READ_LATENCY);
+
+    process(clka)
+        variable a_word : std_logic_vector(7 downto 0);
+        variable b_word : std_logic_vector(7 downto 0);
+    begin
+        if rising_edge(clka) then
+            -- Undriven addresses read word 0, as to_integer maps metavalues to 0
+            a_word := ram(to_integer(unsigned(addra)));
+            b_word := ram(to_integer(unsigned(addrb)));
+            if wea = "1" then
+                ram(to_integer(unsigned(addra))) <= dina;
+                a_word := dina;
+            end if;
+            if web = "1" then
+                ram(to_integer(unsigned(addrb))) <= dinb;
+                b_word := dinb;
+            end if;
+
+            a_pipe(1) <= a_word;
+            b_pipe(1) <= b_word;
+            for i in 2 to READ_LATENCY loop
+                a_pipe(i) <= a_pipe(i - 1);
+                b_pipe(i) <= b_pipe(i - 1);
+            end loop;
+        end if;
+    end process;
+end Behavioral;
+
+-- True dual-port memories
+
+library IEEE;
+use IEEE.STD_LOGIC_1164.ALL;
+
+entity blk_mem_gen_3 is -- origin image, 784 bytes
+    Port (
+        clka  : in  std_logic;
+        wea   : in  std_logic_vector(0 downto 0);
+        addra : in  std_logic_vector(9 downto 0);
+        dina  : in  std_logic_vector(7 downto 0);
+        douta : out std_logic_vector(7 downto 0);
+        clkb  : in  std_logic;
+        web   : in  std_logic_vector(0 downto 0);
+        addrb : in  std_logic_vector(9 downto 0);
+        dinb  : in  std_logic_vector(7 downto 0);
+        doutb : out std_logic_vector(7 downto 0)
+    );
+end blk_mem_gen_3;
+
+architecture Behavioral of blk_mem_gen_3 is
+begin
+    ram : entity work.sim_bram
+        generic map (ADDR_WIDTH => 10)
+        port map (clka => clka, wea => wea, addra => addra, dina => dina, douta => douta,
+                  web => web, addrb => addrb, dinb => dinb, doutb => doutb);
+end Behavioral;
+
+library IEEE;
+use IEEE.STD_LOGIC_1164.ALL;
+
+entity blk_mem_gen_4 is
+    Port (
+        clka  : in  std_logic;
+        wea   : in  std_logic_vector(0 downto 0);
+        addra : in  std_logic_vector(7 downto 0);
+        dina  : in  std_logic_vector(7 downto 0);
+        douta : out std_logic_vector(7 downto 0);
+        clkb  : in  std_logic;
+        web   : in  std_logic_vector(0 downto 0);
+        addrb : in  std_logic_vector(7 downto 0);
+        dinb  : in  std_logic_vector(7 downto 0);
+        doutb : out std_logic_vector(7 downto 0)
+    );
+end blk_mem_gen_4;
+
+architecture Behavioral of blk_mem_gen_4 is
+begin
+    ram : entity work.sim_bram
+        generic map (ADDR_WIDTH => 8)
+        port map (clka => clka, wea => wea, addra => addra, dina => dina, douta => douta,
+                  web => web, addrb => addrb, dinb => dinb, doutb => doutb);
+end Behavioral;
+
+library IEEE;
+use IEEE.STD_LOGIC_1164.ALL;
+
+entity blk_mem_gen_2 is
+    Port (
+        clka  : in  std_logic;
+        wea   : in  std_logic_vector(0 downto 0);
+        addra : in  std_logic_vector(4 downto 0);
+        dina  : in  std_logic_vector(7 downto 0);
+        douta : out std_logic_vector(7 downto 0);
+        clkb  : in  std_logic;
+        web   : in  std_logic_vector(0 downto 0);
+        addrb : in  std_logic_vector(4 downto 0);
+        dinb  : in  std_logic_vector(7 downto 0);
+        doutb : out std_logic_vector(7 downto 0)
+    );
+end blk_mem_gen_2;
+
+architecture Behavioral of blk_mem_gen_2 is
+begin
+    ram : entity work.sim_bram
+        generic map (ADDR_WIDTH => 5)
+        port map (clka => clka, wea => wea, addra => addra, dina => dina, douta => douta,
+                  web => web, addrb => addrb, dinb => dinb, doutb => doutb);
+end Behavioral;
+
+-- Simple dual-port memories: write on port A, read on port B
+
+library IEEE;
+use IEEE.STD_LOGIC_1164.ALL;
+
+entity blk_mem_gen_13 is
+    Port (
+        clka  : in  std_logic;
+        wea   : in  std_logic_vector(0 downto 0);
+        addra : in  std_logic_vector(6 downto 0);
+        dina  : in  std_logic_vector(7 downto 0);
+        clkb  : in  std_logic;
+        addrb : in  std_logic_vector(6 downto 0);
+        doutb : out std_logic_vector(7 downto 0)
+    );
+end blk_mem_gen_13;
+
+architecture Behavioral of blk_mem_gen_13 is
+begin
+    ram : entity work.sim_bram
+        generic map (ADDR_WIDTH => 7)
+        port map (clka => clka, wea => wea, addra => addra, dina => dina, douta => open,
+                  web => "0", addrb => addrb, dinb => (others => '0'), doutb => doutb);
+end Behavioral;
+
+library IEEE;
+use IEEE.STD_LOGIC_1164.ALL;
+
+entity blk_mem_gen_14 is
+    Port (
+        clka  : in  std_logic;
+        wea   : in  std_logic_vector(0 downto 0);
+        addra : in  std_logic_vector(4 downto 0);
+        dina  : in  std_logic_vector(7 downto 0);
+        clkb  : in  std_logic;
+        addrb : in  std_logic_vector(4 downto 0);
+        doutb : out std_logic_vector(7 downto 0)
+    );
+end blk_mem_gen_14;
+
+architecture Behavioral of blk_mem_gen_14 is
+begin
+    ram : entity work.sim_bram
+        generic map (ADDR_WIDTH => 5)
+        port map (clka => clka, wea => wea, addra => addra, dina => dina, douta => open,
+                  web => "0", addrb => addrb, dinb => (others => '0'), doutb => doutb);
+end Behavioral;
+
+library IEEE;
+use IEEE.STD_LOGIC_1164.ALL;
+
+entity blk_mem_gen_1 is
+    Port (
+        clka  : in  std_logic;
+        wea   : in  std_logic_vector(0 downto 0);
+        addra : in  std_logic_vector(8 downto 0);
+        dina  : in  std_logic_vector(7 downto 0);
+        clkb  : in  std_logic;
+        addrb : in  std_logic_vector(8 downto 0);
+        doutb : out std_logic_vector(7 downto 0)
+    );
+end blk_mem_gen_1;
+
+architecture Behavioral of blk_mem_gen_1 is
+begin
+    ram : entity work.sim_bram
+        generic map (ADDR_WIDTH => 9)
+        port map (clka => clka, wea => wea, addra => addra, dina => dina, douta => open,
+                  web => "0", addrb => addrb, dinb => (others => '0'), doutb => doutb);
+end Behavioral;
+
+library IEEE;
+use IEEE.STD_LOGIC_1164.ALL;
+
+entity blk_mem_gen_0 is
+    Port (
+        clka  : in  std_logic;
+        wea   : in  std_logic_vector(0 downto 0);
+        addra : in  std_logic_vector(5 downto 0);
+        dina  : in  std_logic_vector(7 downto 0);
+        clkb  : in  std_logic;
+        addrb : in  std_logic_vector(5 downto 0);
+        doutb : out std_logic_vector(7 downto 0)
+    );
+end blk_mem_gen_0;
+
+architecture Behavioral of blk_mem_gen_0 is
+begin
+    ram : entity work.sim_bram
+        generic map (ADDR_WIDTH => 6)
+        port map (clka => clka, wea => wea, addra => addra, dina => dina, douta => open,
+                  web => "0", addrb => addrb, dinb => (others => '0'), doutb => doutb);
+end Behavioral;
+
+library IEEE;
+use IEEE.STD_LOGIC_1164.ALL;
+
+entity blk_mem_gen_5 is
+    Port (
+        clka  : in  std_logic;
+        wea   : in  std_logic_vector(0 downto 0);
+        addra : in  std_logic_vector(2 downto 0);
+        dina  : in  std_logic_vector(7 downto 0);
+        clkb  : in  std_logic;
+        addrb : in  std_logic_vector(2 downto 0);
+        doutb : out std_logic_vector(7 downto 0)
+    );
+end blk_mem_gen_5;
+
+architecture Behavioral of blk_mem_gen_5 is
+begin
+    ram : entity work.sim_bram
+        generic map (ADDR_WIDTH => 3)
+        port map (clka => clka, wea => wea, addra => addra, dina => dina, douta => open,
+                  web => "0", addrb => addrb, dinb => (others => '0'), doutb => doutb);
+end Behavioral;
@@ -0,0 +1,161 @@
+"""
+Cycle-accurate co-simulation of RTL/Design/top.vhd with GHDL and cocotb.
+
+Builds the design together with behavioural models of the Vivado IP
+(ip_models.vhd), loads the weight image over the init stream and streams
+``--count`` images from Samples/ through in transfers of ``--batch`` images
+(test_top.py). Every prediction is checked against the bit-exact
+DPUEmulator, so a datapath change that breaks the arithmetic fails here too.
+
+The report gives the measured clk cycles per image next to perf_model.py's
+estimate: the input stream, each layer, the control overhead, the cycles an
+image waited on in_tready before the design took it, and the interval
+between results inside a batch, which sets the throughput. Cycles are
+counted on clk and clk_wiz_0 keeps clkb at half of it, so the throughput at
+``--clock-mhz`` is that clock over the interval. Changes to the parallelism
+in channel_layer_* or FindConv*Kernel can be compared here before
+synthesis; ``--max-cycles`` turns a regression into a failing exit code for
+CI.
+
+Needs GHDL on the PATH and ``pip install cocotb``.
+
+    python run_cosim.py [../../Samples ...] [--weights ../../PYNQ/model_info.bin]
+                        [--count 8] [--batch 1] [--clock-mhz 100]
+                        [--max-cycles N] [--json cosim.json] [--waves]
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+
+from cocotb_tools.runner import get_results, get_runner
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, '..', '..', 'PYNQ'))
+
+from perf_model import DPUConfig, estimate  # noqa: E402
+
+from test_top import LAYER_NAMES  # noqa: E402
+
+DESIGN_DIR = os.path.join(HERE, '..', 'Design')
+LIBRARY = 'xil_defaultlib'  # the design's own library name
+TOPLEVEL = 'top'
+GHDL_ARGS = ['--std=08', '-frelaxed']
+GHDL_RUN_ARGS = ['--ieee-asserts=disable']  # metavalue warnings from BRAM reads before the first write
+
+
+def build(design_dir, build_dir):
+    sources = sorted(glob.glob(os.path.join(design_dir, '*.vhd'))) + [os.path.join(HERE, 'ip_models.vhd')]
+    runner = get_runner('ghdl')
+    runner.build(hdl_library=LIBRARY, vhdl_sources=sources, hdl_toplevel=TOPLEVEL,
+                 build_args=GHDL_ARGS, build_dir=build_dir, always=True)
+    return runner
+
+
+def simulate(runner, args, report_path):
+    """Run test_top.py; returns True if it passed."""
+    env = {
+        'COSIM_WEIGHTS': os.path.abspath(args.weights),
+        'COSIM_IMAGES': os.pathsep.join(os.path.abspath(path) for path in args.images),
+        'COSIM_COUNT': str(args.count),
+        'COSIM_BATCH': str(args.batch),
+        'COSIM_REPORT': report_path,
+    }
+    results = runner.test(test_module='test_top', hdl_toplevel=TOPLEVEL, hdl_toplevel_library=LIBRARY,
+                          test_dir=HERE, build_dir=args.build_dir, test_args=GHDL_ARGS,
+                          plusargs=GHDL_RUN_ARGS, extra_env=env, waves=args.waves)
+    _, failed = get_results(results)
+    return failed == 0
+
+
+def summarize(report, clock_mhz):
+    """Median cycles per stage and image, and the throughput they give at ``clock_mhz``."""
+    images = report['images']
+    stages = {'dma in': statistics.median(image['dma_in'] for image in images)}
+    for name in LAYER_NAMES:
+        stages[name] = statistics.median(image['layers'].get(name, 0) for image in images)
+    latency = statistics.median(image['latency'] for image in images)
+    stages['control'] = latency - sum(stages.values())
+
+    # Results back to back inside a batch: the design's own rate, without host gaps
+    intervals = [image['result'] - previous['result']
+                 for previous, image in zip(images, images[1:]) if image['batch'] == previous['batch']]
+    interval = statistics.median(intervals) if intervals else latency
+    return {
+        'clock_mhz': clock_mhz,
+        'count': report['count'],
+        'batch': report['batch'],
+        'stages': stages,
+        'latency_cycles': latency,
+        'interval_cycles': interval,
+        'stall_cycles': statistics.mean(image['stalls'] for image in images),
+        'glyphs_per_second': clock_mhz * 1e6 / interval,
+        'init_cycles': report['init_cycles'],
+        'mismatches': sum(image['predicted'] != image['expected'] for image in images),
+        'tlast_ok': report['tlast_ok'],
+    }
+
+
+def print_report(summary):
+    # Cycle counts do not depend on the clock as long as clkb stays at half of clk
+    model = {stage['layer']: stage['cycles'] for stage in estimate(DPUConfig())}
+    model['control'] += model.pop('dma out')  # the result byte is part of the measured control time
+    us_per_cycle = 1.0 / summary['clock_mhz']
+    print(f"{'stage':>8} | {'cycles':>8} | {'model':>8} | {'us':>8}")
+    for name, cycles in summary['stages'].items():
+        print(f"{name:>8} | {cycles:8.0f} | {model.get(name, 0):8d} | {cycles * us_per_cycle:8.2f}")
+    print(f"{'latency':>8} | {summary['latency_cycles']:8.0f} | {sum(model.values()):8d} | "
+          f"{summary['latency_cycles'] * us_per_cycle:8.2f}")
+
+    print(f"\n{summary['count']} images in batches of {summary['batch']}: "
+          f"{summary['interval_cycles']:.0f} cycles between results, "
+          f"{summary['stall_cycles']:.0f} cycles per image waiting on in_tready")
+    print(f"At {summary['clock_mhz']:g} MHz: {summary['interval_cycles'] * us_per_cycle:.2f} us/glyph, "
+          f"{summary['glyphs_per_second']:.0f} glyphs/s")
+    print(f"Weight init: {summary['init_cycles']} cycles ({summary['init_cycles'] * us_per_cycle:.1f} us)")
+    print(f"Predictions: {summary['count'] - summary['mismatches']}/{summary['count']} match DPUEmulator, "
+          f"tlast framing {'ok' if summary['tlast_ok'] else 'WRONG'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('images', nargs='*', default=[os.path.join(HERE, '..', '..', 'Samples')],
+                        help='images or folders (default: Samples/)')
+    parser.add_argument('--weights', default=os.path.join(HERE, '..', '..', 'PYNQ', 'model_info.bin'),
+                        help='model_info.bin or model_info.json')
+    parser.add_argument('--count', type=int, default=8, help='images to predict')
+    parser.add_argument('--batch', type=int, default=1,
+                        help='images per MM2S transfer, more than 1 needs the batch framing in dma_predict')
+    parser.add_argument('--clock-mhz', type=float, default=100.0, help='target clk for the throughput figures')
+    parser.add_argument('--design', default=DESIGN_DIR, help='folder with the design sources')
+    parser.add_argument('--build-dir', default=os.path.join(HERE, 'sim_build'))
+    parser.add_argument('--max-cycles', type=float, help='fail if the cycles between results exceed this')
+    parser.add_argument('--json', help='write the summary here')
+    parser.add_argument('--waves', action='store_true', help='dump a waveform into the build folder')
+    args = parser.parse_args()
+
+    report_path = os.path.join(os.path.abspath(args.build_dir), 'cosim_report.json')
+    runner = build(args.design, args.build_dir)
+    if os.path.exists(report_path):
+        os.remove(report_path)
+    passed = simulate(runner, args, report_path)
+    if not os.path.exists(report_path):
+        sys.exit("simulation ended before the report was written; see the cocotb log above")
+    with open(report_path, 'r') as f:
+        summary = summarize(json.load(f), args.clock_mhz)
+
+    print_report(summary)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if args.max_cycles is not None and summary['interval_cycles'] > args.max_cycles:
+        print(f"FAIL: {summary['interval_cycles']:.0f} cycles per image, limit {args.max_cycles:.0f}")
+        passed = False
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
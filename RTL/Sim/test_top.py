@@ -0,0 +1,223 @@
+"""
+cocotb test for RTL/Design/top.vhd: weight load, batched predictions, cycle counts.
+
+Run it through run_cosim.py, which builds the design with GHDL and passes
+the settings in the environment:
+
+    COSIM_WEIGHTS  model_info.bin or model_info.json
+    COSIM_IMAGES   images or folders, separated by os.pathsep
+    COSIM_COUNT    images to predict (the list is repeated to fill it)
+    COSIM_BATCH    images per MM2S transfer (more than 1 needs the batch
+                   framing in dma_predict, see batch_predict.py)
+    COSIM_REPORT   where to write the JSON report
+    COSIM_TIMEOUT  clk cycles an image may take before the test gives up
+
+The AXI-Stream source and sink stand in for axi_dma_0. The weight image is
+sent as the board's ``init()`` sends it: ps_signal high, one transfer per
+section of ``WeightImage.lists`` (tlast on its last byte), each started once
+the design raises s_axis_tready. Images go as ``BatchPredictor`` sends
+them: one transfer of ``COSIM_BATCH`` x 784 bytes, tvalid held high for the
+whole transfer, so the design's back-pressure between images shows up as
+stalls. A byte moves on a clk edge where tvalid and tready are both high.
+On the board the stream passes axis_data_fifo_0 first (dpu.hwh: packet
+mode, 4096 deep, on clk), which holds a transfer back until its tlast is
+in, or until it is full, and then sends it without gaps, as this source
+does.
+
+``CycleMonitor`` samples the handshakes and top's start_layer_N /
+finish_layer_N strobes on every clk edge and records, per image: the cycles
+its bytes were held off by s_axis_tready, the input stream, each layer and
+the clk edge its result byte left. The predictions are checked against the
+bit-exact DPUEmulator.
+"""
+
+import json
+import os
+import sys
+
+import cocotb
+import numpy as np
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, RisingEdge
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'PYNQ'))
+
+from dpu_emulator import IMAGE_SIZE, DPUEmulator  # noqa: E402
+from golden_vectors import find_images, load_weights, transform  # noqa: E402
+
+CLK_PERIOD_NS = 10  # clk of top.vhd, 100 MHz on the board
+RESET_CYCLES = 16
+# Names as in perf_model.py, in the order top.vhd runs layer_1 .. layer_6
+LAYER_NAMES = ('conv1', 'pool1', 'conv2', 'pool2', 'fc1', 'fc2')
+
+
+def high(signal):
+    """True when a std_logic signal is '1' ('U' and 'X' count as low)."""
+    return str(signal.value) == '1'
+
+
+async def wait_until(dut, condition, limit, what):
+    """Wait for the first clk edge where ``condition()`` holds."""
+    for _ in range(limit):
+        await RisingEdge(dut.clk)
+        if condition():
+            return
+    raise AssertionError(f"no {what} after {limit} clk cycles")
+
+
+async def stream(dut, data, limit):
+    """AXI-Stream source: ``data`` as one transfer, tlast on the last byte."""
+    dut.s_axis_tvalid.value = 1
+    for n, byte in enumerate(data):
+        dut.s_axis_tdata.value = int(byte)
+        dut.s_axis_tlast.value = int(n == len(data) - 1)
+        await wait_until(dut, lambda: high(dut.s_axis_tready), limit, f"s_axis_tready for byte {n}")
+    dut.s_axis_tvalid.value = 0
+    dut.s_axis_tlast.value = 0
+
+
+class CycleMonitor:
+    """Per-image cycle counts, from the handshakes and strobes seen on clk."""
+
+    def __init__(self, dut):
+        self.dut = dut
+        self.cycle = 0
+        self.counting = False     # set once the weights are in
+        self.bytes_in = 0
+        self.images = []
+        self.results = []         # (result byte, tlast) per image
+        self._strobes = [(name, getattr(dut, f'start_layer_{k}'), getattr(dut, f'finish_layer_{k}'))
+                         for k, name in enumerate(LAYER_NAMES, 1)]
+        self._previous = {}       # (layer, 'start' or 'finish') -> level on the last edge
+        self._started = {}
+
+    def image(self, n):
+        while len(self.images) <= n:
+            self.images.append({'first_byte': None, 'last_byte': None, 'stalls': 0,
+                                'layers': {}, 'result': None})
+        return self.images[n]
+
+    def _rose(self, key, signal):
+        now = high(signal)
+        rose = now and not self._previous.get(key, False)
+        self._previous[key] = now
+        return rose
+
+    async def run(self):
+        dut = self.dut
+        while True:
+            await RisingEdge(dut.clk)
+            self.cycle += 1
+            if not self.counting:
+                continue
+
+            # Input: bytes accepted, or held off by in_tready
+            pending = self.image(self.bytes_in // IMAGE_SIZE)
+            if high(dut.s_axis_tvalid):
+                if high(dut.s_axis_tready):
+                    if pending['first_byte'] is None:
+                        pending['first_byte'] = self.cycle
+                    self.bytes_in += 1
+                    if self.bytes_in % IMAGE_SIZE == 0:
+                        pending['last_byte'] = self.cycle
+                else:
+                    pending['stalls'] += 1
+
+            # Layers: top.vhd runs one image at a time, the one without a result yet
+            current = self.image(len(self.results))
+            for name, start, finish in self._strobes:
+                if self._rose((name, 'start'), start):
+                    self._started[name] = self.cycle
+                if self._rose((name, 'finish'), finish) and name in self._started:
+                    current['layers'][name] = self.cycle - self._started.pop(name)
+
+            if high(dut.m_axis_tvalid) and high(dut.m_axis_tready):
+                current['result'] = self.cycle
+                self.results.append((int(dut.m_axis_tdata.value), high(dut.m_axis_tlast)))
+
+
+def load_inputs(weights, paths, count):
+    """``count`` quantized images (N x 784) and their names, cycling through ``paths``."""
+    files = find_images(paths)
+    if not files:
+        raise AssertionError(f"no images in {paths}")
+    names = [files[n % len(files)] for n in range(count)]
+    inputs = [transform(Image.open(name), weights.input_scale, weights.input_zero_point) for name in names]
+    return np.stack(inputs), names
+
+
+@cocotb.test()
+async def predict_batches(dut):
+    weights = load_weights(os.environ['COSIM_WEIGHTS'])
+    paths = os.environ['COSIM_IMAGES'].split(os.pathsep)
+    count = int(os.environ.get('COSIM_COUNT', 8))
+    batch = int(os.environ.get('COSIM_BATCH', 1))
+    timeout = int(os.environ.get('COSIM_TIMEOUT', 1_000_000))
+
+    inputs, names = load_inputs(weights, paths, count)
+    expected = DPUEmulator(weights.lists).predict_batch(inputs)
+
+    dut.resetn.value = 0
+    dut.ps_signal.value = 0
+    dut.s_axis_tvalid.value = 0
+    dut.s_axis_tlast.value = 0
+    dut.s_axis_tdata.value = 0
+    dut.m_axis_tready.value = 1  # S2MM is always ready for the result bytes
+    cocotb.start_soon(Clock(dut.clk, CLK_PERIOD_NS, unit='ns').start())
+    monitor = CycleMonitor(dut)
+    cocotb.start_soon(monitor.run())
+    await ClockCycles(dut.clk, RESET_CYCLES)
+    dut.resetn.value = 1
+
+    # Weight load: one transfer per section, each once dma_init is ready for it
+    dut.ps_signal.value = 1
+    init_start = monitor.cycle
+    for section in weights.lists:
+        await wait_until(dut, lambda: high(dut.s_axis_tready), timeout, "s_axis_tready for a weight section")
+        await stream(dut, section.view(np.uint8), timeout)
+        await wait_until(dut, lambda: not high(dut.s_axis_tready), timeout, "end of a weight section")
+    # dma_init has finished by the time in_tready drops; let top count the fifth section
+    await ClockCycles(dut.clk, 4)
+    init_cycles = monitor.cycle - init_start
+    dut.ps_signal.value = 0
+    monitor.counting = True
+
+    for start in range(0, count, batch):
+        chunk = inputs[start:start + batch]
+        done = start + len(chunk)
+        await stream(dut, chunk.reshape(-1), timeout)
+        await wait_until(dut, lambda: len(monitor.results) >= done, timeout * len(chunk),
+                         f"results for images {start}..{done - 1}")
+
+    predicted = [byte for byte, _ in monitor.results]
+    tlast = [last for _, last in monitor.results]
+    framing = [(n + 1) % batch == 0 or n + 1 == count for n in range(count)]
+    per_image = []
+    for n, image in enumerate(monitor.images[:count]):
+        per_image.append({
+            'name': os.path.basename(names[n]),
+            'batch': n // batch,
+            'stalls': image['stalls'],
+            'dma_in': image['last_byte'] - image['first_byte'] + 1,
+            'layers': image['layers'],
+            'first_byte': image['first_byte'],
+            'result': image['result'],
+            'latency': image['result'] - image['first_byte'],
+            'predicted': predicted[n],
+            'expected': int(expected[n]),
+        })
+    report = {
+        'clock_ns': CLK_PERIOD_NS,
+        'count': count,
+        'batch': batch,
+        'init_cycles': init_cycles,
+        'tlast_ok': tlast == framing,
+        'images': per_image,
+    }
+    with open(os.environ.get('COSIM_REPORT', 'cosim_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    wrong = [n for n in range(count) if predicted[n] != expected[n]]
+    assert not wrong, f"{len(wrong)} of {count} predictions differ from DPUEmulator (first: image {wrong[0]})"
+    assert tlast == framing, f"m_axis_tlast {tlast}, expected {framing}"